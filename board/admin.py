@@ -1,51 +1,149 @@
 # board/admin.py
 from django.contrib import admin
-from .models import Message
+from .models import Message, OutboundEmail
 from django.template.response import TemplateResponse
-from django.urls import path
+from django.urls import path, reverse
 from django.shortcuts import redirect
 from django.contrib import messages
-from django.core.mail import send_mail
 from django.conf import settings
+from .caching import bump_board_version_on_commit
+from .outbox import enqueue_approval_notification
+from .approval import approve_messages
+from .live import notify_approved
+from .search import filter_by_search
+from .signals import batched_deletes
+from django.db.models import Q
+from .stats import APPROVED, APPROVED_REPLIES, DUPLICATES, PENDING, adjust_counters, get_counter, get_counters, today_key
+from .threads import refresh_reply_counts
+from django.utils.html import format_html
+from django.db import transaction
+from django.utils import timezone
+from django.contrib.admin.options import IncorrectLookupParameters
+from django.contrib.admin.views.main import ORDER_VAR, PAGE_VAR
+from django.contrib.admin.widgets import AutocompleteSelect
+from django.contrib.auth.models import User
+from django import forms
+from .pagination import CountedPaginator, EstimatedCountPaginator
+
+
+class AuthorAutocompleteFilter(admin.ListFilter):
+    """
+    以自動完成選擇留言者的篩選器。
+    原本的 author__username 篩選每次載入列表都會查出全部留言者；這裡只渲染一個 select2 輸入框，
+    候選名單由 admin 的 autocomplete 視圖 (搜尋 UserAdmin.search_fields) 分頁載入，頁面本身只查詢已選中的那一位。
+    """
+    title = '留言者'
+    parameter_name = 'author__id__exact'
+    template = 'admin/board/message/author_filter.html'
+
+    def __init__(self, request, params, model, model_admin):
+        super().__init__(request, params, model, model_admin)
+        if self.parameter_name in params:
+            self.used_parameters[self.parameter_name] = params.pop(self.parameter_name)[-1]
+        self.field = model._meta.get_field('author')
+        self.admin_site = model_admin.admin_site
+
+    def value(self):
+        return self.used_parameters.get(self.parameter_name)
+
+    def has_output(self):
+        return True
+
+    def expected_parameters(self):
+        return [self.parameter_name]
+
+    def queryset(self, request, queryset):
+        value = self.value()
+        if not value:
+            return queryset
+        try:
+            return queryset.filter(author_id=int(value))
+        except ValueError as e:
+            raise IncorrectLookupParameters(e)
+
+    def choices(self, changelist):
+        yield {
+            'selected': not self.value(),
+            'query_string': changelist.get_query_string(remove=[self.parameter_name]),
+            'display': '全部',
+        }
+
+    def select(self):
+        # 透過 ModelChoiceField 綁定 choices，渲染時只查詢已選中的使用者
+        widget = AutocompleteSelect(self.field, self.admin_site)
+        field = forms.ModelChoiceField(User.objects.all(), widget=widget, required=False)
+        return field.widget.render(self.parameter_name, self.value(), attrs={'id': 'author-filter'})
+
+
+class ThreadRoleFilter(admin.SimpleListFilter):
+    """區分頂層留言與回覆 (見 board/threads.py)"""
+    title = '類型'
+    parameter_name = 'kind'
+
+    def lookups(self, request, model_admin):
+        return [('topic', '頂層留言'), ('reply', '回覆')]
+
+    def queryset(self, request, queryset):
+        if self.value() == 'topic':
+            return queryset.filter(thread__isnull=True)
+        if self.value() == 'reply':
+            return queryset.filter(thread__isnull=False)
+        return queryset
 
 
 @admin.register(Message)
 class MessageAdmin(admin.ModelAdmin):
-    list_display = ('subject', 'author_email', 'created_at', 'is_approved', 'notified') # 修改 'author' 為 'author_email'
-    list_filter = ('is_approved', 'notified', 'author__username') # 增加 author__username 過濾
-    search_fields = ('subject', 'content', 'author__username', 'author__email') # 增加 author__email 搜尋
+    list_display = ('subject', 'author_email', 'created_at', 'is_approved', 'notified', 'duplicate_count', 'in_reply_to') # 修改 'author' 為 'author_email'
+    list_filter = ('is_approved', 'notified', ThreadRoleFilter, AuthorAutocompleteFilter) # 留言者以自動完成選擇，不列出全部使用者
+    search_fields = ('subject', 'content', 'author__username', 'author__email') # 實際搜尋由 get_search_results 使用全文索引完成
     actions = ['mark_approved_and_notify', 'mark_unapproved'] # 修改批量操作名稱
-    readonly_fields = ('author', 'subject', 'content', 'created_at') # 恢復 subject 和 content 為唯讀
+    readonly_fields = ('author', 'subject', 'content', 'created_at', 'parent', 'reply_count') # 恢復 subject 和 content 為唯讀
     list_display_links = ('subject',) # 明確指定 subject 作為連結
+    list_select_related = ('author',) # author_email 在同一條查詢中取得作者，避免每行一次查詢
+    show_full_result_count = False # 篩選後不再額外以 COUNT(*) 計算未篩選的總數
+
+    @property
+    def media(self):
+        # 作者篩選器的 select2 腳本；與 ModelAdmin 原有的 jQuery 合併，維持正確的載入順序
+        return super().media + AutocompleteSelect(Message._meta.get_field('author'), self.admin_site).media
+
 
+    # 使用全文索引搜尋主題與內容，作者則以帳號或 Email 精確匹配 (可使用唯一索引)，避免 icontains 全表掃描
+    def get_search_results(self, request, queryset, search_term):
+        search_term = search_term.strip()
+        if not search_term:
+            return queryset, False
+        matched = filter_by_search(queryset, search_term).values('pk')
+        queryset = queryset.filter(
+            Q(pk__in=matched) | Q(author__username=search_term) | Q(author__email__iexact=search_term)
+        )
+        return queryset, False
 
     # 顯示留言者 Email
     def author_email(self, obj):
         return obj.author.email
     author_email.short_description = '留言者 Email'
 
+    # 回覆所回覆的留言：只使用 parent_id 產生鏈接，不需要 JOIN 或額外查詢
+    @admin.display(description='回覆的留言')
+    def in_reply_to(self, obj):
+        if obj.parent_id is None:
+            return '-'
+        return format_html('<a href="{}">#{}</a>', reverse('admin:board_message_change', args=[obj.parent_id]), obj.parent_id)
+
     # 審核通過並通知的動作 (合併原有的 approve_message 和 mark_approved)
     def _approve_and_notify_message(self, request, message):
         if not message.is_approved:
             message.is_approved = True
-            # 只有在留言者有 Email 的情況下才嘗試發送郵件
+            message.save()
+            notify_approved() # 推送到即時動態
+            # 只有在留言者有 Email 的情況下才發送郵件 (寫入郵件佇列，由 send_outbox 在背景發送)
             if message.author.email:
-                try:
-                    if not message.notified: # 避免重複通知
-                        send_mail(
-                            f'您的留言「{message.subject}」已通過審核',
-                            f'您好 {message.author.username}，\n\n您的留言「{message.subject}」已通過管理員審核，現在已在網站上顯示。\n\n感謝您的參與！',
-                            settings.DEFAULT_FROM_EMAIL,
-                            [message.author.email],
-                            fail_silently=False,
-                        )
-                        message.notified = True
-                        messages.success(request, f'已發送郵件通知留言者 {message.author.username} ({message.author.email})。')
-                except Exception as e:
-                    messages.error(request, f'發送郵件通知給 {message.author.username} ({message.author.email}) 失敗: {e}')
+                if not message.notified: # 避免重複通知
+                    enqueue_approval_notification(message)
+                    messages.success(request, f'已排入郵件通知留言者 {message.author.username} ({message.author.email})。')
             else:
                 messages.warning(request, f'留言者 {message.author.username} 未提供電子郵件，無法發送通知。')
-            message.save()
             return True
         return False
 
@@ -58,15 +156,22 @@ class MessageAdmin(admin.ModelAdmin):
             messages.info(request, f'留言 "{message.subject}" 先前已被審核。')
         return redirect('admin:board_message_changelist')
 
+    # 批量審核結果的提示訊息 (彙總顯示，避免數千條逐條提示)
+    def _report_approval(self, request, result):
+        if result.queued_notifications:
+            messages.success(request, f'已排入 {result.queued_notifications} 封審核通過通知郵件。')
+        if result.authors_without_email:
+            names = result.authors_without_email
+            shown = ', '.join(names[:10]) + (f' 等 {len(names)} 位' if len(names) > 10 else '')
+            messages.warning(request, f'留言者 {shown} 未提供電子郵件，無法發送通知。')
+
     # 批量通過並通知
     @admin.action(description='批量通過選中留言並郵件通知')
     def mark_approved_and_notify(self, request, queryset):
-        approved_count = 0
-        for message in queryset:
-            if self._approve_and_notify_message(request, message):
-                approved_count +=1
-        if approved_count > 0:
-            self.message_user(request, f'成功通過 {approved_count} 條留言。')
+        result = approve_messages(queryset)
+        self._report_approval(request, result)
+        if result.approved_count > 0:
+            self.message_user(request, f'成功通過 {result.approved_count} 條留言。')
         else:
             self.message_user(request, '沒有留言被更新（可能已審核或無郵箱）。', level=messages.WARNING)
 
@@ -74,7 +179,19 @@ class MessageAdmin(admin.ModelAdmin):
     # 批量取消通過
     @admin.action(description='批量取消通過選中的留言 (不發送通知)')
     def mark_unapproved(self, request, queryset):
-        updated_count = queryset.update(is_approved=False, notified=False) # 取消審核時也重置通知狀態
+        with transaction.atomic():
+            # 回覆另外更新，才能得知取消了多少條已審核的回覆，並重新計算所屬討論串的回覆數
+            approved_replies = queryset.filter(is_approved=True, thread__isnull=False)
+            thread_ids = set(approved_replies.values_list('thread_id', flat=True))
+            now = timezone.now()
+            unapproved_replies = approved_replies.update(is_approved=False, approved_at=None, pending_since=now, notified=False)
+            unapproved_count = unapproved_replies + queryset.filter(is_approved=True).update(
+                is_approved=False, approved_at=None, pending_since=now, notified=False,
+            )
+            updated_count = queryset.update(notified=False) # 取消審核時也重置通知狀態
+            adjust_counters({APPROVED: -unapproved_count, PENDING: unapproved_count, APPROVED_REPLIES: -unapproved_replies})
+            refresh_reply_counts(thread_ids)
+        bump_board_version_on_commit() # update() 不觸發信號，手動使列表頁快取失效
         self.message_user(request, f'成功取消通過 {updated_count} 條留言。')
 
 
@@ -95,19 +212,16 @@ class MessageAdmin(admin.ModelAdmin):
     # "快速通過全部未審核留言" 按鈕視圖
     def approve_all_pending_view(self, request): # 更新視圖名稱
         if request.method == 'POST':
-            pending_messages = Message.objects.filter(is_approved=False)
-            approved_count = 0
-            for message in pending_messages:
-                if self._approve_and_notify_message(request, message):
-                    approved_count += 1
-            if approved_count > 0:
-                messages.success(request, f'成功通過了 {approved_count} 條未審核留言。')
+            result = approve_messages(Message.objects.all())
+            self._report_approval(request, result)
+            if result.approved_count > 0:
+                messages.success(request, f'成功通過了 {result.approved_count} 條未審核留言。')
             else:
                 messages.info(request, '沒有需要通過的未審核留言，或留言者無 Email。')
             return redirect('admin:board_message_changelist')
 
         # 顯示確認頁面
-        pending_count = Message.objects.filter(is_approved=False).count()
+        pending_count = get_counter(PENDING)
         context = dict(
             self.admin_site.each_context(request),
             opts=self.model._meta, # <<<< 主要修改：將 model._meta 傳遞給模板上下文的 'opts'
@@ -122,14 +236,32 @@ class MessageAdmin(admin.ModelAdmin):
     def changelist_view(self, request, extra_context=None):
         if extra_context is None:
             extra_context = {}
-        # 統計未審核留言數量
-        extra_context['pending_messages_count'] = Message.objects.filter(is_approved=False).count()
-        # 統計今日新增留言數量
-        from django.utils import timezone
-        today_start = timezone.now().replace(hour=0, minute=0, second=0, microsecond=0)
-        extra_context['today_messages_count'] = Message.objects.filter(created_at__gte=today_start).count()
+        # 未審核、今日新增與已合併的重複留言數量 (讀取計數器，不掃描留言表)；已審核數量供 get_paginator 使用
+        counters = request.board_counters = get_counters(APPROVED, PENDING, DUPLICATES, today_key())
+        extra_context['pending_messages_count'] = counters[PENDING]
+        extra_context['today_messages_count'] = counters[today_key()]
+        extra_context['collapsed_duplicates_count'] = counters[DUPLICATES]
         return super().changelist_view(request, extra_context=extra_context)
 
+    def _counted_total(self, request):
+        """只依審核狀態篩選 (或不篩選) 時，總數可以直接從計數器取得"""
+        counters = getattr(request, 'board_counters', None)
+        filters = {key: value for key, value in request.GET.items() if key not in (PAGE_VAR, ORDER_VAR)}
+        if counters is None or set(filters) - {'is_approved__exact'}:
+            return None
+        status = filters.get('is_approved__exact')
+        if status is None:
+            return counters[APPROVED] + counters[PENDING]
+        return {'0': counters[PENDING], '1': counters[APPROVED]}.get(status)
+
+    # 列表總數：優先使用計數器，其他篩選在大表上使用估計值 (見 board/pagination.py)
+    def get_paginator(self, request, queryset, per_page, orphans=0, allow_empty_first_page=True):
+        count = self._counted_total(request)
+        if count is not None:
+            return CountedPaginator(queryset, per_page, count, orphans=orphans,
+                                    allow_empty_first_page=allow_empty_first_page)
+        return EstimatedCountPaginator(queryset, per_page, orphans=orphans, allow_empty_first_page=allow_empty_first_page)
+
     # 移除舊的 admin_actions，因為審核操作現在通過 actions 和直接點擊（如果需要）
     # admin_actions.allow_tags = True
     # admin_actions.short_description = "操作"
@@ -147,20 +279,39 @@ class MessageAdmin(admin.ModelAdmin):
                 should_notify = True
 
         super().save_model(request, obj, form, change) # 先保存
+        if obj.is_approved and (not change or 'is_approved' in form.changed_data):
+            notify_approved() # 推送到即時動態
 
         if should_notify and obj.author.email: # 確保有 email
-            try:
-                send_mail(
-                    f'您的留言「{obj.subject}」已通過審核',
-                    f'您好 {obj.author.username}，\n\n您的留言「{obj.subject}」已通過管理員審核，現在已在網站上顯示。\n\n感謝您的參與！',
-                    settings.DEFAULT_FROM_EMAIL,
-                    [obj.author.email],
-                    fail_silently=False,
-                )
-                obj.notified = True
-                obj.save(update_fields=['notified']) # 只更新 notified 欄位
-                messages.success(request, f'已發送郵件通知留言者 {obj.author.username} ({obj.author.email})。')
-            except Exception as e:
-                messages.error(request, f'在保存後發送郵件通知給 {obj.author.username} ({obj.author.email}) 失敗: {e}')
+            # 寫入郵件佇列，發送成功後 send_outbox 會設定 notified
+            enqueue_approval_notification(obj)
+            messages.success(request, f'已排入郵件通知留言者 {obj.author.username} ({obj.author.email})。')
         elif should_notify and not obj.author.email:
-            messages.warning(request, f'留言者 {obj.author.username} 未提供電子郵件，無法在保存後發送通知。')
\ No newline at end of file
+            messages.warning(request, f'留言者 {obj.author.username} 未提供電子郵件，無法在保存後發送通知。')
+
+    # 刪除留言會連同子樹中的回覆一起刪除：計數器、回覆數、搜尋索引與快取版本號只更新一次
+    def delete_model(self, request, obj):
+        with batched_deletes():
+            super().delete_model(request, obj)
+
+    def delete_queryset(self, request, queryset):
+        with batched_deletes():
+            super().delete_queryset(request, queryset)
+
+
+@admin.register(OutboundEmail)
+class OutboundEmailAdmin(admin.ModelAdmin):
+    list_display = ('subject', 'status', 'attempts', 'created_at', 'next_attempt_at', 'sent_at')
+    list_filter = ('status',)
+    search_fields = ('subject',)
+    readonly_fields = ('subject', 'body', 'from_email', 'recipients', 'related_message', 'attempts', 'last_error', 'created_at', 'sent_at')
+    actions = ['retry_now']
+
+    # 將選中的郵件重新排入佇列 (例如 SMTP 故障修復後重試發送失敗的郵件)
+    @admin.action(description='立即重新發送選中的郵件')
+    def retry_now(self, request, queryset):
+        from django.utils import timezone
+        updated_count = queryset.exclude(status=OutboundEmail.STATUS_SENT).update(
+            status=OutboundEmail.STATUS_PENDING, attempts=0, next_attempt_at=timezone.now(),
+        )
+        self.message_user(request, f'已重新排入 {updated_count} 封郵件。')
@@ -0,0 +1,161 @@
+# board/api.py
+"""
+唯讀 JSON API (v1)：已審核的留言。
+
+- GET /api/v1/messages/         游標分頁，?limit= 每頁數量，?after= / ?before= 為上一頁回傳的游標
+- GET /api/v1/messages/export/  以 JSON Lines (每行一條留言) 串流輸出全部已審核留言，適合完整匯出
+- GET /api/v1/messages/live/    Server-Sent Events：新審核通過的留言 (見 board/live.py)
+
+只查詢需要的欄位，並以 JOIN 取得作者名稱，不建立模型實例、不渲染模板。
+兩個端點都支援以 ETag / Last-Modified 進行條件式 GET，留言板沒有變化時返回 304。
+ASGI 部署時改用 amessage_list / amessage_export / amessage_stream，以非同步 ORM 查詢。
+"""
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import DEFAULT_DB_ALIAS
+from django.db.models import F
+from django.http import HttpResponse, StreamingHttpResponse
+from django.urls import reverse
+from django.utils.http import urlencode
+from django.utils.cache import patch_cache_control
+from django.views.decorators.http import condition, require_GET
+
+from .caching import api_etag, api_last_modified
+from .live import FeedPosition, live_events, position_events, stream_preamble
+from .models import Message
+from .pagination import akeyset_paginate, keyset_paginate
+
+API_DEFAULT_LIMIT = 20
+API_MAX_LIMIT = 100
+EXPORT_CHUNK_SIZE = 2000
+
+# parent_id：回覆所回覆的留言 (頂層留言為 null)，客戶端可據此重建討論串
+MESSAGE_FIELDS = ('id', 'parent_id', 'subject', 'content', 'created_at')
+
+
+def approved_message_rows():
+    """
+    已審核留言的精簡查詢：只取 API 需要的欄位，作者名稱在同一條查詢中 JOIN。
+    回應以留言板版本號作為 ETag，固定從主庫讀取 (串流輸出在視圖返回之後才查詢，因此直接指定資料庫)
+    """
+    return (
+        Message.objects.using(DEFAULT_DB_ALIAS).filter(is_approved=True)
+        .values(*MESSAGE_FIELDS, author_name=F('author__username'))
+        .order_by('-created_at', '-id')
+    )
+
+
+def _dumps(data):
+    return json.dumps(data, cls=DjangoJSONEncoder, ensure_ascii=False, separators=(',', ':'))
+
+
+def json_response(data, status=200):
+    response = HttpResponse(_dumps(data), status=status, content_type='application/json; charset=utf-8')
+    patch_cache_control(response, no_cache=True)
+    return response
+
+
+def _parse_limit(value):
+    try:
+        limit = int(value)
+    except (TypeError, ValueError):
+        return API_DEFAULT_LIMIT
+    return max(1, min(limit, API_MAX_LIMIT))
+
+
+def _list_response(request, limit, page):
+    def page_url(**params):
+        return request.build_absolute_uri(f"{reverse('api_messages')}?{urlencode({'limit': limit, **params})}")
+
+    return json_response({
+        'results': page.object_list,
+        'next': page_url(after=page.next_cursor) if page.next_cursor else None,
+        'previous': page_url(before=page.previous_cursor) if page.previous_cursor else None,
+    })
+
+
+def _export_response(rows):
+    response = StreamingHttpResponse(rows, content_type='application/x-ndjson; charset=utf-8')
+    response['Content-Disposition'] = 'attachment; filename="messages.jsonl"'
+    patch_cache_control(response, no_cache=True)
+    return response
+
+
+@require_GET
+@condition(etag_func=api_etag, last_modified_func=api_last_modified)
+def message_list(request):
+    limit = _parse_limit(request.GET.get('limit'))
+    page = keyset_paginate(
+        approved_message_rows(),
+        limit,
+        after=request.GET.get('after'),
+        before=request.GET.get('before'),
+    )
+    return _list_response(request, limit, page)
+
+
+@require_GET
+@condition(etag_func=api_etag, last_modified_func=api_last_modified)
+def message_export(request):
+    def rows():
+        # iterator() 使用伺服器端游標分塊讀取，記憶體用量與總留言數無關
+        for row in approved_message_rows().iterator(chunk_size=EXPORT_CHUNK_SIZE):
+            yield _dumps(row) + '\n'
+
+    return _export_response(rows())
+
+
+# 非同步版本 (ASGI)。ETag 只讀取快取，不涉及 session 或使用者，可直接在事件循環中計算
+@require_GET
+@condition(etag_func=api_etag, last_modified_func=api_last_modified)
+async def amessage_list(request):
+    limit = _parse_limit(request.GET.get('limit'))
+    page = await akeyset_paginate(
+        approved_message_rows(),
+        limit,
+        after=request.GET.get('after'),
+        before=request.GET.get('before'),
+    )
+    return _list_response(request, limit, page)
+
+
+@require_GET
+@condition(etag_func=api_etag, last_modified_func=api_last_modified)
+async def amessage_export(request):
+    async def rows():
+        async for row in approved_message_rows().aiterator(chunk_size=EXPORT_CHUNK_SIZE):
+            yield _dumps(row) + '\n'
+
+    return _export_response(rows())
+
+
+def _stream_position(request):
+    # EventSource 重連時自動帶上 Last-Event-ID；首次連線也可用 ?last_event_id= 指定
+    return FeedPosition.decode(request.headers.get('Last-Event-ID') or request.GET.get('last_event_id'))
+
+
+def _event_stream_response(content, streaming):
+    response_class = StreamingHttpResponse if streaming else HttpResponse
+    response = response_class(content, content_type='text/event-stream; charset=utf-8')
+    patch_cache_control(response, no_cache=True)
+    response['X-Accel-Buffering'] = 'no' # 不讓 nginx 等反向代理緩衝事件
+    return response
+
+
+# 同步部署 (WSGI) 不能長時間佔用 worker：返回位置之後的留言後立即結束，
+# 瀏覽器依 retry 間隔自動重連，相當於以一條索引查詢進行輪詢
+@require_GET
+def message_stream(request):
+    position = _stream_position(request)
+    if position is None:
+        return _event_stream_response(stream_preamble(FeedPosition.start()), streaming=False)
+    events = [stream_preamble(position)]
+    events.extend(position_events(position))
+    return _event_stream_response(''.join(events), streaming=False)
+
+
+# ASGI：長連線，由進程內的廣播中心推送新通過的留言
+@require_GET
+async def amessage_stream(request):
+    return _event_stream_response(live_events(_stream_position(request)), streaming=True)
@@ -0,0 +1,92 @@
+# board/approval.py
+"""
+批量審核引擎，供後台的「批量通過並通知」與「快速通過全部留言」使用。
+
+每一批留言只需要三條 SQL (在同一個交易中)：
+  1. SELECT ... FOR UPDATE 鎖住留言並以 JOIN 一併取得作者 (select_related)
+  2. 單一 UPDATE 設定 is_approved (批次中包含回覆時，回覆另用一條 UPDATE，並重新計算所屬討論串的回覆數)
+  3. 單一 INSERT 批量寫入通知郵件到 outbox
+（另有一條 UPDATE 調整已審核/待審核計數器）
+通知郵件由 send_outbox 以同一個 SMTP 連線發送，只有確實送出的留言才會被標記為 notified。
+只有這一次確實由未審核改為已審核的留言才會排入通知：其他管理員同時通過的留言不會收到第二封郵件。
+"""
+from dataclasses import dataclass, field
+
+from django.db import transaction
+from django.utils import timezone
+
+from .caching import bump_board_version_on_commit
+from .live import notify_approved
+from .models import Message, OutboundEmail
+from .outbox import build_approval_notification
+from .stats import APPROVED, APPROVED_REPLIES, PENDING, adjust_counters
+from .threads import refresh_reply_counts
+
+APPROVAL_BATCH_SIZE = 1000
+
+
+@dataclass
+class ApprovalResult:
+    approved_count: int = 0
+    queued_notifications: int = 0
+    # 沒有 Email、無法通知的留言者名稱 (去重，保持順序)
+    authors_without_email: list = field(default_factory=list)
+
+
+def _approve(pks, now):
+    if not pks:
+        return 0
+    return Message.objects.filter(pk__in=pks, is_approved=False).update(
+        is_approved=True, approved_at=now, pending_since=None,
+    )
+
+
+def _approve_batch(batch, result, authors_without_email):
+    """在交易中審核一批已鎖住的留言，只為這次確實通過的留言排入通知"""
+    now = timezone.now()
+    # 回覆另外更新，才能得知實際通過的回覆數量 (計數器) 與需要重新計算回覆數的討論串
+    # 以 is_approved=False 為條件，避免與其他管理員同時操作時重複計數
+    approved_replies = _approve([m.pk for m in batch if m.thread_id is not None], now)
+    approved = _approve([m.pk for m in batch if m.thread_id is None], now) + approved_replies
+    if approved < len(batch):
+        # 不支援 SELECT ... FOR UPDATE 的資料庫 (SQLite)：部分留言已被其他管理員通過，
+        # 只保留這次更新的留言 (approved_at 為這次的時間)
+        mine = set(Message.objects.filter(pk__in=[m.pk for m in batch], approved_at=now).values_list('pk', flat=True))
+        batch = [m for m in batch if m.pk in mine]
+
+    notifications = []
+    for message in batch:
+        if not message.author.email:
+            if message.author.username not in authors_without_email:
+                authors_without_email.add(message.author.username)
+                result.authors_without_email.append(message.author.username)
+        elif not message.notified: # 避免重複通知
+            notifications.append(build_approval_notification(message))
+    OutboundEmail.objects.bulk_create(notifications)
+    adjust_counters({APPROVED: approved, PENDING: -approved, APPROVED_REPLIES: approved_replies})
+    if approved_replies:
+        refresh_reply_counts(m.thread_id for m in batch if m.thread_id is not None)
+    result.approved_count += approved
+    result.queued_notifications += len(notifications)
+
+
+def approve_messages(queryset, batch_size=APPROVAL_BATCH_SIZE):
+    """審核通過 queryset 中尚未審核的留言，並為有 Email 的留言者排入通知郵件"""
+    result = ApprovalResult()
+    authors_without_email = set()
+    pending = queryset.filter(is_approved=False).select_related('author').order_by('pk')
+    last_pk = 0
+    while True:
+        with transaction.atomic():
+            # 鎖住這一批：其他管理員同時審核時，PostgreSQL 等待對方提交後重新檢查 is_approved=False
+            # (重新檢查後被排除的留言會使這一批少於 batch_size，因此以空批次判斷結束)
+            batch = list(pending.filter(pk__gt=last_pk).select_for_update(of=('self',))[:batch_size])
+            if not batch:
+                break
+            last_pk = batch[-1].pk
+            _approve_batch(batch, result, authors_without_email)
+
+    if result.approved_count:
+        bump_board_version_on_commit() # update() 不觸發信號，手動使列表頁快取失效
+        notify_approved()
+    return result
@@ -0,0 +1,133 @@
+# board/archive.py
+"""
+留言的冷熱分離。
+
+Message 表只保留近期的留言 (熱資料)；`python manage.py archive_messages` 定期執行：
+- 已審核且建立超過 ARCHIVE_AFTER_DAYS 天的頂層留言連同整個討論串搬到 ArchivedMessage (冷資料)，由 /archive/ 頁面瀏覽；
+  討論串中未審核的回覆直接刪除
+- 待審核超過 PURGE_UNAPPROVED_AFTER_DAYS 天 (依 pending_since：新留言、修改後待重審或被取消審核的時間) 的留言
+  連同其下的回覆直接刪除 (與 on_delete=CASCADE 相同)；曾經通過審核的舊留言被修改或取消審核後重新計算期限
+
+每批最多處理 batch_size 條，每批一個交易，不會長時間鎖住留言表。刪除不經過 queryset.delete()
+(那樣會為每一條留言各發送一次信號)，計數器、搜尋索引與列表頁快取改為每批一次性更新。
+"""
+import time
+from collections import Counter
+from functools import reduce
+from operator import or_
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .caching import bump_board_version_on_commit
+from .models import ArchivedMessage, Message, OutboundEmail, Reaction, descendants_q
+from .search import unindex_messages
+from .stats import adjust_counters, day_key, status_deltas
+from .threads import refresh_reply_counts
+
+# 已審核留言在留言表中保留的天數
+ARCHIVE_AFTER_DAYS = getattr(settings, 'ARCHIVE_AFTER_DAYS', 365)
+# 待審核的留言保留的天數 (自進入待審核起算)
+PURGE_UNAPPROVED_AFTER_DAYS = getattr(settings, 'PURGE_UNAPPROVED_AFTER_DAYS', 90)
+ARCHIVE_BATCH_SIZE = 1000
+# 查詢回覆時每條查詢包含的子樹數量 (SQLite 限制運算式的深度)
+SUBTREE_CHUNK_SIZE = 100
+
+ARCHIVED_FIELDS = (
+    'id', 'author_id', 'subject', 'content', 'content_html', 'created_at', 'approved_at', 'updated_at',
+    'thread_id', 'path', 'reply_count', 'like_count', 'love_count', 'laugh_count',
+)
+# _delete_hot_rows 需要的欄位
+HOT_ROW_FIELDS = ('id', 'is_approved', 'created_at', 'thread_id', 'path')
+
+
+def _with_replies(rows, fields):
+    """rows 加上其中每條留言之下的全部回覆 (每個子樹一次 (thread, path) 索引範圍掃描)"""
+    pks = {row['id'] for row in rows}
+    replies = []
+    for start in range(0, len(rows), SUBTREE_CHUNK_SIZE):
+        chunk = rows[start:start + SUBTREE_CHUNK_SIZE]
+        subtrees = reduce(or_, (descendants_q(row['id'], row['thread_id'], row['path']) for row in chunk))
+        for reply in Message.objects.filter(subtrees).values(*fields):
+            if reply['id'] not in pks: # 子樹之間可能重疊 (同一批中同時有留言與它的回覆)
+                pks.add(reply['id'])
+                replies.append(reply)
+    return rows + replies
+
+
+def _delete_hot_rows(rows):
+    """
+    刪除一批留言 (rows 需包含 HOT_ROW_FIELDS，且已包含其下的全部回覆，見 _with_replies)，
+    並同步更新計數器、討論串的回覆數與搜尋索引
+    """
+    pks = [row['id'] for row in rows]
+    # 其他關聯到留言的表：郵件佇列 (on_delete=SET_NULL) 與表情回應 (計數已保存在留言上，隨封存一起搬移)
+    OutboundEmail.objects.filter(related_message_id__in=pks).update(related_message=None)
+    Reaction.objects.filter(message_id__in=pks).delete()
+    placeholders = ', '.join(['%s'] * len(pks))
+    with connection.cursor() as cursor:
+        # 回覆與其上層在同一條語句中刪除，外鍵約束不會被違反
+        cursor.execute(f'DELETE FROM {Message._meta.db_table} WHERE id IN ({placeholders})', pks)
+    unindex_messages(pks)
+
+    deltas = Counter()
+    for row in rows:
+        deltas.update(status_deltas(row['is_approved'], row['thread_id'] is not None, -1))
+        deltas[day_key(timezone.localdate(row['created_at']))] -= 1
+    adjust_counters(deltas)
+    # 只刪除了部分回覆的討論串 (頂層留言已刪除的，UPDATE 不影響任何行)
+    refresh_reply_counts(row['thread_id'] for row in rows if row['is_approved'])
+    if any(row['is_approved'] for row in rows):
+        bump_board_version_on_commit()
+
+
+def _process_in_batches(queryset, fields, handle, batch_size, pause=0):
+    total = 0
+    while True:
+        with transaction.atomic():
+            # 依 (created_at, id) 取出，可使用留言表的游標分頁索引；鎖住這一批，避免同時被編輯或審核
+            rows = list(
+                queryset.select_for_update().order_by('created_at', 'id').values(*fields)[:batch_size]
+            )
+            if rows:
+                handle(rows)
+        total += len(rows)
+        if len(rows) < batch_size:
+            return total
+        if pause:
+            time.sleep(pause) # 讓其他交易與複製追上，再處理下一批
+
+
+def archive_approved_messages(older_than, batch_size=ARCHIVE_BATCH_SIZE):
+    """把 older_than 之前建立的已審核頂層留言連同討論串搬到封存表，返回搬移的頂層留言數量"""
+    fields = (*ARCHIVED_FIELDS, 'is_approved')
+
+    def handle(rows):
+        rows = _with_replies(rows, fields)
+        ArchivedMessage.objects.bulk_create(
+            [ArchivedMessage(**{field: row[field] for field in ARCHIVED_FIELDS}) for row in rows if row['is_approved']],
+            ignore_conflicts=True, # 上一次執行中斷時，可能已經寫入封存表但留言尚未刪除
+        )
+        _delete_hot_rows(rows)
+
+    queryset = Message.objects.filter(is_approved=True, thread__isnull=True, created_at__lt=older_than)
+    return _process_in_batches(queryset, fields, handle, batch_size)
+
+
+def purge_unapproved_messages(older_than, batch_size=ARCHIVE_BATCH_SIZE, pause=0):
+    """刪除 older_than 之前進入待審核、至今仍未通過審核的留言 (每批之間暫停 pause 秒)，返回刪除的數量"""
+    queryset = Message.objects.filter(is_approved=False, pending_since__lt=older_than)
+    return _process_in_batches(
+        queryset, HOT_ROW_FIELDS, lambda rows: _delete_hot_rows(_with_replies(rows, HOT_ROW_FIELDS)), batch_size, pause,
+    )
+
+
+def run_archive(archive_after_days=ARCHIVE_AFTER_DAYS, purge_after_days=PURGE_UNAPPROVED_AFTER_DAYS,
+                batch_size=ARCHIVE_BATCH_SIZE):
+    """執行一次封存與清理，返回 (封存的數量, 刪除的未審核留言數量)"""
+    now = timezone.now()
+    archived = archive_approved_messages(now - timedelta(days=archive_after_days), batch_size)
+    purged = purge_unapproved_messages(now - timedelta(days=purge_after_days), batch_size)
+    return archived, purged
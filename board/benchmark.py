@@ -0,0 +1,327 @@
+# board/benchmark.py
+"""
+熱點路徑的基準測試，由 `python manage.py benchmark_board` 執行。
+
+以 Django 測試客戶端對 my_messageboard/urls.py 中的具名路由 (以及後台的列表與批量審核) 發送請求，
+每個情境記錄 p50/p95/p99 延遲、每個請求的查詢次數與峰值記憶體 (tracemalloc)，結果寫成 JSON，
+可與修改前的結果比較。整個執行過程在一個最後回滾的交易中進行，不會留下任何資料；
+快取 (版本號、列表與卡片片段、速率限制) 改用一個獨立的記憶體快取，結束時清空，
+回滾的留言不會殘留在網站共用的快取 (例如 Redis) 中。
+請先以 `python manage.py seed_board` 產生足夠的資料量。
+"""
+import itertools
+import math
+import statistics
+import time
+import tracemalloc
+from contextlib import ExitStack
+from dataclasses import dataclass, field
+from datetime import timedelta
+from typing import Callable
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.contrib.auth.tokens import default_token_generator
+from django.core.cache import cache
+from django.db import connection, connections, transaction
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import URLPattern, get_resolver, reverse
+from django.utils import timezone
+from django.utils.encoding import force_bytes
+from django.utils.http import urlsafe_base64_encode
+
+from .models import Message
+from .pagination import encode_cursor
+from .reactions import buffer as reaction_buffer
+
+# 基準測試期間使用的快取，不讀寫網站的快取
+BENCHMARK_CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'board-benchmark',
+    },
+}
+# 每個情境測量峰值記憶體的請求數 (tracemalloc 會拖慢執行，不與計時的請求混在一起)
+MEMORY_SAMPLES = 3
+# 深層游標分頁使用的位置
+DEEP_PAGE_OFFSET = 5000
+# 基準測試討論串的回覆數量
+THREAD_REPLIES = 50
+
+
+@dataclass
+class Scenario:
+    name: str
+    route: str
+    # request(ctx, client) 在計時之外執行，返回 (路徑, 請求資料)；可在其中準備每次請求需要的資料
+    request: Callable
+    method: str = 'get'
+    user: str = None # None (匿名)、'member' 或 'admin'
+    # 成本與資料量成正比的情境 (例如完整匯出) 限制請求次數
+    max_iterations: int = None
+
+
+@dataclass
+class ScenarioResult:
+    name: str
+    route: str
+    method: str
+    iterations: int
+    p50_ms: float
+    p95_ms: float
+    p99_ms: float
+    mean_ms: float
+    queries_per_request: float
+    max_queries: int
+    peak_memory_kib: float
+    status_codes: dict = field(default_factory=dict)
+
+
+class BenchmarkContext:
+    """情境共用的資料：基準測試專用帳號、留言與游標"""
+
+    def __init__(self):
+        self.member = User.objects.create_user('benchmark_member', 'benchmark_member@example.com', 'benchmark-pass')
+        self.admin = User.objects.create_superuser('benchmark_admin', 'benchmark_admin@example.com', 'benchmark-pass')
+        self.message = Message.objects.create(author=self.member, subject='benchmark', content='benchmark', is_approved=True)
+        # 討論串：直接回覆與巢狀回覆各半
+        self.thread = Message.objects.create(author=self.member, subject='benchmark thread', content='benchmark', is_approved=True)
+        parent = self.thread
+        for n in range(THREAD_REPLIES):
+            reply = Message.objects.create(
+                author=self.member, parent=parent, subject='Re: benchmark thread', content=f'reply {n}', is_approved=True,
+            )
+            parent = reply if n % 2 else self.thread
+        approved = Message.objects.filter(is_approved=True).order_by('-created_at', '-id')
+        deep = approved.values_list('created_at', 'id')[DEEP_PAGE_OFFSET:DEEP_PAGE_OFFSET + 1]
+        self.deep_cursor = encode_cursor(*deep[0]) if deep else None
+        self.live_cursor = encode_cursor(timezone.now() - timedelta(minutes=5), 0)
+        latest = approved.exclude(pk=self.message.pk).values_list('subject', flat=True).first()
+        self.search_term = latest.split()[0] if latest else 'benchmark'
+        self.uidb64 = urlsafe_base64_encode(force_bytes(self.member.pk))
+        self.token = default_token_generator.make_token(self.member)
+        self.post_numbers = itertools.count()
+
+    def client_for(self, user):
+        client = Client()
+        if user == 'member':
+            client.force_login(self.member)
+        elif user == 'admin':
+            client.force_login(self.admin)
+        return client
+
+    def new_message(self, **kwargs):
+        return Message.objects.create(author=self.member, subject='benchmark', content='benchmark', **kwargs)
+
+    def new_pending_messages(self, count=50):
+        Message.objects.bulk_create([
+            Message(author=self.member, subject=f'benchmark pending {n}', content='benchmark') for n in range(count)
+        ])
+        return list(Message.objects.filter(author=self.member, is_approved=False).values_list('pk', flat=True))
+
+    def captcha_data(self):
+        from captcha.models import CaptchaStore
+        store = CaptchaStore.objects.create(challenge='BENCH', response='bench')
+        return {'captcha_0': store.hashkey, 'captcha_1': 'bench'}
+
+
+def _get(route, params=None):
+    return lambda ctx, client: (reverse(route), params or {})
+
+
+def _login_again(ctx, client):
+    client.force_login(ctx.member)
+    return reverse('logout'), {}
+
+
+def _approve_all_pending(ctx, client):
+    ctx.new_pending_messages()
+    return reverse('admin:approve_all_pending'), {}
+
+
+def default_scenarios():
+    return [
+        Scenario('message_list', 'message_list', _get('message_list')),
+        Scenario('message_list 深層游標', 'message_list',
+                 lambda ctx, client: (reverse('message_list'), {'after': ctx.deep_cursor} if ctx.deep_cursor else {})),
+        Scenario('message_list ?page=', 'message_list', _get('message_list', {'page': 5})),
+        Scenario('message_list 已登入', 'message_list', _get('message_list'), user='member'),
+        Scenario('search', 'search', lambda ctx, client: (reverse('search'), {'q': ctx.search_term})),
+        Scenario('message_archive', 'message_archive', _get('message_archive')),
+        Scenario('author_messages', 'author_messages',
+                 lambda ctx, client: (reverse('author_messages', args=[ctx.member.username]), {})),
+        Scenario('my_messages', 'my_messages', _get('my_messages'), user='member'),
+        Scenario('my_messages (待審核)', 'my_messages', _get('my_messages', {'status': 'pending'}), user='member'),
+        Scenario('api_messages', 'api_messages', _get('api_messages', {'limit': 100})),
+        Scenario('api_messages_export', 'api_messages_export', _get('api_messages_export'), max_iterations=5),
+        Scenario('api_messages_live', 'api_messages_live',
+                 lambda ctx, client: (reverse('api_messages_live'), {'last_event_id': ctx.live_cursor})),
+        Scenario('message_thread', 'message_thread',
+                 lambda ctx, client: (reverse('message_thread', args=[ctx.thread.pk]), {})),
+        Scenario('reply_message GET', 'reply_message',
+                 lambda ctx, client: (reverse('reply_message', args=[ctx.thread.pk]), {}), user='member'),
+        Scenario('reply_message POST', 'reply_message',
+                 lambda ctx, client: (reverse('reply_message', args=[ctx.thread.pk]), {
+                     'content': f'benchmark reply {next(ctx.post_numbers)}', **ctx.captcha_data(),
+                 }),
+                 method='post', user='member'),
+        # 每次回應不同的留言，否則同一使用者的重複回應不會進入緩衝區
+        Scenario('react_message POST', 'react_message',
+                 lambda ctx, client: (reverse('react_message', args=[ctx.new_message(is_approved=True).pk]), {'kind': 'like'}),
+                 method='post', user='member'),
+        Scenario('post_message GET', 'post_message', _get('post_message'), user='member'),
+        # 每次內容不同，否則會被當作重複留言合併 (見 board/dedup.py)
+        Scenario('post_message POST', 'post_message',
+                 lambda ctx, client: (reverse('post_message'), {
+                     'subject': 'benchmark', 'content': f'benchmark {next(ctx.post_numbers)}', **ctx.captcha_data(),
+                 }),
+                 method='post', user='member'),
+        Scenario('post_message POST (重複留言)', 'post_message',
+                 lambda ctx, client: (reverse('post_message'), {'subject': 'benchmark', 'content': 'benchmark', **ctx.captcha_data()}),
+                 method='post', user='member'),
+        Scenario('edit_message GET', 'edit_message',
+                 lambda ctx, client: (reverse('edit_message', args=[ctx.message.pk]), {}), user='member'),
+        Scenario('edit_message POST', 'edit_message',
+                 lambda ctx, client: (reverse('edit_message', args=[ctx.message.pk]), {'subject': 'benchmark', 'content': 'edited'}),
+                 method='post', user='member'),
+        Scenario('delete_message GET', 'delete_message',
+                 lambda ctx, client: (reverse('delete_message', args=[ctx.message.pk]), {}), user='member'),
+        Scenario('delete_message POST', 'delete_message',
+                 lambda ctx, client: (reverse('delete_message', args=[ctx.new_message().pk]), {}), method='post', user='member'),
+        Scenario('signup', 'signup', _get('signup')),
+        Scenario('login', 'login', _get('login')),
+        Scenario('logout', 'logout', _login_again, method='post'),
+        Scenario('password_reset', 'password_reset', _get('password_reset')),
+        Scenario('password_reset_done', 'password_reset_done', _get('password_reset_done')),
+        Scenario('password_reset_confirm', 'password_reset_confirm',
+                 lambda ctx, client: (reverse('password_reset_confirm', args=[ctx.uidb64, ctx.token]), {})),
+        Scenario('password_reset_complete', 'password_reset_complete', _get('password_reset_complete')),
+        Scenario('admin 留言列表', 'admin:board_message_changelist', _get('admin:board_message_changelist'), user='admin'),
+        Scenario('admin 留言列表 (待審核)', 'admin:board_message_changelist',
+                 _get('admin:board_message_changelist', {'is_approved__exact': 0}), user='admin'),
+        Scenario('admin 留言搜尋', 'admin:board_message_changelist',
+                 lambda ctx, client: (reverse('admin:board_message_changelist'), {'q': ctx.search_term}), user='admin'),
+        Scenario('admin 批量通過並通知 (50 條)', 'admin:board_message_changelist',
+                 lambda ctx, client: (reverse('admin:board_message_changelist'), {
+                     'action': 'mark_approved_and_notify', '_selected_action': ctx.new_pending_messages(),
+                 }),
+                 method='post', user='admin'),
+        # 第一次 (暖身) 請求會通過資料庫中全部待審核留言，之後每次通過 50 條
+        Scenario('admin 快速通過全部 (50 條)', 'admin:approve_all_pending', _approve_all_pending,
+                 method='post', user='admin'),
+    ]
+
+
+def percentile(values, pct):
+    """最近秩 (nearest-rank) 百分位數"""
+    ordered = sorted(values)
+    index = max(0, math.ceil(pct / 100 * len(ordered)) - 1)
+    return ordered[index]
+
+
+def _consume(response):
+    if response.streaming:
+        for _ in response.streaming_content:
+            pass
+    return response
+
+
+def _send(client, method, path, data):
+    with ExitStack() as stack:
+        captures = [stack.enter_context(CaptureQueriesContext(connections[alias])) for alias in connections]
+        start = time.perf_counter()
+        response = _consume(getattr(client, method)(path, data))
+        elapsed = time.perf_counter() - start
+    return response, elapsed, sum(len(capture) for capture in captures)
+
+
+def run_scenario(ctx, scenario, iterations, warmup):
+    if scenario.max_iterations:
+        iterations = min(iterations, scenario.max_iterations)
+    client = ctx.client_for(scenario.user)
+    timings, queries, status_codes = [], [], {}
+
+    for n in range(warmup + iterations):
+        path, data = scenario.request(ctx, client)
+        response, elapsed, query_count = _send(client, scenario.method, path, data)
+        if n < warmup:
+            continue
+        timings.append(elapsed * 1000)
+        queries.append(query_count)
+        status_codes[str(response.status_code)] = status_codes.get(str(response.status_code), 0) + 1
+
+    already_tracing = tracemalloc.is_tracing()
+    if not already_tracing:
+        tracemalloc.start()
+    peak = 0
+    try:
+        for _ in range(min(MEMORY_SAMPLES, iterations)):
+            path, data = scenario.request(ctx, client)
+            tracemalloc.reset_peak()
+            _consume(getattr(client, scenario.method)(path, data))
+            peak = max(peak, tracemalloc.get_traced_memory()[1])
+    finally:
+        if not already_tracing:
+            tracemalloc.stop()
+
+    return ScenarioResult(
+        name=scenario.name,
+        route=scenario.route,
+        method=scenario.method.upper(),
+        iterations=iterations,
+        p50_ms=round(percentile(timings, 50), 3),
+        p95_ms=round(percentile(timings, 95), 3),
+        p99_ms=round(percentile(timings, 99), 3),
+        mean_ms=round(statistics.fmean(timings), 3),
+        queries_per_request=round(statistics.fmean(queries), 2),
+        max_queries=max(queries),
+        peak_memory_kib=round(peak / 1024, 1),
+        status_codes=status_codes,
+    )
+
+
+def uncovered_routes(scenarios):
+    """urls.py 中沒有任何情境覆蓋的具名路由"""
+    names = {p.name for p in get_resolver().url_patterns if isinstance(p, URLPattern) and p.name}
+    return sorted(names - {scenario.route for scenario in scenarios})
+
+
+def run_benchmark(iterations=50, warmup=3, only=None, progress=None):
+    """執行基準測試並返回可直接序列化為 JSON 的結果；only 為要執行的情境名稱或路由名稱集合"""
+    scenarios = [s for s in default_scenarios() if not only or s.name in only or s.route in only]
+    results = []
+    # 測試客戶端使用 testserver 主機名；郵件只寫入記憶體；重複提交表單不受速率限制；
+    # 快取寫入獨立的記憶體快取 (資料庫回滾不會撤銷快取的寫入)
+    with override_settings(
+        ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver'],
+        EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend',
+        RATE_LIMITS={},
+        CACHES=BENCHMARK_CACHES,
+    ), transaction.atomic():
+        cache.clear()
+        ctx = BenchmarkContext()
+        metadata = {
+            'database': connection.vendor,
+            'users': User.objects.count(),
+            'messages': Message.objects.count(),
+            'approved_messages': Message.objects.filter(is_approved=True).count(),
+        }
+        for scenario in scenarios:
+            result = run_scenario(ctx, scenario, iterations, warmup)
+            results.append(result)
+            if progress:
+                progress(result)
+        # 回滾基準測試期間寫入的所有資料，並清空其間的快取
+        transaction.set_rollback(True)
+        cache.clear()
+    reaction_buffer.drain() # 尚未寫入的點擊指向已回滾的留言
+
+    return {
+        'created_at': timezone.now().isoformat(),
+        'iterations': iterations,
+        'warmup': warmup,
+        **metadata,
+        'uncovered_routes': uncovered_routes(scenarios) if not only else [],
+        'scenarios': [result.__dict__ for result in results],
+    }
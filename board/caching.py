@@ -0,0 +1,193 @@
+# board/caching.py
+"""
+留言列表的伺服器端頁面快取。
+
+快取鍵包含一個全域的「留言板版本號」，每當有留言的可見性改變
+（審核通過、取消審核、修改後待重審、刪除）時就遞增版本號，
+舊版本的快取項目自然失效，不需要逐一刪除，也不會回傳過期的頁面。
+
+同一個版本號也用於條件式 GET：ETag 由版本號、分頁參數與檢視者組成，
+Last-Modified 為最後一次遞增版本號的時間，兩者都只需要讀取快取，不查詢資料庫。
+
+沒有帶任何 cookie 的匿名 GET (見 sessionless_for_anonymous) 完全不讀寫 session、不設定 cookie，
+回應帶有 public 的 Cache-Control 與 Vary: Cookie，可直接由 CDN / 反向代理提供。
+"""
+import hashlib
+import time
+from datetime import datetime, timezone as dt_timezone
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.contrib import messages
+from django.contrib.auth.models import AnonymousUser
+from django.contrib.messages.storage.cookie import CookieStorage
+from django.core.cache import cache
+from django.db import transaction
+from django.utils.cache import patch_cache_control, patch_vary_headers
+
+BOARD_VERSION_KEY = 'board:version'
+BOARD_CHANGED_AT_KEY = 'board:changed_at'
+
+# 部署版本，包含在 ETag 中，使模板更新後瀏覽器不會繼續使用舊頁面
+RELEASE_VERSION = getattr(settings, 'RELEASE_VERSION', '')
+
+# 列表片段的快取時間（秒），設為 0 可停用
+MESSAGE_LIST_CACHE_TIMEOUT = getattr(settings, 'MESSAGE_LIST_CACHE_TIMEOUT', 300)
+
+# 沒有 cookie 的匿名讀取不使用 session，回應可由共用快取保存
+SESSIONLESS_ANONYMOUS_READS = getattr(settings, 'SESSIONLESS_ANONYMOUS_READS', True)
+# 上述回應在共用快取中的有效秒數 (s-maxage)；瀏覽器本身每次仍以 ETag 重新驗證
+ANONYMOUS_CACHE_MAX_AGE = getattr(settings, 'ANONYMOUS_CACHE_MAX_AGE', 30)
+
+
+def _new_version():
+    # 以毫秒時間戳作為起始值：快取被清空後重新初始化也不會與舊的版本號重複
+    return int(time.time() * 1000)
+
+
+def get_board_version():
+    """取得目前的留言板版本號"""
+    version = cache.get(BOARD_VERSION_KEY)
+    if version is None:
+        cache.add(BOARD_VERSION_KEY, _new_version(), None)
+        version = cache.get(BOARD_VERSION_KEY)
+    return version
+
+
+def bump_board_version():
+    """遞增留言板版本號，使所有已快取的列表頁失效"""
+    cache.set(BOARD_CHANGED_AT_KEY, time.time(), None)
+    try:
+        return cache.incr(BOARD_VERSION_KEY)
+    except ValueError:
+        # 鍵不存在（首次使用或已被淘汰）
+        version = _new_version()
+        cache.set(BOARD_VERSION_KEY, version, None)
+        return version
+
+
+def bump_board_version_on_commit():
+    """
+    在目前的交易提交後才遞增版本號 (不在交易中時立即遞增)。
+    提交前遞增的話，並發的請求仍讀到舊的資料，卻以新的版本號快取並作為 ETag，直到下一次寫入前都不會更新
+    """
+    transaction.on_commit(bump_board_version)
+
+
+def _page_params(request):
+    return '&'.join(f'{name}={request.GET.get(name, "")}' for name in ('page', 'after', 'before'))
+
+
+def _viewer(request):
+    return f'u{request.user.pk}' if request.user.is_authenticated else 'anon'
+
+
+def message_list_cache_key(request, version=None):
+    """
+    依據版本號、分頁參數與檢視者生成快取鍵。
+    已登入使用者有自己的變體，因為列表中會顯示其本人留言的修改/刪除按鈕。
+    """
+    if version is None:
+        version = get_board_version()
+    digest = hashlib.md5(_page_params(request).encode('utf-8')).hexdigest()
+    return f'board:list:v{version}:{_viewer(request)}:{digest}'
+
+
+def board_last_modified():
+    """最後一次留言可見性改變的時間；快取中沒有記錄時返回 None"""
+    changed_at = cache.get(BOARD_CHANGED_AT_KEY)
+    if changed_at is None:
+        return None
+    return datetime.fromtimestamp(changed_at, tz=dt_timezone.utc)
+
+
+def _has_flash_messages(request):
+    # len() 只載入訊息，不會把它們標記為已讀取
+    return len(messages.get_messages(request)) > 0
+
+
+def message_list_etag(request):
+    """
+    message_list 的 ETag。有待顯示的提示訊息時不提供 ETag，必須重新渲染。
+    已登入使用者的頁面含有登出表單的 CSRF token，因此也依 CSRF cookie 區分。
+    """
+    if _has_flash_messages(request):
+        return None
+    viewer = _viewer(request)
+    if request.user.is_authenticated:
+        viewer += ':' + request.COOKIES.get(settings.CSRF_COOKIE_NAME, '')
+    raw = f'{RELEASE_VERSION}|{get_board_version()}|{viewer}|{_page_params(request)}'
+    return hashlib.md5(raw.encode('utf-8')).hexdigest()
+
+
+def message_list_last_modified(request):
+    # 已登入使用者的頁面還取決於使用者本身，只以 ETag 驗證
+    if request.user.is_authenticated or _has_flash_messages(request):
+        return None
+    return board_last_modified()
+
+
+def api_etag(request):
+    """JSON API 的 ETag：版本號與完整的查詢參數 (不依檢視者變化)"""
+    raw = f'{RELEASE_VERSION}|{get_board_version()}|{request.path}|{request.GET.urlencode()}'
+    return hashlib.md5(raw.encode('utf-8')).hexdigest()
+
+
+def api_last_modified(request):
+    return board_last_modified()
+
+
+def is_cookieless_anonymous(request):
+    """沒有 session cookie 與提示訊息 cookie 的 GET：必然是匿名使用者，也必然沒有待顯示的提示訊息"""
+    return (
+        SESSIONLESS_ANONYMOUS_READS
+        and request.method in ('GET', 'HEAD')
+        and settings.SESSION_COOKIE_NAME not in request.COOKIES
+        and CookieStorage.cookie_name not in request.COOKIES
+    )
+
+
+def _enter_sessionless(request):
+    # 直接使用匿名使用者並移除訊息儲存，之後的 ETag 計算、模板渲染與中介層都不會接觸 session
+    user = AnonymousUser()
+
+    async def auser():
+        return user
+
+    request.user = user
+    request.auser = auser
+    if hasattr(request, '_messages'):
+        del request._messages
+    request.sessionless = True
+
+
+def _shared_cache_headers(response):
+    if response.status_code in (200, 304):
+        patch_cache_control(response, public=True, max_age=0, s_maxage=ANONYMOUS_CACHE_MAX_AGE)
+    # 帶有 cookie (可能已登入) 的請求會得到不同的頁面
+    patch_vary_headers(response, ('Cookie',))
+    return response
+
+
+def sessionless_for_anonymous(view):
+    """
+    沒有 cookie 的匿名 GET 不讀寫 session、不設定 cookie，並加上共用快取可用的 Cache-Control 與 Vary。
+    提示訊息與 CSRF cookie 只會在使用者登入或打開表單之後才產生。
+    必須放在 condition 裝飾器之外，使 ETag 計算同樣不接觸 session。
+    """
+    if iscoroutinefunction(view):
+        @wraps(view)
+        async def inner(request, *args, **kwargs):
+            if not is_cookieless_anonymous(request):
+                return await view(request, *args, **kwargs)
+            _enter_sessionless(request)
+            return _shared_cache_headers(await view(request, *args, **kwargs))
+    else:
+        @wraps(view)
+        def inner(request, *args, **kwargs):
+            if not is_cookieless_anonymous(request):
+                return view(request, *args, **kwargs)
+            _enter_sessionless(request)
+            return _shared_cache_headers(view(request, *args, **kwargs))
+    return inner
@@ -0,0 +1,143 @@
+# board/captcha_pool.py
+"""
+驗證碼池。
+
+django-simple-captcha 預設在每次渲染表單時寫入一條 CaptchaStore，並在每次讀取圖片時用 Pillow 即時繪製 PNG；
+垃圾留言高峰時這兩件事佔據了發文路徑的大部分成本。這裡改為：
+
+- `python manage.py fill_captcha_pool` 在背景預先生成驗證碼與 PNG (PooledCaptcha)，維持池中有足夠的可用項目
+- 表單 (board/forms.py 的 PooledCaptchaTextInput) 與 AJAX 刷新 (board/views.py 的 captcha_refresh)
+  以索引查詢取用一個未發出的項目，並以條件式 UPDATE 標記為已發出；發出後的作答期限縮短為 CAPTCHA_TIMEOUT 分鐘
+- 圖片路由 (board/views.py 的 captcha_image) 直接返回已渲染的 PNG
+- sweep_captcha_pool() 批量刪除已作答或已過期的項目
+
+池為空時退回 django-simple-captcha 原本的即時生成，表單仍可使用。
+django-simple-captcha 自己的 CaptchaStore.pick() 會隨機挑選任何未過期的驗證碼 (包括已發出的)，不應被使用。
+"""
+import logging
+import random
+import secrets
+import time
+from datetime import timedelta
+
+from captcha.conf import settings as captcha_settings
+from captcha.models import CaptchaStore
+from captcha.views import captcha_image as render_captcha_image
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import PooledCaptcha
+
+logger = logging.getLogger(__name__)
+
+# 池中維持的可用驗證碼數量
+CAPTCHA_POOL_SIZE = getattr(settings, 'CAPTCHA_POOL_SIZE', 500)
+# 池中驗證碼的有效時間 (分鐘)，過期後由 sweep_captcha_pool 刪除，使題目定期更換
+CAPTCHA_POOL_ENTRY_TIMEOUT = getattr(settings, 'CAPTCHA_POOL_ENTRY_TIMEOUT', 24 * 60)
+# 每次取用時讀取的候選數量，從中隨機挑選，減少並發請求搶同一個項目
+DRAW_CANDIDATES = 16
+# 池用盡的警告每隔多少秒最多記錄一次 (預設與 fill_captcha_pool 每輪檢查的間隔相同)，避免每個請求都寫一條日誌
+CAPTCHA_POOL_WARNING_INTERVAL = getattr(settings, 'CAPTCHA_POOL_WARNING_INTERVAL', 30)
+
+_last_exhausted_warning = None
+
+
+def _answer_deadline(now):
+    # 發出的驗證碼至少要留給使用者 CAPTCHA_TIMEOUT 分鐘作答
+    return now + timedelta(minutes=int(captcha_settings.CAPTCHA_TIMEOUT))
+
+
+def available():
+    """可以發出的驗證碼"""
+    now = timezone.now()
+    return PooledCaptcha.objects.filter(issued_at__isnull=True, expires_at__gt=_answer_deadline(now))
+
+
+def draw_captcha():
+    """從池中取用一個驗證碼，返回 hashkey；池為空時返回 None"""
+    candidates = list(available().order_by('expires_at').values_list('pk', 'hashkey')[:DRAW_CANDIDATES])
+    random.shuffle(candidates)
+    now = timezone.now()
+    deadline = _answer_deadline(now)
+    for pk, hashkey in candidates:
+        # 以 issued_at IS NULL 為條件，確保同一個驗證碼只會發給一個表單
+        if PooledCaptcha.objects.filter(pk=pk, issued_at__isnull=True).update(issued_at=now, expires_at=deadline):
+            # 發出之後與即時生成的驗證碼一樣只在 CAPTCHA_TIMEOUT 分鐘內有效，而不是池項目的 CAPTCHA_POOL_ENTRY_TIMEOUT
+            CaptchaStore.objects.filter(hashkey=hashkey).update(expiration=deadline)
+            return hashkey
+    return None
+
+
+def pooled_captcha_key():
+    """表單使用的驗證碼鍵：優先從池中取用，池為空時即時生成"""
+    global _last_exhausted_warning
+    hashkey = draw_captcha()
+    if hashkey is None:
+        now = time.monotonic()
+        if _last_exhausted_warning is None or now - _last_exhausted_warning >= CAPTCHA_POOL_WARNING_INTERVAL:
+            _last_exhausted_warning = now
+            logger.warning('驗證碼池已用盡，改為即時生成；請確認 fill_captcha_pool 正在執行')
+        hashkey = CaptchaStore.generate_key()
+    return hashkey
+
+
+def pooled_captcha_png(hashkey):
+    """池中已渲染的 PNG；不在池中時返回 None"""
+    return PooledCaptcha.objects.filter(hashkey=hashkey).values_list('image', flat=True).first()
+
+
+def generate_captchas(count):
+    """生成 count 個驗證碼並渲染 PNG，返回生成的數量"""
+    expires_at = timezone.now() + timedelta(minutes=CAPTCHA_POOL_ENTRY_TIMEOUT)
+    challenge_function = captcha_settings.get_challenge()
+    stores = []
+    for _ in range(count):
+        challenge, response = challenge_function()
+        stores.append(CaptchaStore(
+            challenge=challenge,
+            response=response.lower(), # 與 CaptchaStore.save() 相同
+            hashkey=secrets.token_hex(20),
+            expiration=expires_at,
+        ))
+    CaptchaStore.objects.bulk_create(stores)
+    # 使用 django-simple-captcha 自己的繪製函數，圖片與即時生成的完全相同
+    PooledCaptcha.objects.bulk_create([
+        PooledCaptcha(hashkey=store.hashkey, image=render_captcha_image(None, store.hashkey).content, expires_at=expires_at)
+        for store in stores
+    ])
+    return len(stores)
+
+
+def fill_captcha_pool(size=CAPTCHA_POOL_SIZE, batch_size=100):
+    """補充驗證碼池至 size 個可用項目，返回新生成的數量"""
+    missing = size - available().count()
+    created = 0
+    while missing > 0:
+        count = generate_captchas(min(batch_size, missing))
+        created += count
+        missing -= count
+    return created
+
+
+def expired_captcha_stores(now):
+    return CaptchaStore.objects.filter(expiration__lte=now)
+
+
+def stale_pool_entries(now):
+    """已過期，或已作答 (CaptchaStore 已被 CaptchaField 刪除) 的池項目"""
+    return PooledCaptcha.objects.filter(
+        Q(expires_at__lte=now)
+        | Q(issued_at__isnull=False) & ~Q(hashkey__in=CaptchaStore.objects.values('hashkey'))
+    )
+
+
+def sweep_captcha_pool():
+    """
+    批量刪除已過期的驗證碼，以及已作答的池項目 (數量很大時改用 enforce_retention 分批刪除)。
+    返回 (刪除的 CaptchaStore 數量, 刪除的池項目數量)。
+    """
+    now = timezone.now()
+    stores_deleted = expired_captcha_stores(now).delete()[0]
+    pool_deleted = stale_pool_entries(now).delete()[0]
+    return stores_deleted, pool_deleted
@@ -0,0 +1,71 @@
+# board/cards.py
+"""
+留言卡片的預先渲染。
+
+- 留言內容的 HTML (跳脫並把換行轉為 <br>) 在保存時就寫入 Message.content_html，列表查詢不需要讀取 content
+- 每張卡片與檢視者無關的部分 (標題、內容、作者與時間) 依 (id, updated_at) 快取，
+  留言被修改時 updated_at 改變，自然使用新的快取鍵
+- 列表頁 (board/message_list_items.html) 只需要把快取的片段串起來，再加上與檢視者有關的修改/刪除按鈕
+
+整頁的留言列表片段另外以留言板版本號快取 (見 board/caching.py)；審核新留言使整頁快取失效時，
+其餘卡片仍可直接從這裡取得。
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.template.defaultfilters import linebreaksbr
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+
+# 卡片片段的快取時間 (秒)；鍵中包含 updated_at，修改留言不需要主動清除
+MESSAGE_CARD_CACHE_TIMEOUT = getattr(settings, 'MESSAGE_CARD_CACHE_TIMEOUT', 24 * 3600)
+RELEASE_VERSION = getattr(settings, 'RELEASE_VERSION', '')
+
+
+def render_content(content):
+    """留言內容的 HTML：與模板中的 {{ content|linebreaksbr }} 相同"""
+    return linebreaksbr(content, autoescape=True)
+
+
+def card_cache_key(message):
+    # 部署新版本時模板可能已改變，鍵中加入版本號
+    return f'board:card:{RELEASE_VERSION}:{message.pk}:{message.updated_at.timestamp()}'
+
+
+def render_card(message):
+    """返回 (標題與內容, 作者與時間) 兩段 HTML"""
+    # 從資料庫讀出的 content_html 是保存時已跳脫的 HTML
+    content_html = mark_safe(message.content_html) if message.content_html else render_content(message.content)
+    context = {'message': message, 'content_html': content_html}
+    return (
+        render_to_string('board/message_card.html', context),
+        render_to_string('board/message_byline.html', context),
+    )
+
+
+def _apply_cards(messages, cached):
+    missing = {}
+    for message in messages:
+        key = card_cache_key(message)
+        fragments = cached.get(key)
+        if fragments is None:
+            fragments = missing[key] = render_card(message)
+        message.card_html, message.byline_html = map(mark_safe, fragments)
+    return missing
+
+
+def attach_cards(page_obj):
+    """為一頁留言附上卡片片段 (card_html、byline_html)，快取中沒有的才渲染"""
+    page_obj.object_list = messages = list(page_obj.object_list)
+    missing = _apply_cards(messages, cache.get_many([card_cache_key(m) for m in messages]))
+    if missing:
+        cache.set_many(missing, MESSAGE_CARD_CACHE_TIMEOUT)
+    return page_obj
+
+
+async def aattach_cards(page_obj):
+    """attach_cards 的非同步版本，以非同步 API 讀寫快取"""
+    page_obj.object_list = messages = list(page_obj.object_list)
+    missing = _apply_cards(messages, await cache.aget_many([card_cache_key(m) for m in messages]))
+    if missing:
+        await cache.aset_many(missing, MESSAGE_CARD_CACHE_TIMEOUT)
+    return page_obj
@@ -0,0 +1,37 @@
+# board/dedup.py
+"""
+重複留言的內容指紋。
+
+垃圾留言通常以相同的主題與內容大量提交，只在大小寫、空白或標點上略有不同。
+保存留言時把主題與內容正規化後計算 SHA-256 (Message.fingerprint，有索引)：
+- 發布留言時，若同一位使用者在 DUPLICATE_WINDOW_HOURS 小時內已有相同指紋的留言，不再新增一條，
+  而是把那一條的 duplicate_count 加一 (不產生新的審核項目與管理員通知郵件)
+- 修改留言時，若改成與自己另一條留言相同的內容則拒絕
+- 與其他使用者的近期留言相同時不合併 (不能把一個人的提交算到別人的留言上)，照常保存但不自動通過審核
+"""
+import hashlib
+import unicodedata
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+
+# 只與這段時間內的留言比對；很短的常見留言 (例如「謝謝」) 過一段時間後仍可再次發布
+DUPLICATE_WINDOW_HOURS = getattr(settings, 'DUPLICATE_WINDOW_HOURS', 72)
+
+
+def normalize(text):
+    """全形/半形統一、不分大小寫，並去掉空白與標點，只保留文字與數字"""
+    text = unicodedata.normalize('NFKC', text).casefold()
+    normalized = ''.join(ch for ch in text if unicodedata.category(ch)[0] in 'LN')
+    # 只有標點或表情符號的內容不能全部視為相同，改為只去掉空白
+    return normalized or ''.join(text.split())
+
+
+def content_fingerprint(subject, content):
+    raw = f'{normalize(subject)}\x00{normalize(content)}'
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+
+def duplicate_window_start():
+    return timezone.now() - timedelta(hours=DUPLICATE_WINDOW_HOURS)
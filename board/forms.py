@@ -1,8 +1,11 @@
 # board/forms.py
 from django import forms
 from django.contrib.auth.forms import UserCreationForm
-from captcha.fields import CaptchaField
+from captcha.fields import CaptchaField, CaptchaTextInput
 from .models import Message
+from .captcha_pool import pooled_captcha_key
+from .dedup import content_fingerprint
+from .threads import reply_subject
 # from django.conf import settings as django_settings # For debugging - Removed
 
 # Debugging CaptchaField - Removed
@@ -16,8 +19,17 @@ from .models import Message
 #             print(f"DEBUG CaptchaField.clean: ValidationError = {e}")
 #             raise
 
+class PooledCaptchaTextInput(CaptchaTextInput):
+    """從驗證碼池 (board/captcha_pool.py) 取用驗證碼，而不是每次渲染都寫入一條新的 CaptchaStore"""
+
+    def fetch_captcha_store(self, name, value, attrs=None, generator=None):
+        self._key = pooled_captcha_key()
+        self._value = [self._key, '']
+        self.id_ = self.build_attrs(attrs).get('id', None)
+
+
 class MessageForm(forms.ModelForm):
-    captcha = CaptchaField(label="驗證碼") # Reverted to original CaptchaField
+    captcha = CaptchaField(label="驗證碼", widget=PooledCaptchaTextInput()) # Reverted to original CaptchaField
 
     class Meta:
         model = Message
@@ -29,8 +41,12 @@ class MessageForm(forms.ModelForm):
 
     def __init__(self, *args, **kwargs):
         is_editing = kwargs.pop('is_editing', False) # 檢查是否為編輯模式
+        author = kwargs.pop('author', None) # 發布者：重複留言只與同一位使用者的留言合併
         super().__init__(*args, **kwargs)
-        self.fields['subject'].label = "主題"
+        if author is not None:
+            self.instance.author = author
+        if 'subject' in self.fields: # 回覆 (ReplyForm) 沒有主題欄位
+            self.fields['subject'].label = "主題"
         self.fields['content'].label = "留言內容"
 
         if is_editing or self.instance and self.instance.pk: # 如果是編輯現有實例，則移除驗證碼
@@ -41,6 +57,48 @@ class MessageForm(forms.ModelForm):
             meta_fields = list(self.Meta.fields)
             meta_fields.remove('captcha')
             self.Meta.fields = meta_fields
+        self.duplicate_of = None
+        self.matches_other_author = False
+
+    def clean(self):
+        cleaned_data = super().clean()
+        subject = cleaned_data.get('subject', self.instance.subject)
+        content = cleaned_data.get('content')
+        if self.errors or subject is None or content is None:
+            return cleaned_data # 驗證碼錯誤等情況不需要再查詢資料庫
+        # 回覆只與同一條留言之下的回覆比對 (「謝謝」出現在不同討論串中不算重複)
+        duplicates = Message.objects.duplicates_of(content_fingerprint(subject, content), self.instance.parent_id)
+        own = duplicates.filter(author_id=self.instance.author_id)
+        if self.instance.pk:
+            # 修改時不能改成與自己另一條留言相同的內容
+            if own.exclude(pk=self.instance.pk).exists():
+                raise forms.ValidationError('已經有相同內容的留言，請勿重複提交。')
+            duplicates = duplicates.exclude(pk=self.instance.pk)
+        else:
+            # 發布時由視圖把這次提交合併到自己既有的留言
+            self.duplicate_of = own.values_list('pk', flat=True).first()
+            if self.duplicate_of is not None:
+                return cleaned_data
+        # 與其他使用者的留言相同 (多個帳號發送同一則垃圾留言，或冒用他人的內容)：不合併到別人的留言，
+        # 照常保存但不自動通過，交由管理員審核
+        self.matches_other_author = duplicates.exists()
+        return cleaned_data
+
+
+class ReplyForm(MessageForm):
+    """回覆留言：只需要填寫內容，主題沿用討論串的主題 (見 board/threads.py)"""
+
+    class Meta(MessageForm.Meta):
+        fields = ['content', 'captcha']
+        widgets = {
+            'content': forms.Textarea(attrs={'class': 'form-control', 'placeholder': '請輸入回覆内容', 'rows': 4}),
+        }
+
+    def __init__(self, *args, parent, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fields['content'].label = "回覆內容"
+        self.instance.parent = parent
+        self.instance.subject = reply_subject(parent)
 
 
 class CustomUserCreationForm(UserCreationForm):
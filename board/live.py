@@ -0,0 +1,259 @@
+# board/live.py
+"""
+新審核通過留言的即時動態 (Server-Sent Events)，端點見 board/api.py 的 amessage_stream。
+
+每個進程只有一個 BroadcastHub。有客戶端連線時它運行一個輪詢任務：每隔 LIVE_FEED_POLL_INTERVAL 秒
+讀取一次留言板版本號 (只讀快取)，版本號改變時才以一條查詢取出新通過的留言，
+再分發給所有連線中的客戶端，資料庫負載與連線數無關。同一進程內的審核操作 (board/admin.py、
+board/approval.py) 會呼叫 notify_approved() 立即喚醒輪詢；其他進程的審核則由共用快取中的版本號發現。
+
+approved_at 在交易提交之前寫入，提交的順序不一定與 approved_at 相同：較早的時間可能在較晚的之後才可見。
+因此讀取位置 (FeedPosition) 不是單一的 (approved_at, id) 游標，而是一個重疊視窗：
+每次都重新掃描最新一條已發送留言之前 LIVE_FEED_OVERLAP 秒內通過的留言，以留言編號去除已發送的。
+事件的 id 即是這個位置 (視窗起點與視窗內已發送的編號)，瀏覽器斷線重連時以 Last-Event-ID 帶回，
+伺服器據此補發斷線期間的留言，不會重複也不會遺漏較晚提交的留言。
+"""
+import asyncio
+import json
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .caching import BOARD_VERSION_KEY
+from .models import Message
+from .pagination import decode_cursor, encode_cursor
+
+logger = logging.getLogger(__name__)
+
+# 輪詢留言板版本號的間隔 (秒)
+LIVE_FEED_POLL_INTERVAL = getattr(settings, 'LIVE_FEED_POLL_INTERVAL', 2)
+# 沒有新留言時發送註解行的間隔 (秒)，避免代理伺服器關閉閒置連線
+LIVE_FEED_HEARTBEAT = getattr(settings, 'LIVE_FEED_HEARTBEAT', 15)
+# 連線中斷後瀏覽器重連的等待時間 (毫秒)；同步部署時即為輪詢間隔
+LIVE_FEED_RETRY_MS = getattr(settings, 'LIVE_FEED_RETRY_MS', 5000)
+# 重新掃描的視窗 (秒)：應大於審核交易最長的執行時間加上各伺服器之間的時鐘誤差
+LIVE_FEED_OVERLAP = getattr(settings, 'LIVE_FEED_OVERLAP', 30)
+# 每次查詢最多取出的留言數
+LIVE_FEED_BATCH_SIZE = 100
+# 讀取位置最多記住的已發送編號 (Last-Event-ID 的長度上限)；超過時視窗起點前移
+LIVE_FEED_MAX_SEEN = 200
+# 留言編號的上限 (64 位元整數)：超出範圍的編號傳入查詢時會使資料庫驅動溢出
+MAX_MESSAGE_ID = 2 ** 63 - 1
+# 每個客戶端最多積壓的事件數，超過時斷開該客戶端 (重連後以 Last-Event-ID 補發)
+SUBSCRIBER_QUEUE_SIZE = 200
+
+EVENT_FIELDS = ('id', 'subject', 'content', 'created_at', 'approved_at')
+
+
+class FeedPosition:
+    """
+    即時動態的讀取位置：approved_at 早於 since 的留言視為已處理；
+    since 之後的留言以 seen ({編號: approved_at}) 去除已發送的
+    """
+
+    def __init__(self, since, seen=None):
+        self.since = since
+        self.seen = dict(seen or {})
+
+    @classmethod
+    def start(cls):
+        """從現在開始，只接收之後通過的留言"""
+        return cls(timezone.now())
+
+    @classmethod
+    def decode(cls, token):
+        """解碼 Last-Event-ID，格式錯誤或編號超出範圍時返回 None (視為新的連線)"""
+        head, _, tail = (token or '').partition('.')
+        cursor = decode_cursor(head)
+        if cursor is None:
+            return None
+        since, pk = cursor
+        seen = {pk: since} if pk else {} # 舊格式的 (approved_at, id) 游標
+        try:
+            for item in filter(None, tail.split(',')):
+                pk, offset = item.split(':')
+                seen[int(pk)] = since + timedelta(microseconds=int(offset))
+        except (ValueError, OverflowError):
+            return None
+        if not all(0 <= pk <= MAX_MESSAGE_ID for pk in seen):
+            return None
+        return cls(since, seen)
+
+    def encode(self):
+        token = encode_cursor(self.since, 0)
+        if self.seen:
+            token += '.' + ','.join(
+                f'{pk}:{(approved_at - self.since) // timedelta(microseconds=1)}'
+                for pk, approved_at in self.seen.items()
+            )
+        return token
+
+    def rows(self):
+        """視窗內尚未發送的已審核留言，依通過順序排列"""
+        queryset = Message.objects.filter(is_approved=True, approved_at__gte=self.since)
+        if self.seen:
+            queryset = queryset.exclude(pk__in=list(self.seen))
+        return (
+            queryset.order_by('approved_at', 'id')
+            .values(*EVENT_FIELDS, author_name=F('author__username'))[:LIVE_FEED_BATCH_SIZE]
+        )
+
+    def accept(self, row):
+        """記錄一條留言；已發送過或早於視窗的返回 False"""
+        pk, approved_at = row['id'], row['approved_at']
+        if pk in self.seen or approved_at < self.since:
+            return False
+        self.seen[pk] = approved_at
+        since = max(self.since, max(self.seen.values()) - timedelta(seconds=LIVE_FEED_OVERLAP))
+        if len(self.seen) > LIVE_FEED_MAX_SEEN:
+            # 記不下的最早幾條：視窗起點移到它們之後
+            dropped = sorted(self.seen.values())[len(self.seen) - LIVE_FEED_MAX_SEEN - 1]
+            since = max(since, dropped + timedelta(microseconds=1))
+        self.since = since
+        self.seen = {key: value for key, value in self.seen.items() if value >= since}
+        return True
+
+
+def event_data(row):
+    return json.dumps(row, cls=DjangoJSONEncoder, ensure_ascii=False, separators=(',', ':'))
+
+
+def format_event(position, data):
+    return f"id: {position.encode()}\nevent: message\ndata: {data}\n\n"
+
+
+def stream_preamble(position):
+    """連線開始時發送：重連間隔，以及帶有目前位置的 ready 事件 (使瀏覽器記住 Last-Event-ID)"""
+    return f"retry: {LIVE_FEED_RETRY_MS}\nid: {position.encode()}\nevent: ready\ndata: {{}}\n\n"
+
+
+def position_events(position):
+    """以一條查詢取出位置之後的留言，返回事件文字的列表 (同時更新位置)"""
+    return [format_event(position, event_data(row)) for row in position.rows() if position.accept(row)]
+
+
+class BroadcastHub:
+    """進程內的廣播中心：一個輪詢任務，分發給所有訂閱者的佇列"""
+
+    def __init__(self, poll_interval=LIVE_FEED_POLL_INTERVAL):
+        self.poll_interval = poll_interval
+        self.subscribers = set()
+        self._loop = None
+        self._wakeup = None
+        self._task = None
+        self._position = None
+        self._version = None
+
+    def subscribe(self):
+        """在事件循環中呼叫，返回接收 (留言, 事件資料) 的佇列；收到 None 表示被斷開"""
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._loop = loop
+            self._wakeup = asyncio.Event()
+            self._task = None
+            self.subscribers = set()
+        queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        self.subscribers.add(queue)
+        if self._task is None or self._task.done():
+            # 從一個重疊視窗之前開始，涵蓋剛開始時仍未提交的審核；各客戶端依自己的位置去除重複
+            self._position = FeedPosition(timezone.now() - timedelta(seconds=LIVE_FEED_OVERLAP))
+            self._task = loop.create_task(self._run())
+        return queue
+
+    def unsubscribe(self, queue):
+        self.subscribers.discard(queue)
+        if not self.subscribers and self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    def notify(self):
+        """有留言通過審核時呼叫 (可在任何執行緒中)，立即喚醒輪詢"""
+        loop = self._loop
+        if loop is not None and not loop.is_closed():
+            loop.call_soon_threadsafe(self._wakeup.set)
+
+    async def _run(self):
+        try:
+            self._version = await cache.aget(BOARD_VERSION_KEY)
+            await self._poll()
+        except Exception:
+            logger.exception('即時動態輪詢失敗')
+        while self.subscribers:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+                woken = True
+            except TimeoutError:
+                woken = False
+            self._wakeup.clear()
+            try:
+                version = await cache.aget(BOARD_VERSION_KEY)
+                if woken or version != self._version:
+                    self._version = version
+                    await self._poll()
+            except Exception:
+                logger.exception('即時動態輪詢失敗')
+
+    async def _poll(self):
+        while True:
+            rows = [row async for row in self._position.rows().aiterator()]
+            for row in rows:
+                if self._position.accept(row):
+                    self.publish(row, event_data(row))
+            if len(rows) < LIVE_FEED_BATCH_SIZE:
+                return
+
+    def publish(self, row, data):
+        for queue in list(self.subscribers):
+            try:
+                queue.put_nowait((row, data))
+            except asyncio.QueueFull:
+                # 客戶端讀取太慢：清空佇列並通知它結束連線
+                self.subscribers.discard(queue)
+                while not queue.empty():
+                    queue.get_nowait()
+                queue.put_nowait(None)
+
+
+live_hub = BroadcastHub()
+
+
+def notify_approved():
+    """審核操作後呼叫：交易提交後喚醒本進程的即時動態"""
+    transaction.on_commit(live_hub.notify)
+
+
+async def live_events(position=None):
+    """單一客戶端的事件串流：先補發位置之後的留言，再轉發廣播中心的事件"""
+    position = position or FeedPosition.start()
+    yield stream_preamble(position)
+
+    queue = live_hub.subscribe()
+    try:
+        # 先訂閱再補發，兩者之間通過的留言不會遺漏 (重複的由位置去除)
+        while True:
+            rows = [row async for row in position.rows().aiterator()]
+            for row in rows:
+                if position.accept(row):
+                    yield format_event(position, event_data(row))
+            if len(rows) < LIVE_FEED_BATCH_SIZE:
+                break
+
+        while True:
+            try:
+                item = await asyncio.wait_for(queue.get(), LIVE_FEED_HEARTBEAT)
+            except TimeoutError:
+                yield ': keep-alive\n\n'
+                continue
+            if item is None:
+                break
+            row, data = item
+            if position.accept(row):
+                yield format_event(position, data)
+    finally:
+        live_hub.unsubscribe(queue)
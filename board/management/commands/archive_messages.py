@@ -0,0 +1,25 @@
+# board/management/commands/archive_messages.py
+from django.core.management.base import BaseCommand, CommandError
+
+from board.archive import ARCHIVE_AFTER_DAYS, ARCHIVE_BATCH_SIZE, PURGE_UNAPPROVED_AFTER_DAYS, run_archive
+
+
+class Command(BaseCommand):
+    help = '把過期的已審核留言搬到封存表，並刪除長期未通過審核的留言 (分批執行，建議每天以排程執行一次)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--archive-after-days', type=int, default=ARCHIVE_AFTER_DAYS,
+                            help='封存建立超過這麼多天的已審核留言')
+        parser.add_argument('--purge-after-days', type=int, default=PURGE_UNAPPROVED_AFTER_DAYS,
+                            help='刪除待審核超過這麼多天的留言')
+        parser.add_argument('--batch-size', type=int, default=ARCHIVE_BATCH_SIZE, help='每個交易處理的留言數量')
+
+    def handle(self, *args, **options):
+        if options['archive_after_days'] < 0 or options['purge_after_days'] < 0:
+            raise CommandError('天數不可為負數')
+        archived, purged = run_archive(
+            archive_after_days=options['archive_after_days'],
+            purge_after_days=options['purge_after_days'],
+            batch_size=options['batch_size'],
+        )
+        self.stdout.write(self.style.SUCCESS(f'已封存 {archived} 條留言，刪除 {purged} 條未審核留言。'))
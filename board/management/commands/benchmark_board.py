@@ -0,0 +1,70 @@
+# board/management/commands/benchmark_board.py
+import json
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from board.benchmark import run_benchmark
+
+
+class Command(BaseCommand):
+    help = '對留言板的熱點路徑執行基準測試 (延遲百分位數、查詢次數、峰值記憶體)，結果寫成 JSON'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=50, help='每個情境計時的請求數')
+        parser.add_argument('--warmup', type=int, default=3, help='每個情境開始前不計時的請求數')
+        parser.add_argument('--only', nargs='+', help='只執行指定的情境名稱或路由名稱')
+        parser.add_argument('--output', help='結果 JSON 的路徑 (預設為 benchmark-<時間>.json)')
+        parser.add_argument('--label', default='', help='寫入結果中的標籤，例如 before / after')
+        parser.add_argument('--compare', help='與先前的結果 JSON 比較 p50/p95 與查詢次數')
+
+    def handle(self, *args, **options):
+        if options['iterations'] < 1:
+            raise CommandError('--iterations 至少為 1')
+        baseline = self.load(options['compare']) if options['compare'] else None
+
+        self.stdout.write(f'{"情境":<36} {"p50":>9} {"p95":>9} {"p99":>9} {"查詢":>6} {"峰值記憶體":>12}')
+        results = run_benchmark(
+            iterations=options['iterations'],
+            warmup=options['warmup'],
+            only=set(options['only'] or ()),
+            progress=self.report,
+        )
+        results['label'] = options['label']
+
+        output = Path(options['output'] or f'benchmark-{timezone.now():%Y%m%d-%H%M%S}.json')
+        output.write_text(json.dumps(results, ensure_ascii=False, indent=2), encoding='utf-8')
+        for route in results['uncovered_routes']:
+            self.stdout.write(self.style.WARNING(f'路由 {route} 沒有基準測試情境'))
+        if baseline:
+            self.compare(baseline, results)
+        self.stdout.write(self.style.SUCCESS(
+            f'{results["messages"]} 條留言、{results["users"]} 位使用者，結果已寫入 {output}'
+        ))
+
+    def report(self, result):
+        self.stdout.write(
+            f'{result.name:<36} {result.p50_ms:>7.1f}ms {result.p95_ms:>7.1f}ms {result.p99_ms:>7.1f}ms '
+            f'{result.queries_per_request:>6.1f} {result.peak_memory_kib:>9.0f}KiB'
+        )
+
+    def load(self, path):
+        try:
+            return json.loads(Path(path).read_text(encoding='utf-8'))
+        except (OSError, ValueError) as exc:
+            raise CommandError(f'無法讀取比較基準 {path}: {exc}')
+
+    def compare(self, baseline, results):
+        previous = {s['name']: s for s in baseline.get('scenarios', [])}
+        self.stdout.write(f'\n與 {baseline.get("label") or baseline.get("created_at")} 比較：')
+        for current in results['scenarios']:
+            before = previous.get(current['name'])
+            if not before:
+                continue
+            changes = []
+            for key in ('p50_ms', 'p95_ms'):
+                if before[key]:
+                    changes.append(f'{key[:3]} {(current[key] - before[key]) / before[key]:+.0%}')
+            changes.append(f'查詢 {before["queries_per_request"]:g} -> {current["queries_per_request"]:g}')
+            self.stdout.write(f'{current["name"]:<36} ' + ', '.join(changes))
@@ -0,0 +1,24 @@
+# board/management/commands/enforce_retention.py
+from django.core.management.base import BaseCommand, CommandError
+
+from board.retention import POLICIES, RETENTION_BATCH_SIZE, RETENTION_PAUSE, run_retention
+
+
+class Command(BaseCommand):
+    help = '依保留政策 (settings.RETENTION_DAYS) 分批刪除過期的未審核留言、驗證碼、session 與已發送郵件'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--only', action='append', choices=[p.name for p in POLICIES],
+                            help='只執行指定的政策 (可重複指定)')
+        parser.add_argument('--batch-size', type=int, default=RETENTION_BATCH_SIZE, help='每個交易刪除的行數')
+        parser.add_argument('--pause', type=float, default=RETENTION_PAUSE, help='每批之間暫停的秒數')
+
+    def handle(self, *args, **options):
+        if options['batch_size'] <= 0 or options['pause'] < 0:
+            raise CommandError('--batch-size 必須大於 0，--pause 不可為負數')
+        only = set(options['only']) if options['only'] else None
+        reclaimed = run_retention(only=only, batch_size=options['batch_size'], pause=options['pause'])
+        descriptions = {p.name: p.description for p in POLICIES}
+        for name, count in reclaimed.items():
+            self.stdout.write(f'{descriptions[name]} ({name}): 刪除 {count} 行')
+        self.stdout.write(self.style.SUCCESS(f'共回收 {sum(reclaimed.values())} 行。'))
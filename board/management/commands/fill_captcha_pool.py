@@ -0,0 +1,30 @@
+# board/management/commands/fill_captcha_pool.py
+import time
+
+from django.core.management.base import BaseCommand
+
+from board.captcha_pool import CAPTCHA_POOL_SIZE, fill_captcha_pool, sweep_captcha_pool
+
+
+class Command(BaseCommand):
+    help = '預先生成驗證碼與 PNG 圖片到驗證碼池，並批量清理已作答或已過期的驗證碼'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--size', type=int, default=CAPTCHA_POOL_SIZE, help='池中維持的可用驗證碼數量')
+        parser.add_argument('--batch-size', type=int, default=100, help='每批生成並寫入的數量')
+        parser.add_argument('--once', action='store_true', help='清理並補充一次後結束，而不是持續執行')
+        parser.add_argument('--interval', type=float, default=30.0, help='每輪檢查之間的間隔（秒）')
+
+    def handle(self, *args, **options):
+        try:
+            while True:
+                stores_deleted, pool_deleted = sweep_captcha_pool()
+                created = fill_captcha_pool(options['size'], options['batch_size'])
+                if stores_deleted or pool_deleted or created:
+                    self.stdout.write(f'清理 {stores_deleted} 個驗證碼 ({pool_deleted} 個池項目)，新生成 {created} 個')
+                if options['once']:
+                    break
+                time.sleep(options['interval'])
+        except KeyboardInterrupt:
+            pass
+        self.stdout.write(self.style.SUCCESS('驗證碼池已更新。'))
@@ -0,0 +1,19 @@
+# board/management/commands/flush_reactions.py
+from django.core.management.base import BaseCommand, CommandError
+
+from board.reactions import REACTION_FLUSH_BATCH_SIZE, REACTION_RECOUNT_WINDOW, recount_recent_reactions
+
+
+class Command(BaseCommand):
+    help = '重新計算最近有新回應的留言的表情回應計數；建議每隔數分鐘以排程執行，補上閒置 worker 尚未寫入的計數'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--window', type=int, default=REACTION_RECOUNT_WINDOW,
+                            help='重新計算最近多少秒內有新回應的留言 (應大於排程的執行間隔)')
+        parser.add_argument('--batch-size', type=int, default=REACTION_FLUSH_BATCH_SIZE, help='每條 UPDATE 的留言數')
+
+    def handle(self, *args, **options):
+        if options['window'] <= 0 or options['batch_size'] <= 0:
+            raise CommandError('--window 與 --batch-size 必須大於 0')
+        updated = recount_recent_reactions(options['window'], options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'已重新計算 {updated} 條留言的表情回應。'))
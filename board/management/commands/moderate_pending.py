@@ -0,0 +1,21 @@
+# board/management/commands/moderate_pending.py
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from board.moderation import MODERATION_BATCH_SIZE, rescan_pending
+
+
+class Command(BaseCommand):
+    help = '以關鍵字規則重新掃描待審核留言，沒有命中禁用關鍵字的留言直接通過審核並通知留言者'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=MODERATION_BATCH_SIZE, help='每批讀取的留言數量')
+        parser.add_argument('--dry-run', action='store_true', help='只統計會通過的數量，不修改資料')
+
+    def handle(self, *args, **options):
+        if not getattr(settings, 'MODERATION_DENY_KEYWORDS', None) and not options['dry_run']:
+            # 沒有任何禁用關鍵字時所有留言都算乾淨，避免誤把整個佇列通過
+            raise CommandError('尚未設定 MODERATION_DENY_KEYWORDS，拒絕自動通過全部待審核留言')
+        scanned, approved = rescan_pending(batch_size=options['batch_size'], dry_run=options['dry_run'])
+        verb = '可通過' if options['dry_run'] else '已通過'
+        self.stdout.write(self.style.SUCCESS(f'掃描 {scanned} 條待審核留言，{verb} {approved} 條。'))
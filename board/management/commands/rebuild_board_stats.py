@@ -0,0 +1,16 @@
+# board/management/commands/rebuild_board_stats.py
+from django.core.management.base import BaseCommand
+
+from board.caching import bump_board_version
+from board.stats import rebuild_counters
+
+
+class Command(BaseCommand):
+    help = '以 COUNT(*) 重新計算留言計數器 (已審核、待審核、今日新增)，用於修正計數漂移'
+
+    def handle(self, *args, **options):
+        counters = rebuild_counters()
+        bump_board_version()
+        for key, value in sorted(counters.items()):
+            self.stdout.write(f'{key}: {value}')
+        self.stdout.write(self.style.SUCCESS('計數器已重新計算。'))
@@ -0,0 +1,16 @@
+# board/management/commands/rebuild_search_index.py
+from django.core.management.base import BaseCommand
+
+from board.search import rebuild_index, search_backend
+
+
+class Command(BaseCommand):
+    help = '重建留言全文搜尋索引 (SQLite FTS5)，用於 bulk_create 等繞過信號的批量寫入之後'
+
+    def handle(self, *args, **options):
+        backend = search_backend()
+        if backend != 'sqlite':
+            self.stdout.write(f'目前的搜尋後端為 {backend}，索引由資料庫自動維護，不需要重建。')
+            return
+        count = rebuild_index()
+        self.stdout.write(self.style.SUCCESS(f'已重建 {count} 條留言的搜尋索引。'))
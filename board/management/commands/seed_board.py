@@ -0,0 +1,108 @@
+# board/management/commands/seed_board.py
+import random
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from board.caching import bump_board_version
+from board.models import Message
+from board.search import rebuild_index
+from board.stats import rebuild_counters
+
+SEED_PASSWORD = 'seed-password-123'
+WORDS = (
+    '留言', '測試', '天氣', '咖啡', '週末', '電影', '音樂', '旅行', '工作', '學習',
+    '程式', '資料庫', '效能', '快取', '伺服器', 'django', 'python', 'benchmark', 'hello', 'world',
+)
+
+
+@contextmanager
+def explicit_created_at():
+    # auto_now_add 會覆蓋 bulk_create 中指定的時間，暫時關閉以便把留言分散在過去的日子裡
+    field = Message._meta.get_field('created_at')
+    field.auto_now_add = False
+    try:
+        yield
+    finally:
+        field.auto_now_add = True
+
+
+class Command(BaseCommand):
+    help = '產生合成的使用者與留言 (以 bulk_create 分批寫入)，用於負載測試與 benchmark_board'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=10_000, help='新增的使用者數量')
+        parser.add_argument('--messages', type=int, default=100_000, help='新增的留言數量')
+        parser.add_argument('--approved-ratio', type=float, default=0.8, help='已審核留言的比例 (0~1)')
+        parser.add_argument('--email-ratio', type=float, default=0.9, help='有 Email 的使用者比例 (0~1)')
+        parser.add_argument('--days', type=int, default=365, help='留言時間分散在最近幾天內')
+        parser.add_argument('--batch-size', type=int, default=2000, help='每次 bulk_create 寫入的數量')
+        parser.add_argument('--seed', type=int, default=None, help='隨機數種子，指定後每次產生相同的資料')
+
+    def handle(self, *args, **options):
+        for name in ('approved_ratio', 'email_ratio'):
+            if not 0 <= options[name] <= 1:
+                raise CommandError(f'--{name.replace("_", "-")} 必須介於 0 與 1 之間')
+        rng = random.Random(options['seed'])
+        batch_size = options['batch_size']
+
+        new_user_ids = self.seed_users(rng, options['users'], options['email_ratio'], batch_size)
+        author_ids = new_user_ids or list(User.objects.values_list('id', flat=True))
+        if options['messages'] and not author_ids:
+            raise CommandError('沒有可用的留言者，請以 --users 新增使用者')
+        self.seed_messages(rng, author_ids, options['messages'], options['approved_ratio'], options['days'], batch_size)
+
+        # bulk_create 不觸發信號：重建計數器與搜尋索引，並使列表頁快取失效
+        rebuild_counters()
+        rebuild_index()
+        bump_board_version()
+        self.stdout.write(self.style.SUCCESS(
+            f'已新增 {len(new_user_ids)} 位使用者與 {options["messages"]} 條留言 '
+            f'(目前共 {User.objects.count()} 位使用者、{Message.objects.count()} 條留言)。'
+        ))
+
+    def seed_users(self, rng, count, email_ratio, batch_size):
+        if not count:
+            return []
+        # 以現有的 seed 帳號數量為起點，重複執行不會產生重複的使用者名稱
+        start = User.objects.filter(username__startswith='seed_user_').count()
+        password = make_password(SEED_PASSWORD) # 所有帳號共用同一個雜湊，避免逐一雜湊
+        for offset in range(0, count, batch_size):
+            users = []
+            for n in range(start + offset, start + min(offset + batch_size, count)):
+                username = f'seed_user_{n}'
+                email = f'{username}@example.com' if rng.random() < email_ratio else ''
+                users.append(User(username=username, email=email, password=password))
+            User.objects.bulk_create(users, ignore_conflicts=True)
+            self.stdout.write(f'使用者 {min(offset + batch_size, count)}/{count}')
+        return list(
+            User.objects.filter(username__startswith='seed_user_')
+            .order_by('-id').values_list('id', flat=True)[:count]
+        )
+
+    def seed_messages(self, rng, author_ids, count, approved_ratio, days, batch_size):
+        now = timezone.now()
+        span = timedelta(days=days)
+        with explicit_created_at():
+            for offset in range(0, count, batch_size):
+                messages = []
+                for n in range(offset, min(offset + batch_size, count)):
+                    # 依序遞增的時間 (加上少量抖動)，與實際資料中 id 與時間同向增長一致
+                    created_at = now - span + span * ((n + rng.random()) / count)
+                    approved = rng.random() < approved_ratio
+                    words = rng.choices(WORDS, k=rng.randint(5, 40))
+                    messages.append(Message(
+                        author_id=rng.choice(author_ids),
+                        subject=' '.join(words[:3]) + f' #{n}',
+                        content=' '.join(words),
+                        created_at=created_at,
+                        is_approved=approved,
+                        approved_at=min(created_at + timedelta(minutes=rng.randint(1, 600)), now) if approved else None,
+                        notified=approved,
+                    ))
+                Message.objects.bulk_create(messages)
+                self.stdout.write(f'留言 {min(offset + batch_size, count)}/{count}')
@@ -0,0 +1,34 @@
+# board/management/commands/send_outbox.py
+import time
+
+from django.core.management.base import BaseCommand
+
+from board.outbox import OUTBOX_MAX_ATTEMPTS, send_pending
+
+
+class Command(BaseCommand):
+    help = '發送郵件佇列 (OutboundEmail) 中到期的郵件，失敗的郵件會以指數退避重試'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='清空目前到期的郵件後立即結束，而不是持續輪詢')
+        parser.add_argument('--interval', type=float, default=5.0, help='佇列為空時的輪詢間隔（秒）')
+        parser.add_argument('--batch-size', type=int, default=100, help='每批取出的郵件數量，同一批共用一個 SMTP 連線')
+        parser.add_argument('--max-attempts', type=int, default=OUTBOX_MAX_ATTEMPTS, help='超過此嘗試次數後標記為發送失敗')
+
+    def handle(self, *args, **options):
+        total_sent = total_failed = 0
+        try:
+            while True:
+                sent, failed = send_pending(batch_size=options['batch_size'], max_attempts=options['max_attempts'])
+                total_sent += sent
+                total_failed += failed
+                if sent or failed:
+                    self.stdout.write(f'已發送 {sent} 封，失敗 {failed} 封')
+                if sent + failed < options['batch_size']:
+                    # 目前沒有更多到期郵件
+                    if options['once']:
+                        break
+                    time.sleep(options['interval'])
+        except KeyboardInterrupt:
+            pass
+        self.stdout.write(self.style.SUCCESS(f'共發送 {total_sent} 封，失敗 {total_failed} 封'))
@@ -0,0 +1,174 @@
+# board/middleware.py
+import logging
+import time
+from collections import Counter
+from contextlib import ExitStack
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+from .routers import REPLICA_STICKY_SECONDS, replica_configured, use_primary
+
+logger = logging.getLogger('board.queries')
+
+# 寫入之後讀取固定使用主庫的 cookie，值為到期時間戳
+PRIMARY_STICKY_COOKIE = 'board_primary'
+
+
+class QueryStats:
+    """單一請求內的 SQL 統計：次數、耗時與重複查詢"""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0 # 秒
+        self.statements = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - start
+            self.count += 1
+            # 相同 SQL 模板重複執行 (只有參數不同) 通常是 N+1 查詢的跡象
+            self.statements[sql] += 1
+
+    @property
+    def duplicates(self):
+        return {sql: n for sql, n in self.statements.items() if n > 1}
+
+    @property
+    def duplicate_count(self):
+        return sum(n - 1 for n in self.statements.values())
+
+
+class QueryInstrumentationMiddleware:
+    """
+    記錄每個請求 (依 URL 名稱) 的查詢次數、查詢耗時與重複查詢。
+
+    - 設定 QUERY_INSTRUMENTATION = True 啟用 (預設跟隨 DEBUG)，停用時不會被載入，沒有任何額外開銷
+    - 設定 QUERY_INSTRUMENTATION_SERVER_TIMING = True 時，在回應中加入 Server-Timing 標頭，
+      可直接在瀏覽器開發者工具中查看
+    - 重複查詢超過 QUERY_INSTRUMENTATION_DUPLICATE_WARNING 次時記錄 WARNING
+
+    同時支援同步與非同步 (ASGI) 請求，非同步視圖不需要經過額外的執行緒切換。
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'QUERY_INSTRUMENTATION', settings.DEBUG):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.server_timing = getattr(settings, 'QUERY_INSTRUMENTATION_SERVER_TIMING', settings.DEBUG)
+        self.duplicate_warning = getattr(settings, 'QUERY_INSTRUMENTATION_DUPLICATE_WARNING', 5)
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    @staticmethod
+    def wrap_connections(stack, stats):
+        """在目前執行緒的所有資料庫連線上安裝統計包裝 (離開 stack 時移除)"""
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(stats))
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        stats = QueryStats()
+        with ExitStack() as stack:
+            self.wrap_connections(stack, stats)
+            response = self.get_response(request)
+        return self.report(request, response, stats)
+
+    async def __acall__(self, request):
+        # 非同步 ORM 與同步程式碼都在這個請求的 sync_to_async 執行緒中查詢 (資料庫連線屬於該執行緒)，
+        # 包裝必須在同一個執行緒中安裝與移除
+        stats = QueryStats()
+        stack = ExitStack()
+        await sync_to_async(self.wrap_connections)(stack, stats)
+        try:
+            response = await self.get_response(request)
+        finally:
+            await sync_to_async(stack.close)()
+        return self.report(request, response, stats)
+
+    def report(self, request, response, stats):
+        match = request.resolver_match
+        view_name = match.view_name if match else request.path
+        request.query_stats = stats
+        logger.debug('%s: %d queries, %.1f ms, %d duplicates',
+                     view_name, stats.count, stats.duration * 1000, stats.duplicate_count)
+        if stats.duplicate_count >= self.duplicate_warning:
+            worst_sql, worst_n = max(stats.duplicates.items(), key=lambda item: item[1])
+            logger.warning('%s 有 %d 條重複查詢 (可能是 N+1)，最多的一條執行了 %d 次: %s',
+                           view_name, stats.duplicate_count, worst_n, worst_sql)
+
+        if self.server_timing:
+            timing = (f'db;dur={stats.duration * 1000:.1f};desc="{stats.count} queries", '
+                      f'dbdup;desc="{stats.duplicate_count} duplicate queries"')
+            existing = response.get('Server-Timing')
+            response['Server-Timing'] = f'{existing}, {timing}' if existing else timing
+        return response
+
+
+class PrimaryStickinessMiddleware:
+    """
+    讀寫分離時保證使用者看得到自己剛寫入的資料 (見 board/routers.py)：
+    會寫入的請求 (非 GET/HEAD/OPTIONS) 與帶有未過期黏著 cookie 的請求，所有讀取都使用主庫；
+    寫入請求成功後設定該 cookie。沒有設定副本時不會被載入。
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not replica_configured():
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        token = use_primary.set(self.must_read_primary(request))
+        try:
+            response = self.get_response(request)
+        finally:
+            use_primary.reset(token)
+        return self.remember_write(request, response)
+
+    async def __acall__(self, request):
+        token = use_primary.set(self.must_read_primary(request))
+        try:
+            response = await self.get_response(request)
+        finally:
+            use_primary.reset(token)
+        return self.remember_write(request, response)
+
+    @staticmethod
+    def writes(request):
+        return request.method not in ('GET', 'HEAD', 'OPTIONS')
+
+    def must_read_primary(self, request):
+        if self.writes(request):
+            return True
+        try:
+            return float(request.COOKIES.get(PRIMARY_STICKY_COOKIE, 0)) > time.time()
+        except ValueError:
+            return False
+
+    def remember_write(self, request, response):
+        if self.writes(request) and response.status_code < 400:
+            response.set_cookie(
+                PRIMARY_STICKY_COOKIE,
+                f'{time.time() + REPLICA_STICKY_SECONDS:.3f}',
+                max_age=REPLICA_STICKY_SECONDS,
+                secure=settings.SESSION_COOKIE_SECURE,
+                httponly=True,
+                samesite='Lax',
+            )
+        return response
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.3 on 2026-10-18 06:16
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('board', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='message',
+            index=models.Index(fields=['is_approved', '-created_at', '-id'], name='board_msg_keyset_idx'),
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.2.3 on 2026-10-18 06:19
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('board', '0002_message_keyset_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OutboundEmail',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('subject', models.CharField(max_length=300, verbose_name='郵件主旨')),
+                ('body', models.TextField(verbose_name='郵件內容')),
+                ('from_email', models.CharField(max_length=254, verbose_name='寄件者')),
+                ('recipients', models.JSONField(default=list, verbose_name='收件者')),
+                ('status', models.CharField(choices=[('pending', '待發送'), ('sent', '已發送'), ('failed', '發送失敗')], default='pending', max_length=10, verbose_name='狀態')),
+                ('attempts', models.PositiveIntegerField(default=0, verbose_name='嘗試次數')),
+                ('last_error', models.TextField(blank=True, verbose_name='最後錯誤')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='建立時間')),
+                ('next_attempt_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='下次嘗試時間')),
+                ('sent_at', models.DateTimeField(blank=True, null=True, verbose_name='發送時間')),
+                ('related_message', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='outbound_emails', to='board.message', verbose_name='關聯留言')),
+            ],
+            options={
+                'verbose_name': '待發郵件',
+                'verbose_name_plural': '待發郵件',
+                'ordering': ['created_at'],
+                'indexes': [models.Index(fields=['status', 'next_attempt_at'], name='board_outbox_due_idx')],
+            },
+        ),
+    ]
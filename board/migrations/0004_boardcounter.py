@@ -0,0 +1,25 @@
+# Generated by Django 5.2.3 on 2026-10-18 06:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('board', '0003_outboundemail'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BoardCounter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=64, unique=True, verbose_name='計數鍵')),
+                ('value', models.BigIntegerField(default=0, verbose_name='數值')),
+            ],
+            options={
+                'verbose_name': '計數器',
+                'verbose_name_plural': '計數器',
+            },
+        ),
+    ]
@@ -0,0 +1,56 @@
+# 全文搜尋索引：PostgreSQL 使用 tsvector 生成欄位 + GIN 索引，SQLite 使用 FTS5 虛擬表。
+# 索引不屬於 Django 模型欄位，因此以 RunPython 依資料庫類型建立，見 board/search.py。
+
+from django.db import OperationalError, migrations
+
+POSTGRES_FORWARD = [
+    """
+    ALTER TABLE board_message ADD COLUMN search_vector tsvector
+    GENERATED ALWAYS AS (
+        setweight(to_tsvector('simple', coalesce(subject, '')), 'A') ||
+        setweight(to_tsvector('simple', coalesce(content, '')), 'B')
+    ) STORED
+    """,
+    'CREATE INDEX board_msg_search_gin ON board_message USING gin (search_vector)',
+]
+POSTGRES_BACKWARD = [
+    'DROP INDEX IF EXISTS board_msg_search_gin',
+    'ALTER TABLE board_message DROP COLUMN IF EXISTS search_vector',
+]
+
+
+def create_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        for sql in POSTGRES_FORWARD:
+            schema_editor.execute(sql)
+    elif vendor == 'sqlite':
+        try:
+            # trigram 分詞器 (SQLite 3.34+) 支援中文等不以空白分詞的子字串搜尋
+            schema_editor.execute("CREATE VIRTUAL TABLE board_message_fts USING fts5(subject, content, tokenize='trigram')")
+        except OperationalError:
+            # 沒有 trigram 時索引只作保留，board/search.py 偵測到預設分詞器會退回 icontains 掃描
+            schema_editor.execute('CREATE VIRTUAL TABLE board_message_fts USING fts5(subject, content)')
+        schema_editor.execute(
+            'INSERT INTO board_message_fts (rowid, subject, content) SELECT id, subject, content FROM board_message'
+        )
+
+
+def drop_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        for sql in POSTGRES_BACKWARD:
+            schema_editor.execute(sql)
+    elif vendor == 'sqlite':
+        schema_editor.execute('DROP TABLE IF EXISTS board_message_fts')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('board', '0004_boardcounter'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
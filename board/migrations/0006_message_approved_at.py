@@ -0,0 +1,32 @@
+# Generated by Django 5.2.3 on 2026-10-18 06:40
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import F
+
+
+def backfill_approved_at(apps, schema_editor):
+    # 既有的已審核留言沒有審核時間記錄，以留言時間代替
+    Message = apps.get_model('board', 'Message')
+    Message.objects.filter(is_approved=True).update(approved_at=F('created_at'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('board', '0005_message_search_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='message',
+            name='approved_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True, verbose_name='審核通過時間'),
+        ),
+        migrations.RunPython(backfill_approved_at, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='message',
+            index=models.Index(fields=['approved_at', 'id'], name='board_msg_approved_at_idx'),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.3 on 2026-10-18 06:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('board', '0006_message_approved_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PooledCaptcha',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('hashkey', models.CharField(max_length=40, unique=True, verbose_name='驗證碼鍵')),
+                ('image', models.BinaryField(verbose_name='PNG 圖片')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='生成時間')),
+                ('expires_at', models.DateTimeField(verbose_name='過期時間')),
+                ('issued_at', models.DateTimeField(blank=True, null=True, verbose_name='發出時間')),
+            ],
+            options={
+                'verbose_name': '驗證碼池',
+                'verbose_name_plural': '驗證碼池',
+                'indexes': [models.Index(fields=['issued_at', 'expires_at'], name='board_captcha_pool_idx')],
+            },
+        ),
+    ]
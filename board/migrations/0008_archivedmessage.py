@@ -0,0 +1,34 @@
+# Generated by Django 5.2.3 on 2026-10-18 07:08
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('board', '0007_pooledcaptcha'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedMessage',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False, verbose_name='留言編號')),
+                ('subject', models.CharField(max_length=200, verbose_name='主題')),
+                ('content', models.TextField(verbose_name='留言内容')),
+                ('created_at', models.DateTimeField(verbose_name='留言時間')),
+                ('approved_at', models.DateTimeField(blank=True, null=True, verbose_name='審核通過時間')),
+                ('archived_at', models.DateTimeField(auto_now_add=True, verbose_name='封存時間')),
+                ('author', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_messages', to=settings.AUTH_USER_MODEL, verbose_name='留言者')),
+            ],
+            options={
+                'verbose_name': '封存留言',
+                'verbose_name_plural': '封存留言',
+                'ordering': ['-created_at', '-id'],
+                'indexes': [models.Index(fields=['-created_at', '-id'], name='board_archive_keyset_idx')],
+            },
+        ),
+    ]
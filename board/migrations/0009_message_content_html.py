@@ -0,0 +1,60 @@
+# Generated by Django 5.2.3 on 2026-10-18 07:40
+
+import django.utils.timezone
+from django.db import migrations, models
+from django.db.models import F
+from django.template.defaultfilters import linebreaksbr
+
+BATCH_SIZE = 1000
+
+
+def backfill_content_html(apps, schema_editor):
+    # 既有留言以留言時間作為修改時間，並分批渲染內容 HTML
+    for model_name in ('Message', 'ArchivedMessage'):
+        model = apps.get_model('board', model_name)
+        model.objects.update(updated_at=F('created_at'))
+        last_pk = None
+        while True:
+            rows = model.objects.order_by('pk').only('pk', 'content')
+            if last_pk is not None:
+                rows = rows.filter(pk__gt=last_pk)
+            batch = list(rows[:BATCH_SIZE])
+            if not batch:
+                break
+            for row in batch:
+                row.content_html = linebreaksbr(row.content, autoescape=True) # 與 board/cards.py 的 render_content 相同
+            model.objects.bulk_update(batch, ['content_html'])
+            last_pk = batch[-1].pk
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('board', '0008_archivedmessage'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='message',
+            name='content_html',
+            field=models.TextField(blank=True, default='', editable=False, verbose_name='内容 HTML'),
+        ),
+        migrations.AddField(
+            model_name='message',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, default=django.utils.timezone.now, verbose_name='修改時間'),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='archivedmessage',
+            name='content_html',
+            field=models.TextField(blank=True, default='', verbose_name='内容 HTML'),
+        ),
+        migrations.AddField(
+            model_name='archivedmessage',
+            name='updated_at',
+            field=models.DateTimeField(default=django.utils.timezone.now, verbose_name='修改時間'),
+            preserve_default=False,
+        ),
+        migrations.RunPython(backfill_content_html, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.3 on 2026-10-18 07:22
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('board', '0009_message_content_html'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='message',
+            index=models.Index(condition=models.Q(('is_approved', False)), fields=['-created_at', '-id'], name='board_msg_pending_idx'),
+        ),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 5.2.3 on 2026-10-18 08:10
+
+from django.db import migrations, models
+
+from board.dedup import content_fingerprint
+
+BATCH_SIZE = 1000
+
+
+def backfill_fingerprints(apps, schema_editor):
+    # 分批為既有留言計算內容指紋
+    Message = apps.get_model('board', 'Message')
+    last_pk = None
+    while True:
+        rows = Message.objects.order_by('pk').only('pk', 'subject', 'content')
+        if last_pk is not None:
+            rows = rows.filter(pk__gt=last_pk)
+        batch = list(rows[:BATCH_SIZE])
+        if not batch:
+            break
+        for row in batch:
+            row.fingerprint = content_fingerprint(row.subject, row.content)
+        Message.objects.bulk_update(batch, ['fingerprint'])
+        last_pk = batch[-1].pk
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('board', '0010_message_pending_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='message',
+            name='fingerprint',
+            field=models.CharField(blank=True, default='', editable=False, max_length=64, verbose_name='內容指紋'),
+        ),
+        migrations.AddField(
+            model_name='message',
+            name='duplicate_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='重複次數'),
+        ),
+        migrations.RunPython(backfill_fingerprints, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='message',
+            index=models.Index(fields=['fingerprint', '-created_at'], name='board_msg_fingerprint_idx'),
+        ),
+    ]
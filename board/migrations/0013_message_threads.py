@@ -0,0 +1,71 @@
+# Generated by Django 5.2.3 on 2026-10-18 07:44
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('board', '0012_message_author_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='archivedmessage',
+            name='board_archive_keyset_idx',
+        ),
+        migrations.AddField(
+            model_name='archivedmessage',
+            name='path',
+            field=models.CharField(blank=True, default='', max_length=255, verbose_name='回覆路徑'),
+        ),
+        migrations.AddField(
+            model_name='archivedmessage',
+            name='reply_count',
+            field=models.PositiveIntegerField(default=0, verbose_name='回覆數'),
+        ),
+        migrations.AddField(
+            model_name='archivedmessage',
+            name='thread_id',
+            field=models.BigIntegerField(blank=True, null=True, verbose_name='討論串'),
+        ),
+        migrations.AddField(
+            model_name='message',
+            name='parent',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='replies', to='board.message', verbose_name='回覆的留言'),
+        ),
+        migrations.AddField(
+            model_name='message',
+            name='path',
+            field=models.CharField(blank=True, default='', editable=False, max_length=255, verbose_name='回覆路徑'),
+        ),
+        migrations.AddField(
+            model_name='message',
+            name='reply_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='回覆數'),
+        ),
+        migrations.AddField(
+            model_name='message',
+            name='thread',
+            field=models.ForeignKey(blank=True, db_index=False, editable=False, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='thread_replies', to='board.message', verbose_name='討論串'),
+        ),
+        migrations.AddIndex(
+            model_name='archivedmessage',
+            index=models.Index(condition=models.Q(('thread_id__isnull', True)), fields=['-created_at', '-id'], name='board_archive_root_keyset_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='archivedmessage',
+            index=models.Index(fields=['thread_id', 'path'], name='board_archive_thread_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='message',
+            index=models.Index(condition=models.Q(('thread__isnull', True)), fields=['is_approved', '-created_at', '-id'], name='board_msg_root_keyset_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='message',
+            index=models.Index(fields=['thread', 'path'], name='board_msg_thread_path_idx'),
+        ),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 5.2.3 on 2026-10-18 07:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('board', '0013_message_threads'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='archivedmessage',
+            name='laugh_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='哈哈'),
+        ),
+        migrations.AddField(
+            model_name='archivedmessage',
+            name='like_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='讚'),
+        ),
+        migrations.AddField(
+            model_name='archivedmessage',
+            name='love_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='愛心'),
+        ),
+        migrations.AddField(
+            model_name='message',
+            name='laugh_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='哈哈'),
+        ),
+        migrations.AddField(
+            model_name='message',
+            name='like_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='讚'),
+        ),
+        migrations.AddField(
+            model_name='message',
+            name='love_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='愛心'),
+        ),
+    ]
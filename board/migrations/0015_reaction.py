@@ -0,0 +1,32 @@
+# Generated by Django 5.2.3 on 2026-10-18 08:08
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('board', '0014_message_reactions'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Reaction',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('like', '👍'), ('love', '❤️'), ('laugh', '😂')], max_length=10, verbose_name='回應')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='回應時間')),
+                ('message', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='board.message', verbose_name='留言')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL, verbose_name='使用者')),
+            ],
+            options={
+                'verbose_name': '表情回應',
+                'verbose_name_plural': '表情回應',
+                'indexes': [models.Index(fields=['created_at'], name='board_reaction_created_idx')],
+                'constraints': [models.UniqueConstraint(fields=('message', 'kind', 'user'), name='board_reaction_unique')],
+            },
+        ),
+    ]
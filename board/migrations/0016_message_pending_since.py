@@ -0,0 +1,26 @@
+# Generated by Django 5.2.3 on 2026-10-18 08:12
+
+from django.db import migrations, models
+from django.db.models import F
+
+
+def backfill_pending_since(apps, schema_editor):
+    # 既有的待審核留言無法得知何時進入待審核，以建立時間代替
+    Message = apps.get_model('board', 'Message')
+    Message.objects.filter(is_approved=False).update(pending_since=F('created_at'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('board', '0015_reaction'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='message',
+            name='pending_since',
+            field=models.DateTimeField(blank=True, editable=False, null=True, verbose_name='待審核起始時間'),
+        ),
+        migrations.RunPython(backfill_pending_since, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,48 @@
+# PostgreSQL 的搜尋改用 pg_trgm 三元組索引：'simple' 設定的 tsvector 以空白分詞，
+# 中文句子整句成為一個詞，句子中間的詞永遠搜尋不到；三元組索引與 SQLite 的 FTS5 trigram 一樣支援任意子字串。
+# 索引建立在 UPPER(欄位) 上，與 Django 的 icontains (UPPER(欄位) LIKE UPPER(%s)) 相符，見 board/search.py。
+
+from django.db import migrations
+
+POSTGRES_FORWARD = [
+    'CREATE EXTENSION IF NOT EXISTS pg_trgm',
+    'DROP INDEX IF EXISTS board_msg_search_gin',
+    'ALTER TABLE board_message DROP COLUMN IF EXISTS search_vector',
+    'CREATE INDEX board_msg_subject_trgm ON board_message USING gin (UPPER(subject) gin_trgm_ops)',
+    'CREATE INDEX board_msg_content_trgm ON board_message USING gin (UPPER(content) gin_trgm_ops)',
+]
+POSTGRES_BACKWARD = [
+    'DROP INDEX IF EXISTS board_msg_subject_trgm',
+    'DROP INDEX IF EXISTS board_msg_content_trgm',
+    """
+    ALTER TABLE board_message ADD COLUMN search_vector tsvector
+    GENERATED ALWAYS AS (
+        setweight(to_tsvector('simple', coalesce(subject, '')), 'A') ||
+        setweight(to_tsvector('simple', coalesce(content, '')), 'B')
+    ) STORED
+    """,
+    'CREATE INDEX board_msg_search_gin ON board_message USING gin (search_vector)',
+]
+
+
+def create_trigram_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        for sql in POSTGRES_FORWARD:
+            schema_editor.execute(sql)
+
+
+def drop_trigram_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        for sql in POSTGRES_BACKWARD:
+            schema_editor.execute(sql)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('board', '0016_message_pending_since'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_trigram_index, drop_trigram_index),
+    ]
@@ -1,20 +1,322 @@
 # board/models.py
 from django.db import models
+from django.db.models import Q
+from django.utils import timezone
 from django.contrib.auth.models import User # 導入Django内置的用户模型
 
-class Message(models.Model):
+from .cards import render_content
+from .dedup import content_fingerprint, duplicate_window_start
+
+
+def path_segment(pk):
+    """回覆路徑中的一段：固定寬度的留言編號，字串排序即為樹的深度優先順序"""
+    return f'{pk:010d}/'
+
+
+def descendants_q(pk, thread_id, path):
+    """某條留言全部回覆 (任意深度，不含自身) 的查詢條件，為 (thread, path) 索引上的範圍掃描"""
+    if thread_id is None:
+        return Q(thread_id=pk)
+    # 路徑只包含數字與 '/'，都小於 '~'
+    return Q(thread_id=thread_id, path__gt=path, path__lt=path + '~')
+
+
+# 表情回應的種類：(名稱, 計數欄位, 表情符號)；計數欄位由 board/reactions.py 批量更新
+REACTION_KINDS = (
+    ('like', 'like_count', '👍'),
+    ('love', 'love_count', '❤️'),
+    ('laugh', 'laugh_count', '😂'),
+)
+
+
+class ReactionCounts(models.Model):
+    """表情回應的計數欄位，留言與封存留言共用；列表查詢與留言在同一行讀出"""
+    like_count = models.PositiveIntegerField(default=0, editable=False, verbose_name="讚")
+    love_count = models.PositiveIntegerField(default=0, editable=False, verbose_name="愛心")
+    laugh_count = models.PositiveIntegerField(default=0, editable=False, verbose_name="哈哈")
+
+    class Meta:
+        abstract = True
+
+    @property
+    def reactions(self):
+        """[(名稱, 表情符號, 數量)]，供模板使用"""
+        return [(name, emoji, getattr(self, field)) for name, field, emoji in REACTION_KINDS]
+
+
+class MessageQuerySet(models.QuerySet):
+
+    def bulk_create(self, objs, *args, **kwargs):
+        # bulk_create 不經過 Message.save()，在這裡補上預先渲染的內容 HTML 與內容指紋
+        objs = list(objs)
+        for obj in objs:
+            if not obj.content_html:
+                obj.content_html = render_content(obj.content)
+            if not obj.fingerprint:
+                obj.fingerprint = content_fingerprint(obj.subject, obj.content)
+            if obj.parent_id is not None:
+                obj.thread_id = obj.parent.thread_id or obj.parent_id
+            if not obj.is_approved and obj.pending_since is None:
+                obj.pending_since = obj.created_at or timezone.now()
+        created = super().bulk_create(objs, *args, **kwargs)
+        # 回覆路徑包含自己的編號，寫入之後才能補上
+        replies = [obj for obj in created if obj.parent_id is not None and obj.pk is not None and not obj.path]
+        for obj in replies:
+            obj.path = obj.parent.path + path_segment(obj.pk)
+        if replies:
+            self.bulk_update(replies, ['path'])
+        return created
+
+    def duplicates_of(self, fingerprint, parent_id=None):
+        """近期內同一位置 (頂層或同一條留言之下) 相同指紋的留言 (使用 board_msg_fingerprint_idx 索引查詢)"""
+        return self.filter(fingerprint=fingerprint, created_at__gte=duplicate_window_start(), parent_id=parent_id)
+
+    def top_level(self):
+        return self.filter(thread__isnull=True)
+
+
+class Message(ReactionCounts):
     author = models.ForeignKey(User, on_delete=models.CASCADE, verbose_name="留言者")
     subject = models.CharField(max_length=200, verbose_name="主題")
     content = models.TextField(verbose_name="留言内容")
     created_at = models.DateTimeField(auto_now_add=True, verbose_name="留言時間")
     is_approved = models.BooleanField(default=False, verbose_name="是否通過審核")
     notified = models.BooleanField(default=False, verbose_name="已通知留言者") # 用於郵件通知
+    # 最近一次審核通過的時間，即時動態 (board/live.py) 以此找出新通過的留言；取消審核時清空
+    approved_at = models.DateTimeField(null=True, blank=True, editable=False, verbose_name="審核通過時間")
+    # 最近一次進入待審核的時間 (新留言、修改後待重審或被取消審核)，清理長期未審核的留言以此為準；審核通過時清空
+    pending_since = models.DateTimeField(null=True, blank=True, editable=False, verbose_name="待審核起始時間")
+    # 預先渲染的內容 HTML (見 board/cards.py)，保存時由 content 重新生成
+    content_html = models.TextField(blank=True, default='', editable=False, verbose_name="内容 HTML")
+    # 最近一次保存的時間，卡片片段的快取鍵使用
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="修改時間")
+    # 正規化後的主題與內容的 SHA-256 (見 board/dedup.py)，發布時以此找出重複的留言
+    fingerprint = models.CharField(max_length=64, blank=True, default='', editable=False, verbose_name="內容指紋")
+    # 被合併到這一條的重複提交次數
+    duplicate_count = models.PositiveIntegerField(default=0, editable=False, verbose_name="重複次數")
+    # 討論串 (見 board/threads.py)：回覆記錄直接回覆的留言 (parent) 與所屬討論串的頂層留言 (thread)，
+    # path 為從頂層之下到自己的編號路徑 (物化路徑)，整個討論串依 (thread, path) 一次範圍查詢即可按樹的順序取出
+    parent = models.ForeignKey(
+        'self', null=True, blank=True, on_delete=models.CASCADE,
+        related_name='replies', verbose_name="回覆的留言",
+    )
+    thread = models.ForeignKey(
+        'self', null=True, blank=True, on_delete=models.CASCADE, editable=False,
+        db_index=False, # 由 board_msg_thread_path_idx (thread, path) 涵蓋
+        related_name='thread_replies', verbose_name="討論串",
+    )
+    path = models.CharField(max_length=255, blank=True, default='', editable=False, verbose_name="回覆路徑")
+    # 頂層留言：討論串中已審核的回覆數量 (見 board/threads.py 的 refresh_reply_counts)
+    reply_count = models.PositiveIntegerField(default=0, editable=False, verbose_name="回覆數")
+
+    objects = MessageQuerySet.as_manager()
 
     class Meta:
         ordering = ['-created_at'] # 按時間倒序排列
         verbose_name = "留言"
         verbose_name_plural = "留言"
+        indexes = [
+            # 游標分頁使用的複合索引：WHERE is_approved ORDER BY created_at DESC, id DESC
+            models.Index(fields=['is_approved', '-created_at', '-id'], name='board_msg_keyset_idx'),
+            # 即時動態輪詢：WHERE approved_at >= 視窗起點 ORDER BY approved_at, id
+            models.Index(fields=['approved_at', 'id'], name='board_msg_approved_at_idx'),
+            # admin 審核佇列：WHERE NOT is_approved ORDER BY created_at DESC；只包含待審核的少數留言，索引很小
+            models.Index(fields=['-created_at', '-id'], condition=models.Q(is_approved=False), name='board_msg_pending_idx'),
+            # 重複留言檢查：WHERE fingerprint = ? AND created_at >= ?
+            models.Index(fields=['fingerprint', '-created_at'], name='board_msg_fingerprint_idx'),
+            # 個人留言頁的游標分頁：WHERE author_id = ? ORDER BY created_at DESC, id DESC
+            # 不包含 is_approved：「我的留言」的全部分頁同樣可以直接依索引順序讀取，
+            # 公開頁面只需略過該作者少數的待審核留言
+            models.Index(fields=['author', '-created_at', '-id'], name='board_msg_author_keyset_idx'),
+            # 留言列表只顯示頂層留言：WHERE is_approved AND thread_id IS NULL ORDER BY created_at DESC, id DESC
+            models.Index(
+                fields=['is_approved', '-created_at', '-id'], condition=models.Q(thread__isnull=True),
+                name='board_msg_root_keyset_idx',
+            ),
+            # 整個討論串或某條回覆之下的子樹：WHERE thread_id = ? [AND path 範圍] ORDER BY path
+            models.Index(fields=['thread', 'path'], name='board_msg_thread_path_idx'),
+        ]
 
     def __str__(self):
         return f"主題: {self.subject} - 留言者: {self.author.username}"
-# Create your models here.
+
+    @property
+    def depth(self):
+        """頂層留言為 0，直接回覆為 1"""
+        return self.path.count('/')
+
+    def save(self, *args, **kwargs):
+        adding = self._state.adding
+        if adding and self.parent_id is not None:
+            self.thread_id = self.parent.thread_id or self.parent_id
+        update_fields = kwargs.get('update_fields')
+        extra_fields = set()
+        # 維護 approved_at：由未審核變為已審核時記錄時間，取消審核時清空
+        if self.is_approved != (self.approved_at is not None):
+            self.approved_at = timezone.now() if self.is_approved else None
+            extra_fields.add('approved_at')
+        # 維護 pending_since：進入待審核時記錄時間，審核通過時清空
+        if self.is_approved == (self.pending_since is not None):
+            self.pending_since = None if self.is_approved else timezone.now()
+            extra_fields.add('pending_since')
+        # 內容改變時重新渲染 HTML 並更新指紋；updated_at 隨之改變，卡片片段改用新的快取鍵
+        if update_fields is None or {'subject', 'content'} & set(update_fields):
+            self.content_html = render_content(self.content)
+            self.fingerprint = content_fingerprint(self.subject, self.content)
+            extra_fields.update(('content_html', 'fingerprint', 'updated_at'))
+        if update_fields is not None:
+            if 'is_approved' not in update_fields:
+                extra_fields.difference_update(('approved_at', 'pending_since'))
+            kwargs['update_fields'] = {*update_fields, *extra_fields}
+        super().save(*args, **kwargs)
+        if adding and self.parent_id is not None and not self.path:
+            # 路徑包含自己的編號，新增之後才能寫入
+            self.path = self.parent.path + path_segment(self.pk)
+            type(self).objects.filter(pk=self.pk).update(path=self.path)
+
+
+class Reaction(models.Model):
+    """
+    一次表情回應。唯一約束保證每位使用者對每條留言的每種回應只有一行；
+    留言表上的計數欄位由 board/reactions.py 依這張表批量重新計算，不在每次點擊時更新。
+    """
+    KIND_CHOICES = [(name, emoji) for name, field, emoji in REACTION_KINDS]
+
+    message = models.ForeignKey(Message, on_delete=models.CASCADE, verbose_name="留言")
+    user = models.ForeignKey(User, on_delete=models.CASCADE, verbose_name="使用者")
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES, verbose_name="回應")
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="回應時間")
+
+    class Meta:
+        verbose_name = "表情回應"
+        verbose_name_plural = "表情回應"
+        constraints = [
+            # 以 message 開頭，同時供重新計算時 WHERE message_id = ? AND kind = ? 的計數使用
+            models.UniqueConstraint(fields=['message', 'kind', 'user'], name='board_reaction_unique'),
+        ]
+        indexes = [
+            # flush_reactions：最近有新回應的留言
+            models.Index(fields=['created_at'], name='board_reaction_created_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id} {self.kind} {self.message_id}"
+
+
+class OutboundEmail(models.Model):
+    """待發送的郵件 (outbox)。請求中只寫入此表，由 send_outbox 命令在背景發送"""
+    STATUS_PENDING = 'pending'
+    STATUS_SENT = 'sent'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_PENDING, '待發送'),
+        (STATUS_SENT, '已發送'),
+        (STATUS_FAILED, '發送失敗'),
+    ]
+
+    subject = models.CharField(max_length=300, verbose_name="郵件主旨")
+    body = models.TextField(verbose_name="郵件內容")
+    from_email = models.CharField(max_length=254, verbose_name="寄件者")
+    recipients = models.JSONField(default=list, verbose_name="收件者")
+    # 審核通知郵件關聯的留言，發送成功後會把該留言標記為已通知
+    related_message = models.ForeignKey(
+        Message, null=True, blank=True, on_delete=models.SET_NULL,
+        related_name='outbound_emails', verbose_name="關聯留言",
+    )
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=STATUS_PENDING, verbose_name="狀態")
+    attempts = models.PositiveIntegerField(default=0, verbose_name="嘗試次數")
+    last_error = models.TextField(blank=True, verbose_name="最後錯誤")
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="建立時間")
+    next_attempt_at = models.DateTimeField(default=timezone.now, verbose_name="下次嘗試時間")
+    sent_at = models.DateTimeField(null=True, blank=True, verbose_name="發送時間")
+
+    class Meta:
+        ordering = ['created_at']
+        verbose_name = "待發郵件"
+        verbose_name_plural = "待發郵件"
+        indexes = [
+            # send_outbox 取件查詢：WHERE status = 'pending' AND next_attempt_at <= now
+            models.Index(fields=['status', 'next_attempt_at'], name='board_outbox_due_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.subject} -> {', '.join(self.recipients)} ({self.get_status_display()})"
+
+
+class BoardCounter(models.Model):
+    """
+    由信號維護的計數器，取代列表頁與後台每次載入時的 COUNT(*)。
+    key 例如 'approved'、'pending'、'created:2025-06-16'。
+    """
+    key = models.CharField(max_length=64, unique=True, verbose_name="計數鍵")
+    value = models.BigIntegerField(default=0, verbose_name="數值")
+
+    class Meta:
+        verbose_name = "計數器"
+        verbose_name_plural = "計數器"
+
+    def __str__(self):
+        return f"{self.key} = {self.value}"
+
+
+class PooledCaptcha(models.Model):
+    """
+    預先生成的驗證碼 (見 board/captcha_pool.py)。
+    hashkey 對應 django-simple-captcha 的 CaptchaStore，image 是已渲染好的 PNG，請求中不需要使用 Pillow。
+    """
+    hashkey = models.CharField(max_length=40, unique=True, verbose_name="驗證碼鍵")
+    image = models.BinaryField(verbose_name="PNG 圖片")
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="生成時間")
+    expires_at = models.DateTimeField(verbose_name="過期時間") # 與 CaptchaStore.expiration 相同
+    issued_at = models.DateTimeField(null=True, blank=True, verbose_name="發出時間") # 已發給某個表單
+
+    class Meta:
+        verbose_name = "驗證碼池"
+        verbose_name_plural = "驗證碼池"
+        indexes = [
+            # 取用查詢：WHERE issued_at IS NULL AND expires_at > ? ORDER BY expires_at
+            models.Index(fields=['issued_at', 'expires_at'], name='board_captcha_pool_idx'),
+        ]
+
+    def __str__(self):
+        return self.hashkey
+
+
+class ArchivedMessage(ReactionCounts):
+    """
+    封存的舊留言 (見 board/archive.py)。
+    已審核且超過保留期限的留言從 Message 搬到這裡，使留言表保持精簡；id 沿用原本的留言編號，只供唯讀瀏覽。
+    """
+    id = models.BigIntegerField(primary_key=True, verbose_name="留言編號")
+    author = models.ForeignKey(User, on_delete=models.CASCADE, related_name='archived_messages', verbose_name="留言者")
+    subject = models.CharField(max_length=200, verbose_name="主題")
+    content = models.TextField(verbose_name="留言内容")
+    created_at = models.DateTimeField(verbose_name="留言時間")
+    approved_at = models.DateTimeField(null=True, blank=True, verbose_name="審核通過時間")
+    content_html = models.TextField(blank=True, default='', verbose_name="内容 HTML")
+    updated_at = models.DateTimeField(verbose_name="修改時間") # 與原本的留言相同，可沿用已快取的卡片片段
+    # 討論串與整串一起封存；沿用原本的留言編號，不使用外鍵
+    thread_id = models.BigIntegerField(null=True, blank=True, verbose_name="討論串")
+    path = models.CharField(max_length=255, blank=True, default='', verbose_name="回覆路徑")
+    reply_count = models.PositiveIntegerField(default=0, verbose_name="回覆數")
+    archived_at = models.DateTimeField(auto_now_add=True, verbose_name="封存時間")
+
+    class Meta:
+        ordering = ['-created_at', '-id']
+        verbose_name = "封存留言"
+        verbose_name_plural = "封存留言"
+        indexes = [
+            # 封存頁的游標分頁 (只列出頂層留言)：WHERE thread_id IS NULL ORDER BY created_at DESC, id DESC
+            models.Index(
+                fields=['-created_at', '-id'], condition=models.Q(thread_id__isnull=True),
+                name='board_archive_root_keyset_idx',
+            ),
+            models.Index(fields=['thread_id', 'path'], name='board_archive_thread_idx'),
+        ]
+
+    def __str__(self):
+        return f"主題: {self.subject} (封存)"
+
+    @property
+    def depth(self):
+        return self.path.count('/')
@@ -0,0 +1,157 @@
+# board/moderation.py
+"""
+以關鍵字自動審核留言。
+
+禁用 (MODERATION_DENY_KEYWORDS) 與允許 (MODERATION_ALLOW_KEYWORDS) 兩份關鍵字清單編譯成同一個
+Aho-Corasick 自動機，每條留言只需要從頭到尾掃描一次，成本與留言長度成正比，與關鍵字數量無關。
+
+- 命中禁用關鍵字的留言留在審核佇列；若該次命中完全落在某個允許關鍵字之內 (例如禁用 "sex"、允許 "sussex")，則不算命中
+- 設定 AUTO_MODERATION = True 時，post_message 與 edit_message 保存的乾淨留言直接通過審核
+- `python manage.py moderate_pending` 以同樣的規則重新掃描既有的待審核留言
+
+比對前以 NFKC 正規化並忽略大小寫，全形/半形字母視為相同。
+"""
+import unicodedata
+from collections import deque
+from dataclasses import dataclass
+from functools import lru_cache
+
+from django.conf import settings
+
+from .approval import approve_messages
+from .models import Message
+
+DENY = 'deny'
+ALLOW = 'allow'
+MODERATION_BATCH_SIZE = 1000
+
+
+def normalize_text(text):
+    return unicodedata.normalize('NFKC', text).casefold()
+
+
+class KeywordAutomaton:
+    """Aho-Corasick 自動機：一次掃描找出文字中所有 (可重疊的) 關鍵字"""
+
+    def __init__(self, keywords):
+        # keywords 為 (關鍵字, 標籤) 的序列；狀態 0 為根節點
+        self._goto = [{}]
+        self._fail = [0]
+        self._output = [()]
+        for keyword, label in keywords:
+            keyword = normalize_text(keyword.strip())
+            if not keyword:
+                continue
+            state = 0
+            for char in keyword:
+                next_state = self._goto[state].get(char)
+                if next_state is None:
+                    next_state = len(self._goto)
+                    self._goto[state][char] = next_state
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._output.append(())
+                state = next_state
+            self._output[state] += ((len(keyword), label, keyword),)
+        self._build_failure_links()
+
+    def _build_failure_links(self):
+        # 廣度優先：失敗連結指向「目前路徑最長的、同時也是某個關鍵字前綴的後綴」
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fallback = self._fail[state]
+                while fallback and char not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                self._fail[next_state] = self._goto[fallback].get(char, 0)
+                # 合併後綴狀態的輸出，掃描時不需要沿著失敗連結逐一檢查
+                self._output[next_state] += self._output[self._fail[next_state]]
+
+    def __len__(self):
+        return len(self._goto)
+
+    def iter_matches(self, text):
+        """依結束位置產生 (開始, 結束, 標籤, 關鍵字)；text 需先經過 normalize_text"""
+        goto, fail, output = self._goto, self._fail, self._output
+        state = 0
+        for end, char in enumerate(text, 1):
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            for length, label, keyword in output[state]:
+                yield end - length, end, label, keyword
+
+
+@dataclass(frozen=True)
+class ModerationResult:
+    denied: tuple = () # 命中的禁用關鍵字
+
+    @property
+    def approved(self):
+        return not self.denied
+
+
+@lru_cache(maxsize=4)
+def compile_rules(deny_keywords, allow_keywords):
+    """編譯關鍵字清單；同一組清單只編譯一次"""
+    return KeywordAutomaton([(k, DENY) for k in deny_keywords] + [(k, ALLOW) for k in allow_keywords])
+
+
+def current_rules():
+    # 每次讀取設定，測試可以用 override_settings 調整；編譯結果由 compile_rules 快取
+    return compile_rules(
+        tuple(getattr(settings, 'MODERATION_DENY_KEYWORDS', ())),
+        tuple(getattr(settings, 'MODERATION_ALLOW_KEYWORDS', ())),
+    )
+
+
+def scan(text, automaton=None):
+    """返回 text 中命中的禁用關鍵字 (已排除落在允許關鍵字之內的命中)"""
+    if automaton is None:
+        automaton = current_rules()
+    denied, allowed = [], []
+    for start, end, label, keyword in automaton.iter_matches(normalize_text(text)):
+        (denied if label == DENY else allowed).append((start, end, keyword))
+    return tuple(dict.fromkeys(
+        keyword for start, end, keyword in denied
+        if not any(a_start <= start and end <= a_end for a_start, a_end, _ in allowed)
+    ))
+
+
+def moderate(subject, content, automaton=None):
+    # 主題與內容以換行分隔，關鍵字不會跨越兩者
+    return ModerationResult(denied=scan(f'{subject}\n{content}', automaton))
+
+
+def auto_moderation_enabled():
+    return getattr(settings, 'AUTO_MODERATION', False)
+
+
+def should_auto_approve(message):
+    """留言保存前呼叫：啟用自動審核且沒有命中禁用關鍵字時返回 True"""
+    return auto_moderation_enabled() and moderate(message.subject, message.content).approved
+
+
+def rescan_pending(batch_size=MODERATION_BATCH_SIZE, dry_run=False):
+    """
+    以目前的規則重新掃描待審核留言，乾淨的留言以 approve_messages 批量通過 (並通知留言者)。
+    返回 (掃描的數量, 通過的數量)；dry_run 時只計算會通過的數量。
+    """
+    automaton = current_rules()
+    pending = Message.objects.filter(is_approved=False).order_by('pk')
+    scanned = approved = 0
+    last_pk = 0
+    while True:
+        batch = list(pending.filter(pk__gt=last_pk).values_list('pk', 'subject', 'content')[:batch_size])
+        if not batch:
+            break
+        last_pk = batch[-1][0]
+        scanned += len(batch)
+        clean = [pk for pk, subject, content in batch if moderate(subject, content, automaton).approved]
+        if dry_run:
+            approved += len(clean)
+        elif clean:
+            approved += approve_messages(Message.objects.filter(pk__in=clean)).approved_count
+    return scanned, approved
@@ -0,0 +1,144 @@
+# board/outbox.py
+"""
+可靠的郵件發送佇列 (outbox)。
+
+視圖與後台只呼叫 enqueue_* 把郵件寫入 OutboundEmail 表，請求延遲不再取決於 SMTP 伺服器；
+`python manage.py send_outbox` 在背景以單一 SMTP 連線批量發送，失敗時以指數退避重試。
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Message, OutboundEmail
+
+# 最多嘗試次數，超過後標記為發送失敗，留待管理員處理
+OUTBOX_MAX_ATTEMPTS = getattr(settings, 'OUTBOX_MAX_ATTEMPTS', 8)
+# 重試退避：第 n 次失敗後等待 base * 2**(n-1) 秒，最長不超過 max
+OUTBOX_BACKOFF_BASE = getattr(settings, 'OUTBOX_BACKOFF_BASE', 30)
+OUTBOX_BACKOFF_MAX = getattr(settings, 'OUTBOX_BACKOFF_MAX', 3600)
+# 取件後的租約時間：worker 中途崩潰時，這些郵件在租約過期後會被重新取件
+OUTBOX_LEASE_SECONDS = getattr(settings, 'OUTBOX_LEASE_SECONDS', 300)
+
+
+def enqueue_mail(subject, body, recipients, from_email=None, related_message=None):
+    """把一封郵件放入佇列，返回 OutboundEmail"""
+    return OutboundEmail.objects.create(
+        subject=subject,
+        body=body,
+        from_email=from_email or settings.DEFAULT_FROM_EMAIL,
+        recipients=list(recipients),
+        related_message=related_message,
+    )
+
+
+def enqueue_mail_admins(subject, message):
+    """與 django.core.mail.mail_admins 相同的語義，但只寫入佇列；未設定 ADMINS 時不做任何事"""
+    if not settings.ADMINS:
+        return None
+    return enqueue_mail(
+        f'{settings.EMAIL_SUBJECT_PREFIX}{subject}',
+        message,
+        [email for _, email in settings.ADMINS],
+        from_email=settings.SERVER_EMAIL,
+    )
+
+
+def build_approval_notification(message):
+    """留言審核通過的通知郵件 (未儲存的 OutboundEmail)"""
+    return OutboundEmail(
+        subject=f'您的留言「{message.subject}」已通過審核',
+        body=f'您好 {message.author.username}，\n\n您的留言「{message.subject}」已通過管理員審核，現在已在網站上顯示。\n\n感謝您的參與！',
+        from_email=settings.DEFAULT_FROM_EMAIL,
+        recipients=[message.author.email],
+        related_message=message,
+    )
+
+
+def enqueue_approval_notification(message):
+    """把留言審核通過的通知放入佇列，發送成功後 send_outbox 會設定 message.notified"""
+    notification = build_approval_notification(message)
+    notification.save()
+    return notification
+
+
+def backoff_delay(attempts):
+    return timedelta(seconds=min(OUTBOX_BACKOFF_BASE * 2 ** max(attempts - 1, 0), OUTBOX_BACKOFF_MAX))
+
+
+def claim_due_emails(batch_size):
+    """
+    取出到期的待發郵件並延後其 next_attempt_at 作為租約，避免多個 worker 重複發送。
+    在支援的資料庫 (PostgreSQL) 上使用 SELECT ... FOR UPDATE SKIP LOCKED。
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        ids = list(
+            OutboundEmail.objects
+            .select_for_update(skip_locked=True)
+            .filter(status=OutboundEmail.STATUS_PENDING, next_attempt_at__lte=now)
+            .order_by('next_attempt_at', 'id')
+            .values_list('id', flat=True)[:batch_size]
+        )
+        if ids:
+            OutboundEmail.objects.filter(id__in=ids).update(
+                next_attempt_at=now + timedelta(seconds=OUTBOX_LEASE_SECONDS)
+            )
+    return list(OutboundEmail.objects.filter(id__in=ids).order_by('id'))
+
+
+def _record_failure(email, error, max_attempts):
+    email.attempts += 1
+    email.last_error = str(error)
+    if email.attempts >= max_attempts:
+        email.status = OutboundEmail.STATUS_FAILED
+    else:
+        email.next_attempt_at = timezone.now() + backoff_delay(email.attempts)
+    email.save(update_fields=['attempts', 'last_error', 'status', 'next_attempt_at'])
+
+
+def send_pending(batch_size=100, max_attempts=None, connection=None):
+    """
+    發送一批到期的郵件，整批共用同一個 SMTP 連線。
+    返回 (已發送數量, 失敗數量)。
+    """
+    max_attempts = max_attempts or OUTBOX_MAX_ATTEMPTS
+    emails = claim_due_emails(batch_size)
+    if not emails:
+        return 0, 0
+
+    connection = connection or get_connection(fail_silently=False)
+    try:
+        connection.open()
+    except Exception as e:
+        # 連線失敗：整批稍後重試
+        for email in emails:
+            _record_failure(email, e, max_attempts)
+        return 0, len(emails)
+
+    sent_ids, notified_message_ids, failed = [], [], 0
+    try:
+        for email in emails:
+            msg = EmailMessage(email.subject, email.body, email.from_email, email.recipients, connection=connection)
+            try:
+                msg.send(fail_silently=False)
+            except Exception as e:
+                _record_failure(email, e, max_attempts)
+                failed += 1
+                continue
+            sent_ids.append(email.id)
+            if email.related_message_id:
+                notified_message_ids.append(email.related_message_id)
+    finally:
+        connection.close()
+
+    if sent_ids:
+        OutboundEmail.objects.filter(id__in=sent_ids).update(
+            status=OutboundEmail.STATUS_SENT, sent_at=timezone.now(), last_error='',
+        )
+    if notified_message_ids:
+        # 只有郵件確實送出的留言才標記為已通知
+        Message.objects.filter(id__in=notified_message_ids).update(notified=True)
+    return len(sent_ids), failed
@@ -0,0 +1,181 @@
+# board/pagination.py
+"""
+以 (created_at, id) 為鍵的游標分頁 (keyset pagination)。
+
+與 Django 內建 Paginator 不同，這裡不會執行 COUNT(*)，也不使用 OFFSET，
+每一頁都只是「從上一頁最後一筆之後取 N+1 筆」，因此第 5000 頁與第 1 頁的成本相同。
+游標以 URL 安全的 base64 字串傳遞，對前端而言是不透明的。
+"""
+import base64
+import binascii
+import json
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import Q
+from django.utils.functional import cached_property
+
+EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+# 查詢計劃估計的行數超過此值時，EstimatedCountPaginator 不再執行 COUNT(*)
+ESTIMATED_COUNT_THRESHOLD = getattr(settings, 'ESTIMATED_COUNT_THRESHOLD', 10_000)
+
+
+def encode_cursor(created_at, pk):
+    """將 (created_at, id) 編碼為不透明的游標字串"""
+    micros = (created_at - EPOCH) // timedelta(microseconds=1)
+    raw = f'{micros}.{pk}'.encode('ascii')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(token):
+    """解碼游標字串，格式錯誤時返回 None（視為第一頁）"""
+    if not token:
+        return None
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        micros, pk = base64.urlsafe_b64decode(padded.encode('ascii')).decode('ascii').split('.')
+        return EPOCH + timedelta(microseconds=int(micros)), int(pk)
+    except (ValueError, TypeError, binascii.Error, UnicodeError, OverflowError):
+        return None
+
+
+def row_key(row):
+    """取得一筆資料的 (created_at, id)，同時支援模型實例與 values() 返回的 dict"""
+    if isinstance(row, dict):
+        return row['created_at'], row['id']
+    return row.created_at, row.pk
+
+
+class CountedPaginator(Paginator):
+    """總數由外部提供 (例如 board.stats 的計數器) 的 Paginator，不再執行 COUNT(*)"""
+
+    def __init__(self, object_list, per_page, count, **kwargs):
+        super().__init__(object_list, per_page, **kwargs)
+        self._known_count = count
+
+    @cached_property
+    def count(self):
+        return self._known_count
+
+
+def estimate_count(queryset):
+    """
+    以 PostgreSQL 查詢計劃的估計行數代替 COUNT(*)，不實際掃描資料。
+    其他資料庫沒有便宜的估計方式，返回 None。
+    """
+    using = queryset.db
+    if connections[using].vendor != 'postgresql':
+        return None
+    sql, params = queryset.order_by().query.sql_with_params()
+    with connections[using].cursor() as cursor:
+        cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]['Plan']['Plan Rows'])
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    大表上使用估計總數的 Paginator (admin 列表)：
+    估計值達到 ESTIMATED_COUNT_THRESHOLD 時直接使用，否則照常執行 COUNT(*)，小結果集的頁數仍然精確。
+    """
+
+    @cached_property
+    def count(self):
+        estimate = estimate_count(self.object_list)
+        if estimate is not None and estimate >= ESTIMATED_COUNT_THRESHOLD:
+            return estimate
+        return super().count
+
+
+class KeysetPage:
+    """一頁游標分頁結果，介面盡量與 django.core.paginator.Page 保持一致，方便模板共用"""
+
+    def __init__(self, object_list, has_next, has_previous):
+        self.object_list = object_list
+        self._has_next = has_next
+        self._has_previous = has_previous
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_next(self):
+        return self._has_next
+
+    def has_previous(self):
+        return self._has_previous
+
+    def has_other_pages(self):
+        return self._has_next or self._has_previous
+
+    @property
+    def next_cursor(self):
+        if not self._has_next or not self.object_list:
+            return None
+        return encode_cursor(*row_key(self.object_list[-1]))
+
+    @property
+    def previous_cursor(self):
+        if not self._has_previous or not self.object_list:
+            return None
+        return encode_cursor(*row_key(self.object_list[0]))
+
+
+def _keyset_query(queryset, per_page, after=None, before=None):
+    """
+    構造一頁的查詢 (多取一筆以判斷是否還有下一頁)。
+    返回 (查詢, 是否為向前翻頁, 是否帶有 after 游標)。
+    """
+    after_key = decode_cursor(after)
+    before_key = decode_cursor(before)
+
+    if before_key is not None:
+        created_at, pk = before_key
+        qs = queryset.filter(
+            Q(created_at__gt=created_at) | Q(created_at=created_at, pk__gt=pk)
+        ).order_by('created_at', 'id')
+        return qs[:per_page + 1], True, False
+
+    qs = queryset.order_by('-created_at', '-id')
+    if after_key is not None:
+        created_at, pk = after_key
+        qs = qs.filter(Q(created_at__lt=created_at) | Q(created_at=created_at, pk__lt=pk))
+    return qs[:per_page + 1], False, after_key is not None
+
+
+def _keyset_page(rows, per_page, backwards, has_after):
+    if backwards:
+        has_previous = len(rows) > per_page
+        rows = rows[:per_page]
+        rows.reverse()
+        # 從較舊的頁面往回翻，後面必然還有資料
+        return KeysetPage(rows, has_next=True, has_previous=has_previous)
+    return KeysetPage(rows[:per_page], has_next=len(rows) > per_page, has_previous=has_after)
+
+
+def keyset_paginate(queryset, per_page, after=None, before=None):
+    """
+    以 (-created_at, -id) 順序取一頁資料。
+
+    after:  取「比游標更舊」的下一頁（向後翻頁）
+    before: 取「比游標更新」的上一頁（向前翻頁）
+    兩者皆為 None 時返回第一頁。
+    """
+    qs, backwards, has_after = _keyset_query(queryset, per_page, after, before)
+    return _keyset_page(list(qs), per_page, backwards, has_after)
+
+
+async def akeyset_paginate(queryset, per_page, after=None, before=None):
+    """keyset_paginate 的非同步版本，使用非同步 ORM (aiterator)"""
+    qs, backwards, has_after = _keyset_query(queryset, per_page, after, before)
+    rows = [row async for row in qs.aiterator()]
+    return _keyset_page(rows, per_page, backwards, has_after)
@@ -0,0 +1,142 @@
+# board/ratelimit.py
+"""
+表單提交的速率限制 (令牌桶)。
+
+post_message、signup 與登入都會觸發昂貴的工作：表單驗證、驗證碼查詢、密碼雜湊、寫入資料庫與寄送通知。
+rate_limit(scope) 裝飾器在視圖執行之前，依來源 IP 與登入的使用者各取一個令牌，任一個桶已空就直接返回 429，
+不建立表單、不查詢資料庫 (使用者 id 直接從 session 讀取，不載入使用者)。
+表情回應 (react) 本身的成本很低，限制速率是為了防止以大量請求灌水計數。
+驗證碼刷新 (captcha_refresh) 是公開的 GET，限制速率防止匿名客戶端把驗證碼池取空。
+
+每個 scope 的速率以 settings.RATE_LIMITS 設定，格式為 "次數/時間單位" (s、m、h、d)：
+桶容量為次數，並在該時間內線性補滿。桶的狀態存放在 Django 快取中，多個進程共用；
+快取無法使用時改用進程內的桶，限制仍然有效，只是每個進程各自計算。
+"""
+import logging
+import threading
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.contrib.auth import SESSION_KEY
+from django.core.cache import caches
+from django.http import HttpResponse
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_RATE_LIMITS = {
+    'post_message': '5/m',
+    'signup': '5/h',
+    'login': '10/m',
+    'react': '60/m',
+    'captcha_refresh': '30/m',
+}
+# 存放令牌桶的快取別名
+RATE_LIMIT_CACHE = getattr(settings, 'RATE_LIMIT_CACHE', 'default')
+# 應用前面的反向代理數量；大於 0 時從 X-Forwarded-For 的右側取得實際的來源 IP
+RATE_LIMIT_PROXY_COUNT = getattr(settings, 'RATE_LIMIT_PROXY_COUNT', 0)
+# 進程內備用桶的數量上限，超過時清除已補滿的桶
+LOCAL_BUCKET_LIMIT = 10_000
+
+PERIODS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+_local_buckets = {}
+_local_lock = threading.Lock()
+_warned_unconfigured_proxy = False
+
+
+def parse_rate(rate):
+    """'5/m' -> (5, 60)；None 表示不限制"""
+    if not rate:
+        return None
+    count, _, unit = rate.partition('/')
+    return int(count), PERIODS[unit[:1]]
+
+
+def rate_for(scope):
+    # 每次請求時讀取設定，測試與 benchmark_board 可以用 override_settings 調整
+    return parse_rate(getattr(settings, 'RATE_LIMITS', DEFAULT_RATE_LIMITS).get(scope))
+
+
+def client_ip(request):
+    global _warned_unconfigured_proxy
+    if RATE_LIMIT_PROXY_COUNT:
+        forwarded = [ip.strip() for ip in request.META.get('HTTP_X_FORWARDED_FOR', '').split(',') if ip.strip()]
+        if len(forwarded) >= RATE_LIMIT_PROXY_COUNT:
+            # 最右側的項目由我們自己的代理加入，客戶端偽造的項目只會出現在更左側
+            return forwarded[-RATE_LIMIT_PROXY_COUNT]
+    elif 'HTTP_X_FORWARDED_FOR' in request.META and not _warned_unconfigured_proxy:
+        # 在反向代理之後卻沒有設定代理數量：REMOTE_ADDR 是代理的位址，所有訪客會共用同一個 IP 桶
+        _warned_unconfigured_proxy = True
+        logger.warning(
+            '請求帶有 X-Forwarded-For 但 RATE_LIMIT_PROXY_COUNT 為 0，所有訪客將共用代理位址的速率限制；'
+            '請設定 DJANGO_RATE_LIMIT_PROXY_COUNT 為應用前面的反向代理數量'
+        )
+    return request.META.get('REMOTE_ADDR', '')
+
+
+def _refill(state, capacity, period, now):
+    tokens, updated = state or (capacity, now)
+    return min(capacity, tokens + (now - updated) * capacity / period)
+
+
+def _take_local(key, capacity, period, now):
+    with _local_lock:
+        if len(_local_buckets) >= LOCAL_BUCKET_LIMIT:
+            for stale in [k for k, (_, updated) in _local_buckets.items() if now - updated >= period]:
+                del _local_buckets[stale]
+        tokens = _refill(_local_buckets.get(key), capacity, period, now)
+        allowed = tokens >= 1
+        _local_buckets[key] = (tokens - 1 if allowed else tokens, now)
+    return allowed, tokens
+
+
+def take_token(key, capacity, period):
+    """
+    從 key 的令牌桶取一個令牌，返回 (是否允許, 需要等待的秒數)。
+    快取的讀取與寫入不是原子操作，並發請求偶爾會多放行一兩個，對防止濫用已經足夠。
+    """
+    now = time.time()
+    try:
+        cache = caches[RATE_LIMIT_CACHE]
+        tokens = _refill(cache.get(key), capacity, period, now)
+        allowed = tokens >= 1
+        # 桶在 period 秒內必然補滿，之後不需要保留
+        cache.set(key, (tokens - 1 if allowed else tokens, now), timeout=period)
+    except Exception:
+        logger.warning('速率限制的快取無法使用，改用進程內的令牌桶', exc_info=True)
+        allowed, tokens = _take_local(key, capacity, period, now)
+    wait = 0 if allowed else (1 - tokens) * period / capacity
+    return allowed, wait
+
+
+def rate_limited_response(wait):
+    retry_after = max(1, round(wait))
+    response = HttpResponse(
+        f'請求過於頻繁，請在 {retry_after} 秒後再試。', status=429, content_type='text/plain; charset=utf-8',
+    )
+    response['Retry-After'] = str(retry_after)
+    return response
+
+
+def rate_limit(scope, methods=('POST',)):
+    """依來源 IP 與登入的使用者限制視圖的請求速率 (預設只限制 POST)，超過時返回 429"""
+    def decorator(view):
+        @wraps(view)
+        def inner(request, *args, **kwargs):
+            rate = rate_for(scope)
+            if rate is None or request.method not in methods:
+                return view(request, *args, **kwargs)
+            capacity, period = rate
+            keys = [f'ratelimit:{scope}:ip:{client_ip(request)}']
+            user_id = request.session.get(SESSION_KEY)
+            if user_id is not None:
+                # 同一個帳號從多個 IP 發送也共用一個桶
+                keys.append(f'ratelimit:{scope}:user:{user_id}')
+            # 每個桶都要取令牌，任一個已空就拒絕
+            wait = max(take_token(key, capacity, period)[1] for key in keys)
+            if wait:
+                return rate_limited_response(wait)
+            return view(request, *args, **kwargs)
+        return inner
+    return decorator
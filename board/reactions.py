@@ -0,0 +1,142 @@
+# board/reactions.py
+"""
+表情回應 (讚、愛心、哈哈) 的計數。
+
+熱門留言每收到一次點擊就執行一次 UPDATE message SET like_count = like_count + 1，
+所有點擊都會爭用同一行的寫鎖。這裡把「記錄回應」與「更新計數」分開：
+- 每次點擊只在 Reaction 表插入一行 (INSERT ... ON CONFLICT DO NOTHING)，不鎖留言表；
+  唯一約束 (message, kind, user) 保證同一使用者的重複點擊只算一次，所有進程共用
+- 留言編號記在進程內的緩衝區 (集合)；距離上一次寫入超過 REACTION_FLUSH_INTERVAL 秒，
+  或累積了 REACTION_FLUSH_MAX_PENDING 次點擊時，依 Reaction 表重新計算這些留言的計數：
+  每 REACTION_FLUSH_BATCH_SIZE 條留言一條 UPDATE，一條留言不論被點了多少次都只更新一次
+- 進程閒置時緩衝區不會被觸發寫入，由排程執行的 `python manage.py flush_reactions`
+  重新計算最近 REACTION_RECOUNT_WINDOW 秒內有新回應的留言
+- 計數保存在留言表本身，列表頁與留言在同一條查詢中讀出，不需要額外查詢
+
+計數是依 Reaction 表重新計算的結果而不是累加的增量，重複計算不會累積誤差，
+進程異常終止也不會遺失任何回應：最多延遲到下一次 flush_reactions 才反映在計數上。
+
+計數的改變不遞增留言板版本號 (那會使所有列表頁快取與 ETag 失效)；
+已快取的列表頁最多 MESSAGE_LIST_CACHE_TIMEOUT 秒後才顯示新的計數。
+"""
+import atexit
+import logging
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import DatabaseError
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import REACTION_KINDS, Message, Reaction
+
+logger = logging.getLogger(__name__)
+
+# 兩次寫入之間最長的秒數
+REACTION_FLUSH_INTERVAL = getattr(settings, 'REACTION_FLUSH_INTERVAL', 10)
+# 緩衝區累積多少次點擊時立即寫入
+REACTION_FLUSH_MAX_PENDING = getattr(settings, 'REACTION_FLUSH_MAX_PENDING', 1000)
+# 每條 UPDATE 最多更新的留言數量
+REACTION_FLUSH_BATCH_SIZE = getattr(settings, 'REACTION_FLUSH_BATCH_SIZE', 500)
+# flush_reactions 重新計算的時間範圍 (秒)，應大於排程的執行間隔
+REACTION_RECOUNT_WINDOW = getattr(settings, 'REACTION_RECOUNT_WINDOW', 600)
+
+REACTION_FIELDS = {name: field for name, field, emoji in REACTION_KINDS}
+
+
+def refresh_reaction_counts(message_ids, batch_size=REACTION_FLUSH_BATCH_SIZE):
+    """依 Reaction 表重新計算留言的計數，每批一條 UPDATE (子查詢使用唯一約束的索引)，返回更新的留言數量"""
+    message_ids = sorted(set(message_ids)) # 固定的更新順序，多個進程同時寫入時不會互相死鎖
+    updated = 0
+    for start in range(0, len(message_ids), batch_size):
+        updated += Message.objects.filter(pk__in=message_ids[start:start + batch_size]).update(**{
+            field: Coalesce(Subquery(
+                Reaction.objects.filter(message_id=OuterRef('pk'), kind=name)
+                .order_by().values('message_id').annotate(total=Count('pk')).values('total')
+            ), 0)
+            for name, field in REACTION_FIELDS.items()
+        })
+    return updated
+
+
+class ReactionBuffer:
+    """進程內等待重新計算的留言，多個執行緒共用"""
+
+    def __init__(self, interval=REACTION_FLUSH_INTERVAL, max_pending=REACTION_FLUSH_MAX_PENDING,
+                 batch_size=REACTION_FLUSH_BATCH_SIZE):
+        self.interval = interval
+        self.max_pending = max_pending
+        self.batch_size = batch_size
+        self._message_ids = set()
+        self._pending = 0
+        self._last_flush = time.monotonic()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return self._pending
+
+    def add(self, message_id):
+        with self._lock:
+            self._message_ids.add(message_id)
+            self._pending += 1
+
+    def flush_due(self):
+        return self._pending > 0 and (
+            self._pending >= self.max_pending or time.monotonic() - self._last_flush >= self.interval
+        )
+
+    def drain(self):
+        """取出並清空緩衝區，返回留言編號的集合"""
+        with self._lock:
+            message_ids, self._message_ids = self._message_ids, set()
+            self._pending = 0
+            self._last_flush = time.monotonic()
+        return message_ids
+
+    def restore(self, message_ids):
+        """把沒有寫入的留言放回緩衝區"""
+        with self._lock:
+            self._message_ids.update(message_ids)
+            self._pending += len(message_ids)
+
+    def flush(self):
+        """重新計算緩衝區中的留言，返回更新的留言數量"""
+        message_ids = self.drain()
+        if not message_ids:
+            return 0
+        try:
+            return refresh_reaction_counts(message_ids, self.batch_size)
+        except DatabaseError:
+            # 重新計算是冪等的，整批放回即可；沒有放回的也會由 flush_reactions 補上
+            self.restore(message_ids)
+            logger.warning('表情回應計數更新失敗，留言已放回緩衝區', exc_info=True)
+            return 0
+
+
+buffer = ReactionBuffer()
+
+
+def record_reaction(user, message_id, kind):
+    """記錄一次回應 (同一使用者重複的回應由唯一約束忽略)；計數在緩衝區寫入時才更新"""
+    Reaction.objects.bulk_create([Reaction(message_id=message_id, user=user, kind=kind)], ignore_conflicts=True)
+    buffer.add(message_id)
+    if buffer.flush_due():
+        buffer.flush()
+
+
+def recount_recent_reactions(window=REACTION_RECOUNT_WINDOW, batch_size=REACTION_FLUSH_BATCH_SIZE):
+    """重新計算最近 window 秒內有新回應的留言 (涵蓋閒置或已終止的進程尚未寫入的緩衝區)"""
+    since = timezone.now() - timedelta(seconds=window)
+    message_ids = Reaction.objects.filter(created_at__gte=since).values_list('message_id', flat=True).distinct()
+    return refresh_reaction_counts(list(message_ids), batch_size)
+
+
+def flush_reactions():
+    return buffer.flush()
+
+
+# 進程正常結束時寫入緩衝區
+atexit.register(flush_reactions)
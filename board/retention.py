@@ -0,0 +1,115 @@
+# board/retention.py
+"""
+資料保留政策。
+
+沒有人清理的資料會一直累積：被拒絕或無人處理的留言、過期的驗證碼 (CaptchaStore 與驗證碼池)、
+資料庫中的過期 session，以及已發送的郵件。這些死資料會拖慢留言列表與後台的每一次計數與掃描。
+
+`python manage.py enforce_retention` 依 RETENTION_DAYS 的政策逐表清理：
+- 每批最多刪除 batch_size 行，每批一個短交易，批與批之間暫停 pause 秒，
+  不會有單一語句長時間持有鎖或產生很大的交易 (PostgreSQL 的 WAL / SQLite 的寫鎖)
+- 依主鍵遞增分批 (pk > 上一批最後一個)，不會反覆掃描已刪除的行
+- 返回每一個政策清理的行數
+
+RETENTION_DAYS 的值為「過期 (或建立；待審核留言為進入待審核) 多少天後刪除」，設為 None 可停用該政策。
+"""
+import time
+from dataclasses import dataclass
+from datetime import timedelta
+from typing import Callable
+
+from django.conf import settings
+from django.contrib.sessions.models import Session
+from django.db import transaction
+from django.utils import timezone
+
+from .archive import PURGE_UNAPPROVED_AFTER_DAYS, purge_unapproved_messages
+from .captcha_pool import expired_captcha_stores, stale_pool_entries
+from .models import OutboundEmail
+
+RETENTION_BATCH_SIZE = 1000
+# 每批之間暫停的秒數
+RETENTION_PAUSE = 0.1
+DATABASE_SESSION_ENGINES = ('django.contrib.sessions.backends.db', 'django.contrib.sessions.backends.cached_db')
+
+DEFAULT_RETENTION_DAYS = {
+    'pending_messages': PURGE_UNAPPROVED_AFTER_DAYS, # 進入待審核 (提交、修改後待重審或被取消通過) 後一直未通過的留言
+    'captcha': 0,                                    # 過期或已作答的驗證碼
+    'sessions': 0,                                   # 過期的 session
+    'sent_emails': 30,                               # 已發送的郵件 (發送失敗的保留，供後台重試)
+}
+
+
+def retention_days():
+    days = dict(DEFAULT_RETENTION_DAYS)
+    days.update(getattr(settings, 'RETENTION_DAYS', {}))
+    return days
+
+
+def delete_in_chunks(queryset, batch_size=RETENTION_BATCH_SIZE, pause=RETENTION_PAUSE):
+    """依主鍵分批刪除 queryset 中的行，返回刪除的數量"""
+    deleted = 0
+    last_pk = None
+    while True:
+        with transaction.atomic():
+            chunk = queryset.order_by('pk')
+            if last_pk is not None:
+                chunk = chunk.filter(pk__gt=last_pk)
+            pks = list(chunk.values_list('pk', flat=True)[:batch_size])
+            if pks:
+                # 再次套用條件，期間被修改 (例如 session 被延長) 的行不會被刪除
+                deleted += queryset.filter(pk__in=pks).delete()[0]
+        if len(pks) < batch_size:
+            return deleted
+        last_pk = pks[-1]
+        if pause:
+            time.sleep(pause)
+
+
+def _purge_captcha(cutoff, batch_size, pause):
+    return (
+        delete_in_chunks(expired_captcha_stores(cutoff), batch_size, pause)
+        + delete_in_chunks(stale_pool_entries(cutoff), batch_size, pause)
+    )
+
+
+def _purge_sessions(cutoff, batch_size, pause):
+    if settings.SESSION_ENGINE not in DATABASE_SESSION_ENGINES:
+        return 0 # session 不存放在資料庫中
+    return delete_in_chunks(Session.objects.filter(expire_date__lt=cutoff), batch_size, pause)
+
+
+def _purge_sent_emails(cutoff, batch_size, pause):
+    queryset = OutboundEmail.objects.filter(status=OutboundEmail.STATUS_SENT, sent_at__lt=cutoff)
+    return delete_in_chunks(queryset, batch_size, pause)
+
+
+@dataclass(frozen=True)
+class RetentionPolicy:
+    name: str
+    description: str
+    purge: Callable
+
+
+POLICIES = (
+    # 留言的刪除需要同步更新計數器與搜尋索引，沿用 board/archive.py 的分批刪除 (依 pending_since 判斷期限)
+    RetentionPolicy('pending_messages', '未審核留言', purge_unapproved_messages),
+    RetentionPolicy('captcha', '驗證碼', _purge_captcha),
+    RetentionPolicy('sessions', 'session', _purge_sessions),
+    RetentionPolicy('sent_emails', '已發送郵件', _purge_sent_emails),
+)
+
+
+def run_retention(only=None, batch_size=RETENTION_BATCH_SIZE, pause=RETENTION_PAUSE):
+    """
+    執行保留政策 (only 為政策名稱的集合，None 表示全部)，返回 {政策名稱: 刪除的行數}；
+    停用 (天數為 None) 的政策不會出現在結果中。
+    """
+    days = retention_days()
+    now = timezone.now()
+    reclaimed = {}
+    for policy in POLICIES:
+        if (only is not None and policy.name not in only) or days.get(policy.name) is None:
+            continue
+        reclaimed[policy.name] = policy.purge(now - timedelta(days=days[policy.name]), batch_size, pause)
+    return reclaimed
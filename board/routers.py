@@ -0,0 +1,71 @@
+# board/routers.py
+"""
+主庫 / 唯讀副本的資料庫路由。
+
+設定 DATABASE_REPLICA_URL 後 settings.DATABASES 會多出 'replica'：
+留言 (board.Message) 與使用者 (auth.User) 的讀取查詢送往副本，其他讀取與所有寫入都留在主庫。
+
+副本有複製延遲，使用者剛寫入的資料可能還讀不到。因此 (見 board/middleware.py 的 PrimaryStickinessMiddleware)：
+- POST 等會寫入的請求本身的所有讀取都使用主庫
+- 寫入成功後在瀏覽器留下一個短效 cookie，REPLICA_STICKY_SECONDS 秒內該使用者的讀取仍然使用主庫
+
+以留言板版本號快取或驗證的回應 (留言列表片段快取、ETag) 不能從副本讀取：寫入遞增版本號後，
+落後的副本會讓舊資料被保存在新版本之下，直到下一次遞增之前都不會更新。
+這些讀取以 primary_reads() 或 .using(DEFAULT_DB_ALIAS) 固定使用主庫。
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+REPLICA_ALIAS = 'replica'
+# 寫入之後讀取固定使用主庫的秒數，應大於副本平常的複製延遲
+REPLICA_STICKY_SECONDS = getattr(settings, 'REPLICA_STICKY_SECONDS', 5)
+# 送往副本讀取的模型 (app_label, model_name)
+REPLICATED_MODELS = {('board', 'message'), ('board', 'archivedmessage'), ('auth', 'user')}
+
+# 目前的請求是否必須從主庫讀取；在非同步視圖中同樣有效 (sync_to_async 會複製 context)
+use_primary = ContextVar('board_use_primary', default=False)
+
+
+def replica_configured():
+    return REPLICA_ALIAS in settings.DATABASES
+
+
+@contextmanager
+def primary_reads():
+    """範圍內的讀取都使用主庫 (包括非同步 ORM：sync_to_async 會複製 context)"""
+    token = use_primary.set(True)
+    try:
+        yield
+    finally:
+        use_primary.reset(token)
+
+
+class PrimaryReplicaRouter:
+
+    def db_for_read(self, model, **hints):
+        if not replica_configured() or use_primary.get():
+            return None
+        instance = hints.get('instance')
+        if instance is not None and instance._state.db:
+            # 關聯查詢跟隨原本的實例，不在同一個頁面中混用兩個資料庫的資料
+            return instance._state.db
+        if (model._meta.app_label, model._meta.model_name) not in REPLICATED_MODELS:
+            return None
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            # 交易中的讀取必須看到同一個交易中的寫入
+            return None
+        return REPLICA_ALIAS
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # 副本的資料與主庫相同，兩邊的實例可以互相關聯
+        return {obj1._state.db, obj2._state.db} <= {DEFAULT_DB_ALIAS, REPLICA_ALIAS} or None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # 副本由資料庫複製同步，不直接執行遷移
+        return db != REPLICA_ALIAS
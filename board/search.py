@@ -0,0 +1,111 @@
+# board/search.py
+"""
+留言全文搜尋。
+
+- PostgreSQL：subject 與 content 各有一個 pg_trgm 三元組 GIN 索引 (建立在 UPPER(欄位) 上)，
+  icontains 的 UPPER(欄位) LIKE UPPER('%詞%') 直接使用索引，中文句子中間的詞也能找到；留言保存時由資料庫自動更新。
+- SQLite：board_message_fts 是 FTS5 虛擬表 (優先使用 trigram 分詞器，可搜尋中文子字串)，
+  由 board/signals.py 在留言保存/刪除時增量更新；bulk_create 等繞過信號的寫入後可執行
+  `python manage.py rebuild_search_index` 重建。
+- 其他資料庫、索引不存在，或 SQLite 太舊而索引以預設分詞器建立時 (無法做子字串比對)，退回 icontains 掃描。
+
+索引在 0005_message_search_index 與 0017_message_trigram_search 遷移中建立。
+"""
+from django.db import connection
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+
+from .models import Message
+
+FTS_TABLE = 'board_message_fts'
+# trigram 分詞器只能匹配至少 3 個字元的詞
+TRIGRAM_MIN_LENGTH = 3
+
+_fts_available = None
+
+
+def search_backend():
+    """返回目前使用的搜尋後端：'postgresql'、'sqlite' 或 'scan'"""
+    global _fts_available
+    if connection.vendor == 'postgresql':
+        return 'postgresql'
+    if connection.vendor == 'sqlite':
+        if _fts_available is None:
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT sql FROM sqlite_master WHERE name = %s', [FTS_TABLE])
+                row = cursor.fetchone()
+            # 下面的查詢以 trigram 子字串比對為前提，預設 (unicode61) 分詞器找不到中文句子中間的詞
+            _fts_available = bool(row) and 'trigram' in row[0].lower()
+        if _fts_available:
+            return 'sqlite'
+    return 'scan'
+
+
+def split_terms(query):
+    return [term for term in (query or '').split() if term]
+
+
+def _fts5_phrase(term):
+    return '"' + term.replace('"', '""') + '"'
+
+
+def filter_by_search(queryset, query):
+    """以索引過濾 queryset 中符合搜尋詞 (subject 或 content) 的留言，所有詞都必須出現"""
+    terms = split_terms(query)
+    if not terms:
+        return queryset.none()
+
+    # PostgreSQL：下面的 icontains 比對由三元組索引支援 (少於 3 個字元的詞無法縮小範圍，但仍然正確)
+    if search_backend() == 'sqlite':
+        long_terms = [t for t in terms if len(t) >= TRIGRAM_MIN_LENGTH]
+        if long_terms:
+            match = ' AND '.join(_fts5_phrase(t) for t in long_terms)
+            queryset = queryset.filter(pk__in=RawSQL(
+                f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s', [match],
+            ))
+        # 過短的詞無法使用 trigram 索引，只在已縮小的結果中比對
+        terms = [t for t in terms if len(t) < TRIGRAM_MIN_LENGTH]
+
+    for term in terms:
+        queryset = queryset.filter(Q(subject__icontains=term) | Q(content__icontains=term))
+    return queryset
+
+
+def search_messages(query):
+    """公開搜尋：只返回已審核的留言"""
+    return filter_by_search(Message.objects.filter(is_approved=True), query)
+
+
+def index_message(message):
+    """把留言寫入 SQLite FTS5 索引 (PostgreSQL 由生成欄位自動維護，不需要處理)"""
+    if search_backend() != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [message.pk])
+        cursor.execute(
+            f'INSERT INTO {FTS_TABLE} (rowid, subject, content) VALUES (%s, %s, %s)',
+            [message.pk, message.subject, message.content],
+        )
+
+
+def unindex_message(message_id):
+    unindex_messages([message_id])
+
+
+def unindex_messages(message_ids):
+    """從 SQLite FTS5 索引中移除多條留言 (繞過信號的批量刪除後呼叫)"""
+    if search_backend() != 'sqlite' or not message_ids:
+        return
+    placeholders = ', '.join(['%s'] * len(message_ids))
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid IN ({placeholders})', list(message_ids))
+
+
+def rebuild_index():
+    """重建 SQLite FTS5 索引，返回索引的留言數量"""
+    if search_backend() != 'sqlite':
+        return 0
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {FTS_TABLE}')
+        cursor.execute(f'INSERT INTO {FTS_TABLE} (rowid, subject, content) SELECT id, subject, content FROM board_message')
+        return cursor.rowcount
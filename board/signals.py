@@ -0,0 +1,129 @@
+# board/signals.py
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_init, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .caching import bump_board_version_on_commit
+from .models import Message
+from .search import index_message, unindex_messages
+from .stats import adjust_counters, day_key, status_deltas
+from .threads import refresh_reply_counts
+
+
+class _DeleteBatch:
+    """batched_deletes() 範圍內刪除的留言累計的變化"""
+
+    def __init__(self):
+        self.deltas = Counter()
+        self.thread_ids = set()
+        self.message_ids = set()
+        self.approved = False
+
+
+_delete_batch = ContextVar('board_delete_batch', default=None)
+
+
+@contextmanager
+def batched_deletes():
+    """
+    刪除討論串時 on_delete=CASCADE 會為子樹中的每一條回覆各發送一次 post_delete：
+    範圍內的刪除只累計計數器、回覆數、搜尋索引與快取版本號的變化，結束時在同一個交易中一次性更新
+    """
+    batch = _DeleteBatch()
+    with transaction.atomic():
+        token = _delete_batch.set(batch)
+        try:
+            yield
+        finally:
+            _delete_batch.reset(token)
+        adjust_counters(batch.deltas)
+        # 頂層留言一起被刪除的討論串不需要更新
+        refresh_reply_counts(batch.thread_ids - batch.message_ids)
+        unindex_messages(list(batch.message_ids))
+        if batch.approved:
+            bump_board_version_on_commit()
+
+
+# 已審核留言被保存（審核通過、後台修改）、取消審核（後台取消勾選、修改後待重審）或刪除時，使列表頁快取失效。
+# 載入時的審核狀態由 remember_approval_state 記錄 (update_counters_on_save 在此之後才更新它)。
+# 使用 queryset.update() 的批量操作不會觸發信號，需要在調用處自行 bump_board_version_on_commit()。
+# 版本號都在交易提交後才遞增 (見 board/caching.py)。
+@receiver(post_save, sender=Message)
+def message_saved(sender, instance, **kwargs):
+    if instance.is_approved or getattr(instance, '_loaded_is_approved', None):
+        bump_board_version_on_commit()
+
+
+@receiver(post_delete, sender=Message)
+def message_deleted(sender, instance, **kwargs):
+    batch = _delete_batch.get()
+    if batch is not None:
+        batch.approved |= instance.is_approved
+    elif instance.is_approved:
+        bump_board_version_on_commit()
+
+
+# 記錄載入時的審核狀態，保存時據此判斷計數器是否需要在已審核/待審核之間移動
+@receiver(post_init, sender=Message)
+def remember_approval_state(sender, instance, **kwargs):
+    # 延遲載入 (defer/only) 的欄位不在 __dict__ 中，避免因此觸發額外查詢
+    instance._loaded_is_approved = instance.__dict__.get('is_approved')
+
+
+@receiver(post_save, sender=Message)
+def update_counters_on_save(sender, instance, created, update_fields=None, **kwargs):
+    is_reply = instance.thread_id is not None
+    approval_changed = False
+    if created:
+        deltas = Counter(status_deltas(instance.is_approved, is_reply, 1))
+        deltas[day_key(timezone.localdate(instance.created_at))] += 1
+        adjust_counters(deltas)
+        approval_changed = instance.is_approved
+    elif update_fields is None or 'is_approved' in update_fields:
+        previous = instance._loaded_is_approved
+        if previous is not None and previous != instance.is_approved:
+            deltas = Counter(status_deltas(previous, is_reply, -1))
+            deltas.update(status_deltas(instance.is_approved, is_reply, 1))
+            adjust_counters(deltas)
+            approval_changed = True
+    instance._loaded_is_approved = instance.is_approved
+    # 討論串的回覆數只計算已審核的回覆
+    if is_reply and approval_changed:
+        refresh_reply_counts([instance.thread_id])
+
+
+@receiver(post_delete, sender=Message)
+def update_counters_on_delete(sender, instance, **kwargs):
+    is_reply = instance.thread_id is not None
+    deltas = Counter(status_deltas(instance.is_approved, is_reply, -1))
+    deltas[day_key(timezone.localdate(instance.created_at))] -= 1
+    batch = _delete_batch.get()
+    if batch is not None:
+        batch.deltas.update(deltas)
+        if is_reply and instance.is_approved:
+            batch.thread_ids.add(instance.thread_id)
+        return
+    adjust_counters(deltas)
+    if is_reply and instance.is_approved:
+        refresh_reply_counts([instance.thread_id]) # 整個討論串一起刪除時，頂層留言已不存在，UPDATE 不影響任何行
+
+
+# 增量更新全文搜尋索引 (僅 SQLite FTS5 需要；PostgreSQL 的 tsvector 為生成欄位)
+@receiver(post_save, sender=Message)
+def update_search_index(sender, instance, update_fields=None, **kwargs):
+    if update_fields is None or {'subject', 'content'} & set(update_fields):
+        index_message(instance)
+
+
+@receiver(post_delete, sender=Message)
+def remove_from_search_index(sender, instance, **kwargs):
+    batch = _delete_batch.get()
+    if batch is not None:
+        batch.message_ids.add(instance.pk)
+    else:
+        unindex_messages([instance.pk])
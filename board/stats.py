@@ -0,0 +1,98 @@
+# board/stats.py
+"""
+留言數量計數器。
+
+已審核、待審核與每日新增的留言數量 (已審核的回覆另有一個計數器，留言列表的總數只計算頂層留言)，
+以及累計合併的重複留言數量保存在 BoardCounter 表中，由 board/signals.py 在
+留言保存/刪除時維護；queryset.update() 的批量操作需要自行呼叫 adjust_counters()。
+讀取時若計數器不存在，才以 COUNT(*) 初始化一次。若懷疑計數漂移，可執行
+`python manage.py rebuild_board_stats` 重新計算。
+"""
+from datetime import datetime, time, timedelta
+
+from django.db import IntegrityError, transaction
+from django.db.models import F, Sum
+from django.utils import timezone
+
+from .models import BoardCounter, Message
+
+APPROVED = 'approved'
+PENDING = 'pending'
+# 發布時合併到既有留言的重複提交 (見 board/dedup.py)；重新計算時以現有留言的 duplicate_count 加總
+DUPLICATES = 'duplicates'
+# 已審核的回覆 (見 board/threads.py)，同時也計入 APPROVED
+APPROVED_REPLIES = 'approved_replies'
+
+
+def day_key(date):
+    """某一天 (當地時區) 新增留言數量的計數鍵"""
+    return f'created:{date.isoformat()}'
+
+
+def status_key(is_approved):
+    return APPROVED if is_approved else PENDING
+
+
+def status_deltas(is_approved, is_reply, delta):
+    """一條留言以某個審核狀態增加 (delta=1) 或移除 (delta=-1) 時，各計數器的變化"""
+    deltas = {status_key(is_approved): delta}
+    if is_approved and is_reply:
+        deltas[APPROVED_REPLIES] = delta
+    return deltas
+
+
+def _count_from_table(key):
+    if key == APPROVED:
+        return Message.objects.filter(is_approved=True).count()
+    if key == PENDING:
+        return Message.objects.filter(is_approved=False).count()
+    if key == APPROVED_REPLIES:
+        return Message.objects.filter(is_approved=True, thread__isnull=False).count()
+    if key == DUPLICATES:
+        return Message.objects.aggregate(total=Sum('duplicate_count'))['total'] or 0
+    if key.startswith('created:'):
+        date = datetime.strptime(key.split(':', 1)[1], '%Y-%m-%d').date()
+        start = timezone.make_aware(datetime.combine(date, time.min))
+        return Message.objects.filter(created_at__gte=start, created_at__lt=start + timedelta(days=1)).count()
+    raise ValueError(f'未知的計數鍵: {key}')
+
+
+def adjust_counters(deltas):
+    """
+    以 UPDATE ... SET value = value + delta 調整計數器。
+    尚未初始化的計數器會被略過，下次讀取時再以 COUNT(*) 取得正確的初始值。
+    """
+    for key, delta in deltas.items():
+        if delta:
+            BoardCounter.objects.filter(key=key).update(value=F('value') + delta)
+
+
+def get_counters(*keys):
+    """一次查詢讀取多個計數器，返回 {key: value}"""
+    values = dict(BoardCounter.objects.filter(key__in=keys).values_list('key', 'value'))
+    for key in keys:
+        if key not in values:
+            value = _count_from_table(key)
+            try:
+                with transaction.atomic():
+                    BoardCounter.objects.create(key=key, value=value)
+            except IntegrityError:
+                # 其他請求同時完成了初始化
+                value = BoardCounter.objects.get(key=key).value
+            values[key] = value
+    return values
+
+
+def get_counter(key):
+    return get_counters(key)[key]
+
+
+def today_key():
+    return day_key(timezone.localdate())
+
+
+def rebuild_counters():
+    """重新計算所有計數器，返回 {key: value}"""
+    with transaction.atomic():
+        BoardCounter.objects.all().delete()
+        return get_counters(APPROVED, PENDING, APPROVED_REPLIES, DUPLICATES, today_key())
@@ -1,13 +1,23 @@
-from django.test import TestCase, Client
+from django.test import TestCase, Client, RequestFactory, SimpleTestCase
 from django.urls import reverse
+from django.http import HttpResponse
 from django.contrib.auth.models import User
-from .models import Message
+from .models import Message, OutboundEmail
+from .outbox import send_pending
 from .forms import MessageForm, CustomUserCreationForm
 from django.core import mail # 用於測試郵件發送
 from django.conf import settings
 from unittest import mock # Import mock
 
 from django.test import override_settings # Ensure override_settings is imported
+from django.core.cache import cache
+from django.core.management import call_command
+from django.utils import timezone
+from io import StringIO
+import re
+from datetime import timedelta
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 
 # 移除全局 settings.CAPTCHA_TEST_MODE = True
 
@@ -119,6 +129,8 @@ class MessageBoardTests(TestCase):
         self.assertEqual(len(messages_on_final_page), 1)
         self.assertEqual(str(messages_on_final_page[0]), '您的留言已成功提交，管理員將盡快審核。')
 
+        send_pending() # 通知郵件寫入佇列後由背景 worker 發送，這裡先清空佇列
+
         # 測試是否有管理員通知郵件被發送
         if settings.ADMINS:
             self.assertEqual(len(mail.outbox), 1)
@@ -313,6 +325,7 @@ class MessageBoardTests(TestCase):
         self.assertFalse(message_to_edit.notified)   # Notification status should be reset
         messages = list(response.context.get('messages', []))
         self.assertTrue(any("留言已成功修改，將等待管理員重新審核。" in str(m) for m in messages))
+        send_pending() # 通知郵件寫入佇列後由背景 worker 發送，這裡先清空佇列
         self.assertEqual(len(mail.outbox), 1) # mail_admins for re-approval
         self.assertIn("【留言已修改待重審】", mail.outbox[0].subject)
 
@@ -369,6 +382,7 @@ class MessageBoardTests(TestCase):
         response = self.client.post(message_admin_changelist_url, action_data, follow=True)
         self.assertEqual(response.status_code, 200) # Action 後重定向到 changelist
 
+        send_pending() # 通知郵件寫入佇列後由背景 worker 發送，這裡先清空佇列
         self.pending_message.refresh_from_db()
         self.assertTrue(self.pending_message.is_approved)
 
@@ -434,6 +448,8 @@ class MessageBoardTests(TestCase):
         self.assertEqual(response_post.status_code, 200) # 重定向回 changelist
         self.assertFalse(Message.objects.filter(is_approved=False).exists()) # 所有留言應已審核
 
+        send_pending() # 通知郵件寫入佇列後由背景 worker 發送，這裡先清空佇列
+
         # 檢查郵件是否已發送給有 email 的用戶
         # self.pending_message 的作者有 email, self.pending_message_no_email_user 的作者沒有
         num_emails_expected = 1 if self.user_with_email.email else 0
@@ -470,6 +486,7 @@ class MessageBoardTests(TestCase):
         response = self.client.post(message_change_url, data=post_data, follow=True)
         self.assertEqual(response.status_code, 200) # 保存後重定向到 changelist
 
+        send_pending() # 通知郵件寫入佇列後由背景 worker 發送，這裡先清空佇列
         self.pending_message.refresh_from_db()
         self.assertTrue(self.pending_message.is_approved)
 
@@ -486,6 +503,2078 @@ class MessageBoardTests(TestCase):
         # CaptchaStore.objects.all().delete() # CAPTCHA_TEST_MODE = True 時通常不需要
         pass
 
+class KeysetPaginationTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('pager', 'pager@example.com', 'password123')
+        Message.objects.bulk_create([
+            Message(author=cls.user, subject=f'Page Msg {i:02d}', content='x', is_approved=True)
+            for i in range(25)
+        ])
+
+    def setUp(self):
+        cache.clear()
+
+    def test_cursor_roundtrip(self):
+        from .pagination import encode_cursor, decode_cursor
+        message = Message.objects.first()
+        self.assertEqual(decode_cursor(encode_cursor(message.created_at, message.pk)), (message.created_at, message.pk))
+        self.assertIsNone(decode_cursor('not-a-cursor!'))
+
+    def test_walk_forward_and_back(self):
+        expected = list(Message.objects.filter(is_approved=True).order_by('-created_at', '-id'))
+        seen = []
+        url = reverse('message_list')
+        response = self.client.get(url)
+        self.assertTrue(response.context['cursor_mode'])
+        pages = []
+        while True:
+            page = response.context['page_obj']
+            pages.append(page)
+            seen.extend(page.object_list)
+            if not page.has_next():
+                break
+            response = self.client.get(url, {'after': page.next_cursor})
+        self.assertEqual(seen, expected)
+        self.assertEqual(len(pages), 3)
+
+        # 從最後一頁往回翻，應該得到第二頁的內容
+        response = self.client.get(url, {'before': pages[-1].previous_cursor})
+        self.assertEqual(list(response.context['page_obj']), list(pages[1]))
+
+    def test_numbered_page_links_still_work(self):
+        response = self.client.get(reverse('message_list'), {'page': 2})
+        self.assertFalse(response.context['cursor_mode'])
+        self.assertEqual(response.context['page_obj'].number, 2)
+
+    def test_deep_numbered_page_redirects_to_same_page_in_cursor_mode(self):
+        from .pagination import encode_cursor
+        from .views import MESSAGES_PER_PAGE
+        expected = list(Message.objects.filter(is_approved=True).order_by('-created_at', '-id'))
+        with mock.patch('board.views.MAX_NUMBERED_PAGE', 1):
+            response = self.client.get(reverse('message_list'), {'page': 2})
+            last_of_first_page = expected[MESSAGES_PER_PAGE - 1]
+            cursor_url = f"{reverse('message_list')}?after={encode_cursor(last_of_first_page.created_at, last_of_first_page.pk)}"
+            self.assertRedirects(response, cursor_url, fetch_redirect_response=False)
+            response = self.client.get(response.url)
+            self.assertEqual(list(response.context['page_obj']), expected[MESSAGES_PER_PAGE:2 * MESSAGES_PER_PAGE])
+
+            # 超出範圍時是最後一頁；很大的頁碼不能使 OFFSET 溢出
+            last_of_second_page = expected[2 * MESSAGES_PER_PAGE - 1]
+            last_page_url = f"{reverse('message_list')}?after={encode_cursor(last_of_second_page.created_at, last_of_second_page.pk)}"
+            for page in (100000, '99999999999999999999999'):
+                response = self.client.get(reverse('message_list'), {'page': page})
+                self.assertRedirects(response, last_page_url, fetch_redirect_response=False)
+
+
+class MessageListCacheTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.superuser = User.objects.create_superuser('cacheadmin', 'cacheadmin@example.com', 'password123')
+        cls.user = User.objects.create_user('cacheuser', 'cacheuser@example.com', 'password123')
+
+    def setUp(self):
+        cache.clear()
+        self.message = Message.objects.create(author=self.user, subject='Cached Subject', content='c', is_approved=True)
+
+    def test_cache_hit_skips_message_queries(self):
+        self.client.get(reverse('message_list'))
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse('message_list'))
+        self.assertContains(response, 'Cached Subject')
+
+    def test_admin_approval_invalidates_cached_page(self):
+        pending = Message.objects.create(author=self.user, subject='Newly Approved', content='p')
+        self.assertNotContains(self.client.get(reverse('message_list')), 'Newly Approved')
+
+        self.client.login(username='cacheadmin', password='password123')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('admin:board_message_changelist'), {
+                'action': 'mark_approved_and_notify',
+                '_selected_action': [str(pending.id)],
+            })
+        self.client.logout()
+        self.assertContains(self.client.get(reverse('message_list')), 'Newly Approved')
+
+    def test_mark_unapproved_invalidates_cached_page(self):
+        self.assertContains(self.client.get(reverse('message_list')), 'Cached Subject')
+        self.client.login(username='cacheadmin', password='password123')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('admin:board_message_changelist'), {
+                'action': 'mark_unapproved',
+                '_selected_action': [str(self.message.id)],
+            })
+        self.client.logout()
+        self.assertNotContains(self.client.get(reverse('message_list')), 'Cached Subject')
+
+    def test_admin_change_form_unapproval_invalidates_cached_page(self):
+        anonymous = Client()
+        self.assertContains(anonymous.get(reverse('message_list')), 'Cached Subject')
+        etag = anonymous.get(reverse('message_list'))['ETag']
+        self.client.login(username='cacheadmin', password='password123')
+        # 取消勾選「是否通過審核」後保存 (未勾選的核取方塊不會出現在表單資料中)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('admin:board_message_change', args=[self.message.id]), {'_save': 'Save'})
+        self.message.refresh_from_db()
+        self.assertFalse(self.message.is_approved)
+        response = anonymous.get(reverse('message_list'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotContains(response, 'Cached Subject')
+
+    def test_edit_invalidates_cached_page(self):
+        self.client.login(username='cacheuser', password='password123')
+        self.assertContains(self.client.get(reverse('message_list')), 'Cached Subject')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('edit_message', args=[self.message.id]), {'subject': 'Edited', 'content': 'e'})
+        self.assertNotContains(self.client.get(reverse('message_list')), 'Cached Subject')
+
+    def test_version_is_bumped_only_after_commit(self):
+        # 提交前遞增的話，並發的請求讀到舊資料卻以新版本號快取，之後一直返回 304
+        from .caching import get_board_version
+        version = get_board_version()
+        etag = self.client.get(reverse('message_list'))['ETag']
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            self.message.subject = 'Committed'
+            self.message.save()
+            self.assertEqual(get_board_version(), version)
+            # 交易提交前的讀取：仍以舊的版本號快取 (提交後即失效)
+            self.assertEqual(self.client.get(reverse('message_list'), HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        self.assertEqual(len(callbacks), 1)
+        self.assertNotEqual(get_board_version(), version)
+        response = self.client.get(reverse('message_list'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Committed')
+
+    def test_logged_in_users_get_their_own_variant(self):
+        edit_url = reverse('edit_message', args=[self.message.id])
+        self.assertNotContains(self.client.get(reverse('message_list')), edit_url)
+        self.client.login(username='cacheuser', password='password123')
+        self.assertContains(self.client.get(reverse('message_list')), edit_url)
+
+
+class OutboxTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('outboxuser', 'outbox@example.com', 'password123')
+
+    def setUp(self):
+        mail.outbox = []
+
+    @override_settings(ADMINS=[('Admin', 'admin@example.com')])
+    def test_edit_message_enqueues_instead_of_sending(self):
+        message = Message.objects.create(author=self.user, subject='Queued', content='q')
+        self.client.login(username='outboxuser', password='password123')
+        self.client.post(reverse('edit_message', args=[message.id]), {'subject': 'Queued', 'content': 'edited'})
+        self.assertEqual(len(mail.outbox), 0)
+        queued = OutboundEmail.objects.get()
+        self.assertEqual(queued.status, OutboundEmail.STATUS_PENDING)
+        self.assertEqual(queued.recipients, ['admin@example.com'])
+
+        call_command('send_outbox', '--once', stdout=StringIO())
+        self.assertEqual(len(mail.outbox), 1)
+        queued.refresh_from_db()
+        self.assertEqual(queued.status, OutboundEmail.STATUS_SENT)
+
+    def test_failed_send_is_retried_with_backoff(self):
+        message = Message.objects.create(author=self.user, subject='Retry', content='r', is_approved=True)
+        from .outbox import enqueue_approval_notification
+        queued = enqueue_approval_notification(message)
+        with mock.patch('django.core.mail.EmailMessage.send', side_effect=OSError('smtp down')):
+            self.assertEqual(send_pending(), (0, 1))
+        queued.refresh_from_db()
+        message.refresh_from_db()
+        self.assertEqual(queued.status, OutboundEmail.STATUS_PENDING)
+        self.assertEqual(queued.attempts, 1)
+        self.assertIn('smtp down', queued.last_error)
+        self.assertGreater(queued.next_attempt_at, timezone.now())
+        self.assertFalse(message.notified)
+
+        # 退避期間內不會重試
+        self.assertEqual(send_pending(), (0, 0))
+        OutboundEmail.objects.update(next_attempt_at=timezone.now())
+        self.assertEqual(send_pending(), (1, 0))
+        message.refresh_from_db()
+        self.assertTrue(message.notified)
+
+    def test_gives_up_after_max_attempts(self):
+        queued = OutboundEmail.objects.create(subject='s', body='b', from_email='f@example.com', recipients=['x@example.com'])
+        with mock.patch('django.core.mail.EmailMessage.send', side_effect=OSError('smtp down')):
+            send_pending(max_attempts=1)
+        queued.refresh_from_db()
+        self.assertEqual(queued.status, OutboundEmail.STATUS_FAILED)
+
+
+class BulkApprovalTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.authors = [User.objects.create_user(f'bulk{i}', f'bulk{i}@example.com', 'password123') for i in range(5)]
+        cls.no_email = User.objects.create_user('bulknoemail', '', 'password123')
+
+    def setUp(self):
+        mail.outbox = []
+        Message.objects.bulk_create(
+            [Message(author=self.authors[i % 5], subject=f'Bulk {i}', content='b') for i in range(40)]
+            + [Message(author=self.no_email, subject='Bulk no email', content='b')]
+        )
+
+    def test_query_count_does_not_grow_with_message_count(self):
+        from .approval import approve_messages
+        # SELECT FOR UPDATE + JOIN 作者、UPDATE、INSERT 通知、兩條計數器 UPDATE，
+        # 外加每批的 SAVEPOINT/RELEASE 與最後一次空批次 (SAVEPOINT、SELECT、RELEASE)
+        with self.assertNumQueries(10):
+            result = approve_messages(Message.objects.all())
+        self.assertEqual(result.approved_count, 41)
+        self.assertEqual(result.queued_notifications, 40)
+        self.assertEqual(result.authors_without_email, ['bulknoemail'])
+        self.assertFalse(Message.objects.filter(is_approved=False).exists())
+
+    def test_rows_approved_concurrently_are_not_notified_twice(self):
+        from .approval import _approve, approve_messages
+        taken = list(Message.objects.filter(author=self.authors[0]).values_list('pk', flat=True))
+        calls = []
+
+        def approve_after_other_admin(pks, now):
+            if not calls:
+                # 另一位管理員在這一批讀取之後、更新之前通過了其中幾條 (SQLite 沒有 SELECT ... FOR UPDATE)
+                Message.objects.filter(pk__in=taken).update(is_approved=True, approved_at=timezone.now())
+            calls.append(pks)
+            return _approve(pks, now)
+
+        with mock.patch('board.approval._approve', side_effect=approve_after_other_admin):
+            result = approve_messages(Message.objects.all())
+        self.assertEqual(result.approved_count, 41 - len(taken))
+        self.assertEqual(result.queued_notifications, 40 - len(taken))
+        self.assertEqual(OutboundEmail.objects.count(), 40 - len(taken))
+        self.assertNotIn(['bulk0@example.com'], list(OutboundEmail.objects.values_list('recipients', flat=True)))
+
+    def test_notified_only_for_delivered_mail(self):
+        from .approval import approve_messages
+        approve_messages(Message.objects.all())
+        self.assertFalse(Message.objects.filter(notified=True).exists())
+
+        delivered = []
+        def flaky_send(email_message, fail_silently=False):
+            if email_message.to == ['bulk0@example.com']:
+                raise OSError('mailbox unavailable')
+            delivered.append(email_message)
+            return 1
+        with mock.patch('django.core.mail.EmailMessage.send', autospec=True, side_effect=flaky_send):
+            sent, failed = send_pending()
+        self.assertEqual((sent, failed), (32, 8))
+        self.assertEqual(Message.objects.filter(notified=True).count(), 32)
+        self.assertFalse(Message.objects.filter(author=self.authors[0], notified=True).exists())
+
+
+class BoardCounterTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.superuser = User.objects.create_superuser('statsadmin', 'statsadmin@example.com', 'password123')
+        cls.user = User.objects.create_user('statsuser', 'statsuser@example.com', 'password123')
+
+    def setUp(self):
+        cache.clear()
+
+    def assertCountersMatchTable(self):
+        from .stats import APPROVED, PENDING, get_counters, today_key
+        counters = get_counters(APPROVED, PENDING, today_key())
+        self.assertEqual(counters[APPROVED], Message.objects.filter(is_approved=True).count())
+        self.assertEqual(counters[PENDING], Message.objects.filter(is_approved=False).count())
+        self.assertEqual(counters[today_key()], Message.objects.count())
+
+    def test_counters_follow_every_write_path(self):
+        from .approval import approve_messages
+        self.assertCountersMatchTable() # 初始化計數器
+        first = Message.objects.create(author=self.user, subject='one', content='1')
+        second = Message.objects.create(author=self.user, subject='two', content='2', is_approved=True)
+        self.assertCountersMatchTable()
+
+        approve_messages(Message.objects.filter(pk=first.pk))
+        self.assertCountersMatchTable()
+
+        self.client.login(username='statsuser', password='password123')
+        self.client.post(reverse('edit_message', args=[second.id]), {'subject': 'two', 'content': 'edited'})
+        self.assertCountersMatchTable()
+
+        self.client.login(username='statsadmin', password='password123')
+        self.client.post(reverse('admin:board_message_changelist'), {
+            'action': 'mark_unapproved',
+            '_selected_action': [str(first.id), str(second.id)],
+        })
+        self.assertCountersMatchTable()
+
+        self.client.post(reverse('delete_message', args=[first.id]))
+        self.assertCountersMatchTable()
+
+    def test_numbered_page_uses_counter_instead_of_count_query(self):
+        Message.objects.bulk_create([Message(author=self.user, subject=f's{i}', content='c', is_approved=True) for i in range(15)])
+        call_command('rebuild_board_stats', stdout=StringIO())
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse('message_list'), {'page': 2})
+        self.assertEqual(response.context['page_obj'].paginator.num_pages, 2)
+        self.assertFalse(any('COUNT(' in q['sql'] for q in ctx.captured_queries))
+
+
+# 每個具名路由 (my_messageboard/urls.py) 的查詢預算。
+# 新增路由時必須在這裡宣告預算，否則 test_every_named_route_has_a_budget 會失敗；
+# 視圖出現 N+1 查詢時，對應的預算測試會失敗，而不是等到上線後才發現。
+ROUTE_QUERY_BUDGETS = {
+    'message_list': 4,            # session + user + 頂層留言 (含作者 JOIN) + 回覆預覽 (只在頁面上有回覆時)
+    'search': 1,                  # 全文索引查詢 (含作者 JOIN)
+    'message_archive': 1,         # 封存表的游標分頁 (含作者 JOIN)
+    'api_messages': 1,            # 只取需要的欄位，作者名稱 JOIN
+    'api_messages_export': 1,
+    'author_messages': 2,         # 使用者 + 列表 (含作者 JOIN)
+    'my_messages': 3,             # session + user + 列表
+    'message_thread': 4,          # session + user + 頂層留言 + 整個討論串的回覆
+    'reply_message': 6,           # session + user + 回覆的留言 + 從驗證碼池取用 (SELECT + 標記發出 + 作答期限)
+    'react_message': 4,           # session + user + 留言是否存在 + 插入 Reaction (計數由緩衝區批量更新)
+    'api_messages_live': 1,       # 同步部署時：讀取位置之後通過的留言
+    'post_message': 5,            # session + user + 從驗證碼池取用 (SELECT + 標記發出 + 作答期限)
+    'edit_message': 3,            # session + user + 留言
+    'delete_message': 3,          # session + user + 留言 (含作者 JOIN)
+    'signup': 0,
+    'login': 0,
+    'logout': 4,                  # session + user + 刪除 session
+    'password_reset': 0,
+    'password_reset_done': 0,
+    'password_reset_confirm': 1,
+    'password_reset_complete': 0,
+    'admin:board_message_changelist': 4,          # session + user + 計數器 (代替 COUNT) + 列表
+}
+
+
+class QueryBudgetTestMixin:
+    """以 ROUTE_QUERY_BUDGETS 檢查請求的查詢次數"""
+
+    def assertWithinQueryBudget(self, route_name, make_request):
+        budget = ROUTE_QUERY_BUDGETS[route_name]
+        with CaptureQueriesContext(connection) as ctx:
+            response = make_request()
+        queries = '\n'.join(q['sql'] for q in ctx.captured_queries)
+        self.assertLessEqual(
+            len(ctx), budget,
+            msg=f'{route_name} 執行了 {len(ctx)} 條查詢，超過預算 {budget}:\n{queries}',
+        )
+        return response
+
+
+class QueryBudgetTests(QueryBudgetTestMixin, TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.superuser = User.objects.create_superuser('budgetadmin', 'budgetadmin@example.com', 'password123')
+        cls.user = User.objects.create_user('budgetuser', 'budgetuser@example.com', 'password123')
+        # 每條留言不同作者：若模板逐行載入作者，查詢次數會隨留言數增加
+        authors = [User.objects.create_user(f'budgetauthor{i}', f'a{i}@example.com', 'password123') for i in range(12)]
+        Message.objects.bulk_create(
+            [Message(author=author, subject=f'Budget {i}', content='b', is_approved=True) for i, author in enumerate(authors)]
+            + [Message(author=author, subject=f'Budget pending {i}', content='b') for i, author in enumerate(authors)]
+        )
+        cls.own_message = Message.objects.create(author=cls.user, subject='Own', content='o')
+        # 討論串：回覆的作者也各不相同
+        cls.thread = Message.objects.get(subject='Budget 11')
+        parent = cls.thread
+        for author in authors[:6]:
+            parent = Message.objects.create(author=author, parent=parent, subject='Re', content=f'r{author.pk}', is_approved=True)
+
+    def setUp(self):
+        cache.clear()
+        from .stats import APPROVED, APPROVED_REPLIES, DUPLICATES, PENDING, get_counters, today_key
+        get_counters(APPROVED, PENDING, APPROVED_REPLIES, DUPLICATES, today_key())
+
+    def test_every_named_route_has_a_budget(self):
+        from django.urls import URLPattern, get_resolver
+        names = {p.name for p in get_resolver().url_patterns if isinstance(p, URLPattern) and p.name}
+        self.assertEqual(names - set(ROUTE_QUERY_BUDGETS), set())
+
+    def test_anonymous_routes(self):
+        self.assertWithinQueryBudget(
+            'author_messages', lambda: self.client.get(reverse('author_messages', args=['budgetauthor1'])))
+        for name in ('message_list', 'message_archive', 'signup', 'login', 'password_reset', 'password_reset_done',
+                     'password_reset_complete'):
+            with self.subTest(route=name):
+                response = self.assertWithinQueryBudget(name, lambda: self.client.get(reverse(name)))
+                self.assertEqual(response.status_code, 200)
+        self.assertWithinQueryBudget('search', lambda: self.client.get(reverse('search'), {'q': 'Budget'}))
+        response = self.assertWithinQueryBudget(
+            'message_thread', lambda: self.client.get(reverse('message_thread', args=[self.thread.pk])))
+        self.assertContains(response, 'class="list-group-item reply"', count=6)
+        self.assertWithinQueryBudget('api_messages', lambda: self.client.get(reverse('api_messages')))
+        self.assertWithinQueryBudget(
+            'api_messages_export', lambda: b''.join(self.client.get(reverse('api_messages_export')).streaming_content))
+        self.assertWithinQueryBudget(
+            'password_reset_confirm',
+            lambda: self.client.get(reverse('password_reset_confirm', args=['MQ', 'invalid-token'])),
+        )
+
+    def test_logged_in_routes(self):
+        self.client.login(username='budgetuser', password='password123')
+        self.assertWithinQueryBudget('message_list', lambda: self.client.get(reverse('message_list')))
+        from .captcha_pool import generate_captchas
+        generate_captchas(2)
+        with override_settings(CAPTCHA_TEST_MODE=True):
+            self.assertWithinQueryBudget('post_message', lambda: self.client.get(reverse('post_message')))
+            self.assertWithinQueryBudget(
+                'reply_message', lambda: self.client.get(reverse('reply_message', args=[self.thread.pk])))
+        for name in ('edit_message', 'delete_message'):
+            with self.subTest(route=name):
+                response = self.assertWithinQueryBudget(
+                    name, lambda: self.client.get(reverse(name, args=[self.own_message.id])))
+                self.assertEqual(response.status_code, 200)
+        self.assertWithinQueryBudget('my_messages', lambda: self.client.get(reverse('my_messages')))
+        from .reactions import buffer
+        self.addCleanup(buffer.drain)
+        with mock.patch.object(buffer, 'interval', 3600):
+            response = self.assertWithinQueryBudget(
+                'react_message', lambda: self.client.post(reverse('react_message', args=[self.thread.pk]), {'kind': 'like'}))
+        self.assertEqual(response.status_code, 302)
+        self.assertWithinQueryBudget('logout', lambda: self.client.post(reverse('logout')))
+
+    def test_admin_changelist(self):
+        self.client.login(username='budgetadmin', password='password123')
+        response = self.assertWithinQueryBudget(
+            'admin:board_message_changelist', lambda: self.client.get(reverse('admin:board_message_changelist')))
+        self.assertEqual(response.status_code, 200)
+        response = self.assertWithinQueryBudget(
+            'admin:board_message_changelist',
+            lambda: self.client.get(reverse('admin:board_message_changelist'), {'is_approved__exact': 0}))
+        self.assertEqual(response.status_code, 200)
+
+    @override_settings(QUERY_INSTRUMENTATION=True, QUERY_INSTRUMENTATION_SERVER_TIMING=True)
+    def test_server_timing_header(self):
+        from django.test import Client
+        response = Client().get(reverse('message_list')) # 新的 Client 以套用設定後載入的中介層
+        self.assertRegex(response['Server-Timing'], r'db;dur=[\d.]+;desc="2 queries"') # 留言 + 回覆預覽
+
+    @override_settings(QUERY_INSTRUMENTATION=True, QUERY_INSTRUMENTATION_SERVER_TIMING=True, ROOT_URLCONF='board.tests')
+    async def test_server_timing_header_for_async_views(self):
+        from asgiref.sync import iscoroutinefunction
+        from django.test import AsyncClient
+        from .middleware import QueryInstrumentationMiddleware
+
+        async def get_response(request):
+            return HttpResponse()
+        self.assertTrue(iscoroutinefunction(QueryInstrumentationMiddleware(get_response))) # 不經過執行緒切換
+        response = await AsyncClient().get(reverse('message_list')) # amessage_list，以非同步 ORM 查詢
+        self.assertRegex(response['Server-Timing'], r'db;dur=[\d.]+;desc="2 queries"')
+
+
+class SearchTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.superuser = User.objects.create_superuser('searchadmin', 'searchadmin@example.com', 'password123')
+        cls.user = User.objects.create_user('searchuser', 'searchuser@example.com', 'password123')
+
+    def setUp(self):
+        self.tea = Message.objects.create(author=self.user, subject='午後紅茶', content='今天在留言板分享紅茶的沖泡方法', is_approved=True)
+        self.coffee = Message.objects.create(author=self.user, subject='Coffee notes', content='Pour over brewing guide', is_approved=True)
+        self.pending = Message.objects.create(author=self.user, subject='Secret coffee', content='pending brewing notes')
+
+    def search(self, query):
+        from .search import search_messages
+        return set(search_messages(query))
+
+    def test_search_uses_index_and_only_returns_approved(self):
+        from .search import search_backend
+        self.assertEqual(search_backend(), 'sqlite')
+        self.assertEqual(self.search('brewing'), {self.coffee})
+        self.assertEqual(self.search('紅茶的沖泡'), {self.tea})
+        self.assertEqual(self.search('coffee guide'), {self.coffee})
+        self.assertEqual(self.search('紅茶'), {self.tea}) # 過短的詞退回比對
+        self.assertEqual(self.search('   '), set())
+
+    def test_mid_sentence_chinese_terms_on_every_backend(self):
+        # 中文不以空白分詞：句子中間的詞在每一種後端都必須找得到
+        for backend in ('sqlite', 'postgresql', 'scan'):
+            with self.subTest(backend=backend), mock.patch('board.search.search_backend', return_value=backend):
+                self.assertEqual(self.search('留言板分享'), {self.tea})
+                self.assertEqual(self.search('沖泡 方法'), {self.tea})
+                self.assertEqual(self.search('後紅'), {self.tea})
+                self.assertEqual(self.search('奶茶'), set())
+
+    def test_index_without_trigram_tokenizer_falls_back_to_scan(self):
+        from django.db import connection
+        from . import search
+        # 模擬 SQLite 3.34 之前的遷移結果：FTS5 表使用預設分詞器
+        with connection.cursor() as cursor:
+            cursor.execute(f'DROP TABLE {search.FTS_TABLE}')
+            cursor.execute(f'CREATE VIRTUAL TABLE {search.FTS_TABLE} USING fts5(subject, content)')
+        search._fts_available = None
+        self.addCleanup(setattr, search, '_fts_available', None)
+        self.assertEqual(search.search_backend(), 'scan')
+        self.assertEqual(self.search('留言板分享'), {self.tea})
+        self.assertEqual(self.search('brew'), {self.coffee})
+
+    def test_index_follows_edits_and_deletes(self):
+        self.coffee.content = 'Espresso tasting'
+        self.coffee.save()
+        self.assertEqual(self.search('brewing'), set())
+        self.assertEqual(self.search('espresso'), {self.coffee})
+        self.coffee.delete()
+        self.assertEqual(self.search('espresso'), set())
+
+    def test_search_view(self):
+        response = self.client.get(reverse('search'), {'q': 'brewing'})
+        self.assertContains(response, 'Coffee notes')
+        self.assertNotContains(response, 'Secret coffee')
+        self.assertContains(self.client.get(reverse('search'), {'q': 'nothing-like-this'}), '沒有找到符合')
+
+    def test_admin_search_uses_index(self):
+        self.client.login(username='searchadmin', password='password123')
+        response = self.client.get(reverse('admin:board_message_changelist'), {'q': 'brewing'})
+        self.assertEqual(set(response.context['cl'].result_list), {self.coffee, self.pending})
+        response = self.client.get(reverse('admin:board_message_changelist'), {'q': 'searchuser'})
+        self.assertEqual(response.context['cl'].result_count, 3)
+
+
+class MessageApiTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('apiuser', 'apiuser@example.com', 'password123')
+        Message.objects.bulk_create([
+            Message(author=cls.user, subject=f'API {i}', content=f'內容 {i}', is_approved=True) for i in range(5)
+        ] + [Message(author=cls.user, subject='API pending', content='p')])
+
+    def test_paginates_with_cursors(self):
+        import json
+        response = self.client.get(reverse('api_messages'), {'limit': 2})
+        self.assertEqual(response['Content-Type'], 'application/json; charset=utf-8')
+        data = json.loads(response.content)
+        self.assertEqual(len(data['results']), 2)
+        self.assertEqual(set(data['results'][0]), {'id', 'parent_id', 'subject', 'content', 'created_at', 'author_name'})
+        self.assertEqual(data['results'][0]['author_name'], 'apiuser')
+        self.assertIsNone(data['previous'])
+
+        seen = [row['id'] for row in data['results']]
+        while data['next']:
+            data = json.loads(self.client.get(data['next']).content)
+            seen.extend(row['id'] for row in data['results'])
+        expected = list(Message.objects.filter(is_approved=True).order_by('-created_at', '-id').values_list('id', flat=True))
+        self.assertEqual(seen, expected)
+
+    def test_export_streams_json_lines(self):
+        import json
+        response = self.client.get(reverse('api_messages_export'))
+        self.assertTrue(response.streaming)
+        lines = b''.join(response.streaming_content).decode('utf-8').splitlines()
+        self.assertEqual(len(lines), 5)
+        self.assertNotIn('API pending', [json.loads(line)['subject'] for line in lines])
+
+    def test_rejects_writes(self):
+        self.assertEqual(self.client.post(reverse('api_messages')).status_code, 405)
+
+
+class ConditionalGetTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('etaguser', 'etaguser@example.com', 'password123')
+
+    def setUp(self):
+        cache.clear()
+        with self.captureOnCommitCallbacks(execute=True): # 版本號在提交後才遞增
+            self.message = Message.objects.create(author=self.user, subject='ETag subject', content='e', is_approved=True)
+
+    def test_unchanged_board_returns_304_without_queries(self):
+        response = self.client.get(reverse('message_list'))
+        etag = response['ETag']
+        self.assertIn('s-maxage', response['Cache-Control'])
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse('message_list'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        # 不同的游標是不同的頁面
+        response = self.client.get(reverse('message_list'), {'after': 'abc'}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_if_modified_since(self):
+        response = self.client.get(reverse('message_list'))
+        last_modified = response['Last-Modified']
+        response = self.client.get(reverse('message_list'), HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, 304)
+
+    def test_approval_changes_validator(self):
+        etag = self.client.get(reverse('message_list'))['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            Message.objects.create(author=self.user, subject='Fresh', content='f', is_approved=True)
+        response = self.client.get(reverse('message_list'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Fresh')
+
+    def test_logged_in_and_anonymous_validators_differ(self):
+        anonymous_etag = self.client.get(reverse('message_list'))['ETag']
+        self.client.login(username='etaguser', password='password123')
+        response = self.client.get(reverse('message_list'), HTTP_IF_NONE_MATCH=anonymous_etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('private', response['Cache-Control'])
+
+    def test_api_conditional_get(self):
+        response = self.client.get(reverse('api_messages'))
+        response = self.client.get(reverse('api_messages'), HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+
+# 非同步視圖測試用的 URL 配置：與正式配置相同，只是唯讀頁面換成非同步版本 (等同 ASGI 模式)
+from django.urls import path as _path
+from my_messageboard import urls as _project_urls
+from . import api as _board_api, views as _board_views
+
+_ASYNC_ROUTES = {
+    'message_list': _path('', _board_views.amessage_list, name='message_list'),
+    'api_messages': _path('api/v1/messages/', _board_api.amessage_list, name='api_messages'),
+    'api_messages_export': _path('api/v1/messages/export/', _board_api.amessage_export, name='api_messages_export'),
+    'api_messages_live': _path('api/v1/messages/live/', _board_api.amessage_stream, name='api_messages_live'),
+}
+urlpatterns = [_ASYNC_ROUTES.get(getattr(p, 'name', None), p) for p in _project_urls.urlpatterns]
+
+
+@override_settings(ROOT_URLCONF='board.tests')
+class AsyncViewTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('asyncuser', 'asyncuser@example.com', 'password123')
+        Message.objects.bulk_create([
+            Message(author=cls.user, subject=f'Async {i}', content=f'內容 {i}', is_approved=True) for i in range(12)
+        ] + [Message(author=cls.user, subject='Async pending', content='p')])
+
+    def setUp(self):
+        cache.clear()
+
+    async def test_message_list_matches_sync_view(self):
+        response = await self.async_client.get(reverse('message_list'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context['page_obj']), 10)
+        self.assertNotContains(response, 'Async pending')
+        self.assertIn('public', response['Cache-Control'])
+        self.assertFalse(response.cookies)
+
+        # 游標翻到下一頁
+        next_cursor = response.context['page_obj'].next_cursor
+        response = await self.async_client.get(reverse('message_list'), {'after': next_cursor})
+        self.assertEqual(len(response.context['page_obj']), 2)
+
+        # 舊的數字分頁
+        response = await self.async_client.get(reverse('message_list'), {'page': 2})
+        self.assertEqual(response.context['page_obj'].number, 2)
+        self.assertEqual(len(response.context['page_obj']), 2)
+
+        # 過深的數字分頁重定向到游標分頁中的同一頁
+        with mock.patch('board.views.MAX_NUMBERED_PAGE', 1):
+            response = await self.async_client.get(reverse('message_list'), {'page': 2})
+            self.assertEqual(response.url, f"{reverse('message_list')}?after={next_cursor}")
+            response = await self.async_client.get(reverse('message_list'), {'page': '99999999999999999999999'})
+            self.assertEqual(response.url, f"{reverse('message_list')}?after={next_cursor}") # 最後一頁
+
+    async def test_message_list_for_logged_in_user(self):
+        await self.async_client.aforce_login(self.user)
+        response = await self.async_client.get(reverse('message_list'))
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, '發布新留言')
+        self.assertIn('private', response['Cache-Control'])
+
+    async def test_message_list_conditional_get(self):
+        response = await self.async_client.get(reverse('message_list'))
+        response = await self.async_client.get(reverse('message_list'), headers={'if-none-match': response['ETag']})
+        self.assertEqual(response.status_code, 304)
+
+    async def test_api_and_export(self):
+        import json
+        response = await self.async_client.get(reverse('api_messages'), {'limit': 5})
+        data = json.loads(response.content)
+        self.assertEqual(len(data['results']), 5)
+        self.assertEqual(data['results'][0]['author_name'], 'asyncuser')
+        self.assertIsNotNone(data['next'])
+
+        response = await self.async_client.get(reverse('api_messages_export'))
+        self.assertTrue(response.streaming)
+        content = b''.join([chunk async for chunk in response.streaming_content])
+        self.assertEqual(len(content.decode('utf-8').splitlines()), 12)
+
+
+class LiveFeedTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('liveuser', 'liveuser@example.com', 'password123')
+
+    def setUp(self):
+        cache.clear()
+        self.pending = Message.objects.create(author=self.user, subject='Live pending', content='l')
+
+    def test_approved_at_follows_approval_state(self):
+        self.assertIsNone(self.pending.approved_at)
+        self.pending.is_approved = True
+        self.pending.save(update_fields=['is_approved'])
+        self.pending.refresh_from_db()
+        self.assertIsNotNone(self.pending.approved_at)
+
+        self.pending.is_approved = False
+        self.pending.save()
+        self.pending.refresh_from_db()
+        self.assertIsNone(self.pending.approved_at)
+
+    def test_sync_stream_returns_approvals_after_last_event_id(self):
+        from .approval import approve_messages
+        response = self.client.get(reverse('api_messages_live'))
+        self.assertEqual(response['Content-Type'], 'text/event-stream; charset=utf-8')
+        content = response.content.decode('utf-8')
+        self.assertIn('event: ready', content)
+        last_event_id = content.split('id: ')[1].split('\n')[0]
+
+        approve_messages(Message.objects.filter(pk=self.pending.pk))
+        with self.assertNumQueries(ROUTE_QUERY_BUDGETS['api_messages_live']):
+            response = self.client.get(reverse('api_messages_live'), HTTP_LAST_EVENT_ID=last_event_id)
+        content = response.content.decode('utf-8')
+        self.assertIn('event: message', content)
+        self.assertIn('Live pending', content)
+        self.assertIn('"author_name":"liveuser"', content)
+
+    def test_late_commit_with_earlier_approved_at_is_still_delivered(self):
+        # 較早開始的審核交易較晚提交：它的 approved_at 早於已發送的留言
+        from .approval import approve_messages
+        from .live import LIVE_FEED_OVERLAP, FeedPosition
+        last_event_id = FeedPosition(timezone.now() - timedelta(seconds=LIVE_FEED_OVERLAP)).encode()
+
+        approve_messages(Message.objects.filter(pk=self.pending.pk))
+        late = Message.objects.create(author=self.user, subject='Late commit', content='l')
+        approved_at = Message.objects.get(pk=self.pending.pk).approved_at - timedelta(seconds=LIVE_FEED_OVERLAP // 2)
+        content = self.client.get(reverse('api_messages_live'), HTTP_LAST_EVENT_ID=last_event_id).content.decode('utf-8')
+        self.assertIn('Live pending', content)
+        last_event_id = content.rsplit('id: ', 1)[1].split('\n')[0]
+
+        Message.objects.filter(pk=late.pk).update(is_approved=True, approved_at=approved_at, pending_since=None)
+        content = self.client.get(reverse('api_messages_live'), HTTP_LAST_EVENT_ID=last_event_id).content.decode('utf-8')
+        self.assertIn('Late commit', content)
+        self.assertNotIn('Live pending', content) # 已發送的不重複
+        last_event_id = content.rsplit('id: ', 1)[1].split('\n')[0]
+
+        content = self.client.get(reverse('api_messages_live'), HTTP_LAST_EVENT_ID=last_event_id).content.decode('utf-8')
+        self.assertNotIn('event: message', content)
+
+    def test_position_round_trips_and_caps_seen_ids(self):
+        from .live import LIVE_FEED_MAX_SEEN, FeedPosition
+        now = timezone.now()
+        position = FeedPosition(now)
+        for pk in range(1, LIVE_FEED_MAX_SEEN + 6):
+            self.assertTrue(position.accept({'id': pk, 'approved_at': now + timedelta(milliseconds=pk)}))
+        self.assertFalse(position.accept({'id': 3, 'approved_at': now + timedelta(milliseconds=3)}))
+        self.assertEqual(len(position.seen), LIVE_FEED_MAX_SEEN)
+        decoded = FeedPosition.decode(position.encode())
+        self.assertEqual((decoded.since, decoded.seen), (position.since, position.seen))
+        self.assertIsNone(FeedPosition.decode('not-a-cursor'))
+
+    def test_out_of_range_event_id_starts_a_new_stream(self):
+        import base64
+        from .live import FeedPosition
+        now = timezone.now()
+        huge = 10 ** 23
+        tokens = [
+            base64.urlsafe_b64encode(f'1700000000000000.{huge}'.encode()).decode().rstrip('='), # 舊格式
+            f'{FeedPosition(now).encode()}.{huge}:0',
+            f'{FeedPosition(now).encode()}.-1:0',
+            base64.urlsafe_b64encode(f'{huge}.1'.encode()).decode().rstrip('='), # 時間超出範圍
+        ]
+        for token in tokens:
+            self.assertIsNone(FeedPosition.decode(token))
+            for response in (
+                self.client.get(reverse('api_messages_live'), {'last_event_id': token}),
+                self.client.get(reverse('api_messages_live'), HTTP_LAST_EVENT_ID=token),
+            ):
+                self.assertEqual(response.status_code, 200)
+                self.assertIn('event: ready', response.content.decode('utf-8'))
+
+    async def test_hub_pushes_new_approvals_to_every_subscriber(self):
+        import asyncio
+        from asgiref.sync import sync_to_async
+        from .approval import approve_messages
+        from .live import live_events, live_hub
+
+        with mock.patch.object(live_hub, 'poll_interval', 0.05):
+            streams = [live_events(), live_events()]
+            for stream in streams:
+                self.assertIn('event: ready', await anext(stream))
+            # 第一次 anext 之後才訂閱：先讓兩個串流都進入等待
+            waiting = [asyncio.ensure_future(anext(stream)) for stream in streams]
+            await asyncio.sleep(0.1)
+            self.assertEqual(len(live_hub.subscribers), 2)
+
+            def approve():
+                with self.captureOnCommitCallbacks(execute=True): # 提交後遞增版本號並喚醒輪詢
+                    approve_messages(Message.objects.filter(pk=self.pending.pk))
+
+            await sync_to_async(approve)()
+            events = await asyncio.wait_for(asyncio.gather(*waiting), 5)
+            for event in events:
+                self.assertIn('Live pending', event)
+            for stream in streams:
+                await stream.aclose()
+        self.assertEqual(live_hub.subscribers, set())
+
+    @override_settings(ROOT_URLCONF='board.tests')
+    async def test_async_endpoint_streams(self):
+        response = await self.async_client.get(reverse('api_messages_live'))
+        self.assertTrue(response.streaming)
+        self.assertIn('no-cache', response['Cache-Control'])
+        first = await anext(response.streaming_content)
+        self.assertIn(b'event: ready', first)
+
+
+class SessionlessAnonymousReadTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('cdnuser', 'cdnuser@example.com', 'password123')
+        Message.objects.create(author=cls.user, subject='CDN subject', content='c', is_approved=True)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_anonymous_list_is_publicly_cacheable(self):
+        # 唯一的查詢是留言列表本身，沒有 session 查詢
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('message_list'))
+        self.assertContains(response, 'CDN subject')
+        self.assertFalse(response.cookies)
+        self.assertFalse(response.wsgi_request.session.accessed)
+        self.assertIn('public', response['Cache-Control'])
+        self.assertIn('s-maxage=30', response['Cache-Control'])
+        self.assertNotIn('private', response['Cache-Control'])
+        self.assertIn('Cookie', response['Vary'])
+
+        response = self.client.get(reverse('message_list'), HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+        self.assertIn('s-maxage=30', response['Cache-Control'])
+
+    def test_requests_with_cookies_are_not_shared(self):
+        self.client.cookies[settings.SESSION_COOKIE_NAME] = 'expired-session'
+        response = self.client.get(reverse('message_list'))
+        self.assertIn('no-cache', response['Cache-Control'])
+        self.assertNotIn('public', response['Cache-Control'])
+        self.assertNotIn('private', response['Cache-Control'])
+
+        self.client.login(username='cdnuser', password='password123')
+        response = self.client.get(reverse('message_list'))
+        self.assertIn('private', response['Cache-Control'])
+        self.assertNotIn('s-maxage', response['Cache-Control'])
+
+    def test_flash_messages_still_shown(self):
+        self.client.login(username='cdnuser', password='password123')
+        message = Message.objects.create(author=self.user, subject='Doomed', content='d', is_approved=True)
+        response = self.client.post(reverse('delete_message', args=[message.pk]), follow=True)
+        self.assertContains(response, '留言 &quot;Doomed&quot; 已成功刪除。')
+        self.assertIn('private', response['Cache-Control'])
+
+    @override_settings(ROOT_URLCONF='board.tests')
+    async def test_async_view_skips_session(self):
+        with mock.patch('django.contrib.sessions.backends.db.SessionStore.aload') as aload:
+            response = await self.async_client.get(reverse('message_list'))
+        aload.assert_not_called()
+        self.assertContains(response, 'CDN subject')
+        self.assertIn('s-maxage', response['Cache-Control'])
+
+    def test_can_be_disabled(self):
+        with mock.patch('board.caching.SESSIONLESS_ANONYMOUS_READS', False):
+            response = self.client.get(reverse('message_list'))
+        self.assertIn('no-cache', response['Cache-Control'])
+        self.assertNotIn('public', response['Cache-Control'])
+
+
+@override_settings(RATE_LIMITS={'post_message': '2/m', 'signup': '1/h', 'login': '2/m'})
+class RateLimitTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('limited', 'limited@example.com', 'password123')
+
+    def setUp(self):
+        cache.clear()
+
+    def test_post_message_rejected_before_any_work(self):
+        self.client.force_login(self.user)
+        for _ in range(2):
+            response = self.client.post(reverse('post_message'), {'subject': 's', 'content': 'c'})
+            self.assertEqual(response.status_code, 200) # 驗證碼錯誤，表單重新顯示
+        # 只讀取 session，不查詢使用者、驗證碼或留言
+        with self.assertNumQueries(1):
+            response = self.client.post(reverse('post_message'), {'subject': 's', 'content': 'c'})
+        self.assertEqual(response.status_code, 429)
+        self.assertGreaterEqual(int(response['Retry-After']), 1)
+        # GET 不受限制
+        self.assertEqual(self.client.get(reverse('post_message')).status_code, 200)
+
+    def test_user_bucket_shared_across_ips(self):
+        self.client.force_login(self.user)
+        for ip in ('10.0.0.1', '10.0.0.2'):
+            self.client.post(reverse('post_message'), {}, REMOTE_ADDR=ip)
+        response = self.client.post(reverse('post_message'), {}, REMOTE_ADDR='10.0.0.3')
+        self.assertEqual(response.status_code, 429)
+
+    def test_signup_and_login(self):
+        data = {'username': 'bot', 'email': 'bot@example.com', 'password1': 'x', 'password2': 'y'}
+        self.assertEqual(self.client.post(reverse('signup'), data).status_code, 200)
+        self.assertEqual(self.client.post(reverse('signup'), data).status_code, 429)
+        # 其他 IP 不受影響
+        self.assertEqual(self.client.post(reverse('signup'), data, REMOTE_ADDR='10.0.0.9').status_code, 200)
+
+        credentials = {'username': 'limited', 'password': 'wrong'}
+        for _ in range(2):
+            self.assertEqual(self.client.post(reverse('login'), credentials).status_code, 200)
+        self.assertEqual(self.client.post(reverse('login'), credentials).status_code, 429)
+
+    def test_bucket_refills_over_time(self):
+        from .ratelimit import take_token
+        with mock.patch('board.ratelimit.time.time', return_value=1000.0):
+            self.assertTrue(take_token('ratelimit:test', 2, 60)[0])
+            self.assertTrue(take_token('ratelimit:test', 2, 60)[0])
+            allowed, wait = take_token('ratelimit:test', 2, 60)
+        self.assertFalse(allowed)
+        self.assertAlmostEqual(wait, 30)
+        with mock.patch('board.ratelimit.time.time', return_value=1030.0):
+            self.assertTrue(take_token('ratelimit:test', 2, 60)[0])
+
+    def test_falls_back_to_process_buckets(self):
+        from .ratelimit import take_token
+        broken = mock.Mock(get=mock.Mock(side_effect=ConnectionError))
+        with mock.patch('board.ratelimit.caches', {'default': broken}), self.assertLogs('board.ratelimit', 'WARNING'):
+            self.assertTrue(take_token('ratelimit:fallback', 1, 60)[0])
+            self.assertFalse(take_token('ratelimit:fallback', 1, 60)[0])
+
+    @override_settings(RATE_LIMITS={})
+    def test_can_be_disabled(self):
+        self.client.force_login(self.user)
+        for _ in range(5):
+            self.assertEqual(self.client.post(reverse('post_message'), {}).status_code, 200)
+
+    def test_proxy_client_ip(self):
+        from .ratelimit import client_ip
+        request = RequestFactory().post('/', REMOTE_ADDR='10.1.1.1', HTTP_X_FORWARDED_FOR='6.6.6.6, 1.2.3.4')
+        with mock.patch('board.ratelimit._warned_unconfigured_proxy', False), \
+                self.assertLogs('board.ratelimit', 'WARNING') as logs:
+            self.assertEqual(client_ip(request), '10.1.1.1')
+            client_ip(request) # 每個進程只警告一次
+        self.assertEqual(len(logs.records), 1)
+        self.assertIn('RATE_LIMIT_PROXY_COUNT', logs.output[0])
+        with mock.patch('board.ratelimit.RATE_LIMIT_PROXY_COUNT', 1):
+            self.assertEqual(client_ip(request), '1.2.3.4')
+
+
+@mock.patch('board.routers.replica_configured', return_value=True)
+class PrimaryReplicaRoutingTests(SimpleTestCase):
+    # SimpleTestCase 不包在交易中，路由器才會把讀取送往副本
+
+    def setUp(self):
+        from .routers import PrimaryReplicaRouter
+        self.router = PrimaryReplicaRouter()
+
+    def test_reads_of_replicated_models_go_to_replica(self, _):
+        from .models import OutboundEmail
+        self.assertEqual(self.router.db_for_read(Message), 'replica')
+        self.assertEqual(self.router.db_for_read(User), 'replica')
+        self.assertIsNone(self.router.db_for_read(OutboundEmail))
+        self.assertEqual(self.router.db_for_write(Message), 'default')
+        self.assertFalse(self.router.allow_migrate('replica', 'board'))
+        self.assertTrue(self.router.allow_migrate('default', 'board'))
+
+    def test_related_reads_follow_instance(self, _):
+        message = Message()
+        message._state.db = 'default'
+        self.assertEqual(self.router.db_for_read(User, instance=message), 'default')
+
+    def test_sticky_window_after_write(self, _):
+        from .middleware import PRIMARY_STICKY_COOKIE, PrimaryStickinessMiddleware
+        from .routers import use_primary
+        seen = []
+
+        def get_response(request):
+            seen.append(self.router.db_for_read(Message))
+            return HttpResponse(status=302 if request.method == 'POST' else 200)
+
+        with mock.patch('board.middleware.replica_configured', return_value=True):
+            middleware = PrimaryStickinessMiddleware(get_response)
+        factory = RequestFactory()
+
+        self.assertNotIn(PRIMARY_STICKY_COOKIE, middleware(factory.get('/')).cookies)
+        response = middleware(factory.post('/post/'))
+        cookie = response.cookies[PRIMARY_STICKY_COOKIE]
+        self.assertEqual(cookie['max-age'], 5)
+
+        sticky = factory.get('/')
+        sticky.COOKIES[PRIMARY_STICKY_COOKIE] = cookie.value
+        middleware(sticky)
+        expired = factory.get('/')
+        expired.COOKIES[PRIMARY_STICKY_COOKIE] = '1'
+        middleware(expired)
+        self.assertEqual(seen, ['replica', None, None, 'replica'])
+        self.assertFalse(use_primary.get())
+
+    def test_version_keyed_reads_use_primary(self, _):
+        # 以版本號快取或作為 ETag 的內容不能從落後的副本讀取
+        from .api import approved_message_rows
+        from .routers import primary_reads, use_primary
+        with primary_reads():
+            self.assertIsNone(self.router.db_for_read(Message))
+        self.assertFalse(use_primary.get())
+        self.assertEqual(self.router.db_for_read(Message), 'replica')
+        self.assertEqual(approved_message_rows().db, 'default')
+
+    def test_unused_without_replica(self, _):
+        from django.core.exceptions import MiddlewareNotUsed
+        from .middleware import PrimaryStickinessMiddleware
+        with mock.patch('board.middleware.replica_configured', return_value=False), self.assertRaises(MiddlewareNotUsed):
+            PrimaryStickinessMiddleware(lambda request: HttpResponse())
+
+
+class ArchiveTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('archiver', 'archiver@example.com', 'password123')
+
+    def setUp(self):
+        cache.clear()
+        from .stats import APPROVED, PENDING, get_counters, today_key
+        now = timezone.now()
+        self.old_approved = [
+            Message.objects.create(author=self.user, subject=f'Ancient {i}', content='old', is_approved=True) for i in range(3)
+        ]
+        self.old_pending = Message.objects.create(author=self.user, subject='Stale pending', content='p')
+        self.recent = Message.objects.create(author=self.user, subject='Recent', content='r', is_approved=True)
+        self.recent_pending = Message.objects.create(author=self.user, subject='Recent pending', content='p')
+        Message.objects.filter(pk__in=[m.pk for m in self.old_approved]).update(created_at=now - timedelta(days=400))
+        Message.objects.filter(pk=self.old_pending.pk).update(
+            created_at=now - timedelta(days=100), pending_since=now - timedelta(days=100))
+        self.email = OutboundEmail.objects.create(
+            subject='s', body='b', from_email='f@example.com', recipients=['x@example.com'],
+            related_message=self.old_approved[0],
+        )
+        get_counters(APPROVED, PENDING, today_key())
+
+    def test_command_moves_old_messages_in_batches(self):
+        from .models import ArchivedMessage
+        from .stats import APPROVED, APPROVED_REPLIES, DUPLICATES, PENDING, get_counters, rebuild_counters, today_key
+        out = StringIO()
+        call_command('archive_messages', batch_size=2, stdout=out)
+        self.assertIn('已封存 3 條留言，刪除 1 條未審核留言', out.getvalue())
+
+        self.assertEqual(
+            set(ArchivedMessage.objects.values_list('id', flat=True)), {m.pk for m in self.old_approved})
+        archived = ArchivedMessage.objects.get(pk=self.old_approved[0].pk)
+        self.assertEqual((archived.subject, archived.author), ('Ancient 0', self.user))
+        self.assertEqual(
+            set(Message.objects.values_list('subject', flat=True)), {'Recent', 'Recent pending'})
+        self.email.refresh_from_db()
+        self.assertIsNone(self.email.related_message)
+        # 搜尋索引同步移除
+        from .search import search_messages
+        self.assertFalse(search_messages('Ancient').exists())
+
+        # 繞過信號的刪除仍然維護了計數器
+        counters = get_counters(APPROVED, PENDING, APPROVED_REPLIES, DUPLICATES, today_key())
+        self.assertEqual(counters, rebuild_counters())
+
+        # 再次執行沒有可處理的留言
+        call_command('archive_messages', stdout=out)
+        self.assertEqual(ArchivedMessage.objects.count(), 3)
+
+    def test_archive_page(self):
+        from .archive import run_archive
+        run_archive()
+        response = self.client.get(reverse('message_archive'))
+        self.assertContains(response, 'Ancient 2')
+        self.assertNotContains(response, 'Recent')
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('message_archive'))
+        # 封存的留言不能修改或刪除
+        self.assertNotContains(response, reverse('edit_message', args=[self.old_approved[0].pk]))
+        self.assertContains(self.client.get(reverse('message_list')), reverse('message_archive'))
+
+    def test_archive_page_pagination(self):
+        from .models import ArchivedMessage
+        created_at = timezone.now() - timedelta(days=500)
+        ArchivedMessage.objects.bulk_create([
+            ArchivedMessage(id=10_000 + i, author=self.user, subject=f'Cold {i}', content='c', content_html='c',
+                            created_at=created_at - timedelta(minutes=i), updated_at=created_at)
+            for i in range(12)
+        ])
+        response = self.client.get(reverse('message_archive'))
+        page_obj = response.context['page_obj']
+        self.assertEqual(len(page_obj), 10)
+        response = self.client.get(reverse('message_archive'), {'after': page_obj.next_cursor})
+        self.assertContains(response, 'Cold 11')
+
+    def test_purge_counts_from_when_message_became_pending(self):
+        from .archive import run_archive
+        # 很久以前通過審核的留言被修改後回到待審核，不會因為建立時間久遠而立即被刪除
+        edited = Message.objects.create(author=self.user, subject='Edited', content='e', is_approved=True)
+        Message.objects.filter(pk=edited.pk).update(created_at=timezone.now() - timedelta(days=200))
+        self.client.force_login(self.user)
+        self.client.post(reverse('edit_message', args=[edited.pk]), {'subject': 'Edited', 'content': 'changed'})
+        edited.refresh_from_db()
+        self.assertFalse(edited.is_approved)
+        self.assertIsNotNone(edited.pending_since)
+        self.assertEqual(run_archive(), (3, 1))
+        self.assertTrue(Message.objects.filter(pk=edited.pk).exists())
+        # 再次通過審核時清空
+        edited.is_approved = True
+        edited.save()
+        self.assertIsNone(edited.pending_since)
+
+
+class PrerenderedCardTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('carduser', 'carduser@example.com', 'password123')
+
+    def setUp(self):
+        cache.clear()
+        self.message = Message.objects.create(
+            author=self.user, subject='Card', content='<b>粗體</b>\n第二行', is_approved=True)
+
+    def test_content_html_rendered_on_save(self):
+        self.assertEqual(self.message.content_html, '&lt;b&gt;粗體&lt;/b&gt;<br>第二行')
+        Message.objects.bulk_create([Message(author=self.user, subject='Bulk', content='a\nb')])
+        self.assertEqual(Message.objects.get(subject='Bulk').content_html, 'a<br>b')
+
+        # 只更新審核狀態時不重新渲染，updated_at 不變
+        updated_at = self.message.updated_at
+        self.message.is_approved = False
+        self.message.save(update_fields=['is_approved'])
+        self.message.refresh_from_db()
+        self.assertEqual(self.message.updated_at, updated_at)
+
+        self.message.content = '新內容'
+        self.message.save(update_fields=['content'])
+        self.message.refresh_from_db()
+        self.assertEqual(self.message.content_html, '新內容')
+        self.assertGreater(self.message.updated_at, updated_at)
+
+    def test_list_uses_stored_html_without_loading_content(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse('message_list'))
+        self.assertContains(response, '&lt;b&gt;粗體&lt;/b&gt;<br>第二行', html=False)
+        self.assertFalse(any('"board_message"."content",' in q['sql'] for q in ctx.captured_queries))
+
+    def test_cards_cached_per_message_version(self):
+        from .caching import bump_board_version
+        from . import cards
+        with mock.patch.object(cards, 'render_card', wraps=cards.render_card) as render_card:
+            self.client.get(reverse('message_list'))
+            bump_board_version() # 整頁片段失效，卡片片段仍在快取中
+            self.client.get(reverse('message_list'))
+            self.assertEqual(render_card.call_count, 1)
+
+            self.client.force_login(self.user)
+            response = self.client.post(
+                reverse('edit_message', args=[self.message.pk]), {'subject': 'Card', 'content': '修改後'})
+            self.assertEqual(response.status_code, 302)
+            Message.objects.filter(pk=self.message.pk).update(is_approved=True)
+            bump_board_version()
+            response = self.client.get(reverse('message_list'))
+            self.assertContains(response, '修改後')
+            self.assertEqual(render_card.call_count, 2)
+
+
+class AdminChangelistTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.superuser = User.objects.create_superuser('listadmin', 'listadmin@example.com', 'password123')
+        cls.alice = User.objects.create_user('alice', 'alice@example.com', 'password123')
+        cls.bob = User.objects.create_user('bob', 'bob@example.com', 'password123')
+        Message.objects.create(author=cls.alice, subject='Alice pending', content='a')
+        Message.objects.create(author=cls.bob, subject='Bob pending', content='b')
+        Message.objects.create(author=cls.bob, subject='Bob approved', content='b', is_approved=True)
+
+    def setUp(self):
+        from .stats import APPROVED, DUPLICATES, PENDING, get_counters, today_key
+        get_counters(APPROVED, PENDING, DUPLICATES, today_key()) # 計數器首次讀取時才以 COUNT(*) 初始化
+        self.client.login(username='listadmin', password='password123')
+
+    def get_changelist(self, params=None):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse('admin:board_message_changelist'), params or {})
+        return response, [q['sql'] for q in ctx.captured_queries]
+
+    def test_status_views_count_from_counters(self):
+        for params, expected in (({}, 3), ({'is_approved__exact': 0}, 2), ({'is_approved__exact': 1}, 1)):
+            with self.subTest(params=params):
+                response, queries = self.get_changelist(params)
+                self.assertEqual(response.context['cl'].result_count, expected)
+                self.assertFalse([sql for sql in queries if 'COUNT(' in sql.upper()])
+
+    def test_author_filter_is_autocomplete(self):
+        response, queries = self.get_changelist()
+        self.assertContains(response, 'data-ajax--url')
+        self.assertContains(response, 'select2')
+        # 不再為篩選器列出全部使用者
+        self.assertNotContains(response, 'author__username')
+        self.assertFalse([sql for sql in queries if 'DISTINCT' in sql.upper()])
+
+        response, _ = self.get_changelist({'author__id__exact': self.bob.pk})
+        self.assertEqual({m.subject for m in response.context['cl'].result_list}, {'Bob pending', 'Bob approved'})
+        self.assertContains(response, '<option value="%d" selected>bob</option>' % self.bob.pk, html=True)
+
+    def test_invalid_author_filter_redirects(self):
+        response = self.client.get(reverse('admin:board_message_changelist'), {'author__id__exact': 'x'})
+        self.assertRedirects(response, reverse('admin:board_message_changelist') + '?e=1')
+
+    def test_author_autocomplete_endpoint(self):
+        response = self.client.get(reverse('admin:autocomplete'), {
+            'app_label': 'board', 'model_name': 'message', 'field_name': 'author', 'term': 'ali',
+        })
+        self.assertEqual([r['text'] for r in response.json()['results']], ['alice'])
+
+    def test_estimated_count_used_for_large_results(self):
+        from .pagination import EstimatedCountPaginator
+        queryset = Message.objects.all()
+        with mock.patch('board.pagination.estimate_count', return_value=250_000):
+            self.assertEqual(EstimatedCountPaginator(queryset, 100).count, 250_000)
+        # 估計值太小 (或資料庫不支援估計) 時仍然精確計數
+        with mock.patch('board.pagination.estimate_count', return_value=10):
+            self.assertEqual(EstimatedCountPaginator(queryset, 100).count, 3)
+        self.assertEqual(EstimatedCountPaginator(queryset, 100).count, 3)
+
+
+class DuplicateMessageTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('dupuser', 'dupuser@example.com', 'password123')
+        cls.other = User.objects.create_user('dupother', 'dupother@example.com', 'password123')
+        cls.original = Message.objects.create(author=cls.user, subject='Buy cheap pills', content='Visit example.com now!')
+
+    def setUp(self):
+        self.client.login(username='dupuser', password='password123')
+
+    def post(self, subject, content):
+        with override_settings(ADMINS=[('Admin', 'admin@example.com')]), \
+                mock.patch('captcha.fields.CaptchaField.clean', side_effect=lambda value: value):
+            return self.client.post(reverse('post_message'), {
+                'subject': subject, 'content': content, 'captcha_0': 'x', 'captcha_1': 'PASSED',
+            })
+
+    def test_fingerprint_ignores_case_whitespace_and_punctuation(self):
+        from .dedup import content_fingerprint
+        self.assertEqual(self.original.fingerprint, content_fingerprint('BUY  cheap pills', 'visit example com now'))
+        self.assertEqual(content_fingerprint('Ｈｉ', 'a'), content_fingerprint('hi', 'A')) # 全形與半形
+        self.assertNotEqual(content_fingerprint('ab', 'c'), content_fingerprint('a', 'bc'))
+        self.assertNotEqual(content_fingerprint('?', '!!'), content_fingerprint('?', '??'))
+
+    def test_near_duplicate_post_is_collapsed(self):
+        from .stats import DUPLICATES, get_counter
+        response = self.post('buy CHEAP pills', 'Visit  example.com now')
+        self.assertRedirects(response, reverse('message_list'))
+        self.assertEqual(Message.objects.count(), 1)
+        self.original.refresh_from_db()
+        self.assertEqual(self.original.duplicate_count, 1)
+        self.assertEqual(get_counter(DUPLICATES), 1)
+        # 沒有新的審核項目，也不通知管理員
+        self.assertFalse(OutboundEmail.objects.exists())
+
+    @override_settings(AUTO_MODERATION=True)
+    def test_same_content_from_another_user_goes_to_moderation(self):
+        # 不能把其他使用者的提交合併到自己的留言上 (反之亦然)
+        self.client.login(username='dupother', password='password123')
+        response = self.post('buy CHEAP pills', 'Visit  example.com now')
+        self.assertRedirects(response, reverse('message_list'))
+        self.assertEqual(Message.objects.count(), 2)
+        copy = Message.objects.get(author=self.other)
+        self.assertFalse(copy.is_approved) # 即使啟用自動審核也等待管理員審核
+        self.assertIn('新留言待審核', OutboundEmail.objects.get().subject)
+        self.original.refresh_from_db()
+        self.assertEqual(self.original.duplicate_count, 0)
+
+        # 之後同一位使用者的重複提交合併到他自己的那一條
+        self.post('Buy cheap pills', 'Visit example.com now!')
+        copy.refresh_from_db()
+        self.assertEqual(copy.duplicate_count, 1)
+        self.assertEqual(Message.objects.count(), 2)
+
+    def test_old_duplicates_do_not_block_new_posts(self):
+        from .dedup import DUPLICATE_WINDOW_HOURS
+        Message.objects.filter(pk=self.original.pk).update(
+            created_at=timezone.now() - timedelta(hours=DUPLICATE_WINDOW_HOURS + 1))
+        self.post('Buy cheap pills', 'Visit example.com now!')
+        self.assertEqual(Message.objects.count(), 2)
+
+    def test_duplicate_check_uses_fingerprint_index(self):
+        from .dedup import content_fingerprint
+        sql, params = Message.objects.duplicates_of(content_fingerprint('a', 'b')).query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+            plan = ' '.join(str(row) for row in cursor.fetchall())
+        self.assertIn('board_msg_fingerprint_idx', plan)
+
+    def test_edit_into_duplicate_is_rejected(self):
+        Message.objects.create(author=self.other, subject='Theirs', content='same as theirs')
+        own = Message.objects.create(author=self.user, subject='Mine', content='original')
+        response = self.client.post(reverse('edit_message', args=[own.id]),
+                                    {'subject': 'Buy cheap pills', 'content': 'visit example.com now'})
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, '已經有相同內容的留言')
+        own.refresh_from_db()
+        self.assertEqual(own.subject, 'Mine')
+        # 只修改自己的留言 (內容不變) 不算重複
+        response = self.client.post(reverse('edit_message', args=[own.id]), {'subject': 'Mine', 'content': 'original'})
+        self.assertRedirects(response, reverse('message_list'))
+        # 改成與其他使用者的留言相同：允許，但需要重新審核
+        with override_settings(AUTO_MODERATION=True):
+            response = self.client.post(reverse('edit_message', args=[own.id]), {'subject': 'Theirs', 'content': 'same as theirs'})
+        self.assertRedirects(response, reverse('message_list'))
+        own.refresh_from_db()
+        self.assertEqual((own.subject, own.is_approved), ('Theirs', False))
+
+    def test_admin_shows_collapsed_count(self):
+        self.post('Buy cheap pills', 'Visit example.com now!')
+        User.objects.create_superuser('dupadmin', 'dupadmin@example.com', 'password123')
+        self.client.login(username='dupadmin', password='password123')
+        response = self.client.get(reverse('admin:board_message_changelist'))
+        self.assertContains(response, '已合併 1 次重複提交')
+        self.assertContains(response, 'column-duplicate_count')
+
+
+@override_settings(MODERATION_DENY_KEYWORDS=['casino', 'sex', '代購'], MODERATION_ALLOW_KEYWORDS=['sussex'])
+class AutoModerationTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('moduser', 'moduser@example.com', 'password123')
+
+    def post(self, subject, content):
+        self.client.login(username='moduser', password='password123')
+        with override_settings(ADMINS=[('Admin', 'admin@example.com')]), \
+                mock.patch('captcha.fields.CaptchaField.clean', side_effect=lambda value: value):
+            return self.client.post(reverse('post_message'), {
+                'subject': subject, 'content': content, 'captcha_0': 'x', 'captcha_1': 'PASSED',
+            })
+
+    def test_automaton_finds_overlapping_keywords(self):
+        from .moderation import KeywordAutomaton
+        automaton = KeywordAutomaton([(k, 'deny') for k in ('he', 'she', 'his', 'hers')])
+        matches = [(start, end, keyword) for start, end, _, keyword in automaton.iter_matches('ushers')]
+        self.assertEqual(matches, [(1, 4, 'she'), (2, 4, 'he'), (2, 6, 'hers')])
+
+    def test_scan_normalizes_and_respects_allow_list(self):
+        from .moderation import moderate
+        self.assertEqual(moderate('Best ＣＡＳＩＮＯ', 'join now').denied, ('casino',))
+        self.assertEqual(moderate('專業代購', '').denied, ('代購',))
+        self.assertTrue(moderate('Greetings from Sussex', 'hello').approved)
+        self.assertEqual(moderate('Sussex', 'sex').denied, ('sex',))
+
+    @override_settings(AUTO_MODERATION=True)
+    def test_clean_post_is_approved_without_admin_email(self):
+        self.post('Hello', 'A friendly note')
+        message = Message.objects.get(subject='Hello')
+        self.assertTrue(message.is_approved)
+        self.assertIsNotNone(message.approved_at)
+        self.assertFalse(OutboundEmail.objects.exists())
+
+    @override_settings(AUTO_MODERATION=True)
+    def test_denied_post_goes_to_queue(self):
+        self.post('Win big', 'Online casino bonus')
+        self.assertFalse(Message.objects.get(subject='Win big').is_approved)
+        self.assertEqual(OutboundEmail.objects.count(), 1)
+
+    def test_disabled_by_default(self):
+        self.post('Hello', 'A friendly note')
+        self.assertFalse(Message.objects.get(subject='Hello').is_approved)
+
+    @override_settings(AUTO_MODERATION=True)
+    def test_edit_is_rescanned(self):
+        message = Message.objects.create(author=self.user, subject='Hello', content='hi', is_approved=True)
+        self.client.login(username='moduser', password='password123')
+        self.client.post(reverse('edit_message', args=[message.id]), {'subject': 'Hello', 'content': 'casino'})
+        message.refresh_from_db()
+        self.assertFalse(message.is_approved)
+        self.client.post(reverse('edit_message', args=[message.id]), {'subject': 'Hello', 'content': 'hi again'})
+        message.refresh_from_db()
+        self.assertTrue(message.is_approved)
+
+    def test_moderate_pending_command(self):
+        from .stats import APPROVED, PENDING, get_counters, rebuild_counters
+        Message.objects.bulk_create(
+            [Message(author=self.user, subject=f'Clean {i}', content='ok') for i in range(5)]
+            + [Message(author=self.user, subject='Spam', content='sex casino')]
+        )
+        out = StringIO()
+        call_command('moderate_pending', '--dry-run', stdout=out)
+        self.assertIn('掃描 6 條待審核留言，可通過 5 條', out.getvalue())
+        self.assertEqual(Message.objects.filter(is_approved=True).count(), 0)
+
+        call_command('moderate_pending', '--batch-size', '2', stdout=StringIO())
+        self.assertEqual(list(Message.objects.filter(is_approved=False).values_list('subject', flat=True)), ['Spam'])
+        self.assertEqual(OutboundEmail.objects.count(), 5) # 通知留言者
+        counters = get_counters(APPROVED, PENDING)
+        self.assertEqual(counters, {k: v for k, v in rebuild_counters().items() if k in counters})
+
+    @override_settings(MODERATION_DENY_KEYWORDS=[])
+    def test_command_refuses_without_deny_keywords(self):
+        from django.core.management.base import CommandError
+        Message.objects.create(author=self.user, subject='Pending', content='p')
+        with self.assertRaises(CommandError):
+            call_command('moderate_pending', stdout=StringIO())
+        self.assertFalse(Message.objects.get(subject='Pending').is_approved)
+
+
+class RetentionTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('retuser', 'retuser@example.com', 'password123')
+
+    def test_delete_in_chunks(self):
+        from .retention import delete_in_chunks
+        OutboundEmail.objects.bulk_create([
+            OutboundEmail(subject=f'm{i}', body='b', from_email='f@example.com', recipients=['r@example.com'])
+            for i in range(7)
+        ])
+        keep = OutboundEmail.objects.order_by('pk')[3]
+        queryset = OutboundEmail.objects.exclude(pk=keep.pk)
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertEqual(delete_in_chunks(queryset, batch_size=2, pause=0), 6)
+        deletes = [q['sql'] for q in ctx.captured_queries if q['sql'].startswith('DELETE')]
+        self.assertEqual(len(deletes), 3)
+        self.assertEqual(list(OutboundEmail.objects.all()), [keep])
+
+    @override_settings(RETENTION_DAYS={'sent_emails': 30})
+    def test_command_applies_each_policy(self):
+        from captcha.models import CaptchaStore
+        from django.contrib.sessions.backends.db import SessionStore
+        from .captcha_pool import generate_captchas
+        from .models import PooledCaptcha
+        from .stats import APPROVED, APPROVED_REPLIES, DUPLICATES, PENDING, get_counters, rebuild_counters, today_key
+        now = timezone.now()
+        old_pending = Message.objects.create(author=self.user, subject='Abandoned', content='a')
+        Message.objects.filter(pk=old_pending.pk).update(created_at=now - timedelta(days=200), pending_since=now - timedelta(days=200))
+        Message.objects.create(author=self.user, subject='Fresh pending', content='f')
+        Message.objects.create(author=self.user, subject='Old approved', content='o', is_approved=True)
+
+        generate_captchas(3)
+        PooledCaptcha.objects.filter(pk=PooledCaptcha.objects.first().pk).update(expires_at=now)
+        CaptchaStore.objects.filter(hashkey=PooledCaptcha.objects.first().hashkey).update(expiration=now)
+
+        expired = SessionStore()
+        expired.set_expiry(-60)
+        expired.create()
+        live = SessionStore()
+        live.create()
+
+        sent = OutboundEmail.objects.bulk_create([
+            OutboundEmail(subject=s, body='b', from_email='f@example.com', recipients=['r@example.com'],
+                          status=OutboundEmail.STATUS_SENT, sent_at=now - timedelta(days=days))
+            for s, days in (('old', 40), ('recent', 1))
+        ])
+        failed = OutboundEmail.objects.create(subject='failed', body='b', from_email='f@example.com',
+                                              recipients=['r@example.com'], status=OutboundEmail.STATUS_FAILED)
+
+        out = StringIO()
+        call_command('enforce_retention', '--batch-size', '1', '--pause', '0', stdout=out)
+        self.assertIn('未審核留言 (pending_messages): 刪除 1 行', out.getvalue())
+        self.assertIn('驗證碼 (captcha): 刪除 2 行', out.getvalue())
+        self.assertIn('共回收', out.getvalue())
+
+        self.assertEqual(set(Message.objects.values_list('subject', flat=True)), {'Fresh pending', 'Old approved'})
+        self.assertEqual(PooledCaptcha.objects.count(), 2)
+        from django.contrib.sessions.models import Session
+        self.assertEqual(list(Session.objects.values_list('session_key', flat=True)), [live.session_key])
+        self.assertEqual(set(OutboundEmail.objects.values_list('pk', flat=True)), {sent[1].pk, failed.pk})
+        counters = get_counters(APPROVED, PENDING, APPROVED_REPLIES, DUPLICATES, today_key())
+        self.assertEqual(counters, rebuild_counters())
+
+    @override_settings(RETENTION_DAYS={'sessions': None})
+    def test_only_and_disabled_policies(self):
+        from .retention import run_retention
+        self.assertEqual(run_retention(only={'sessions', 'captcha'}, pause=0), {'captcha': 0})
+
+    def test_unapproved_old_message_is_kept_until_pending_long_enough(self):
+        from .retention import run_retention
+        admin_user = User.objects.create_superuser('retadmin', 'retadmin@example.com', 'password123')
+        old = Message.objects.create(author=self.user, subject='Old topic', content='o', is_approved=True)
+        Message.objects.filter(pk=old.pk).update(created_at=timezone.now() - timedelta(days=300))
+        self.client.force_login(admin_user)
+        self.client.post(reverse('admin:board_message_changelist'), {
+            'action': 'mark_unapproved', '_selected_action': [old.pk],
+        })
+        self.assertEqual(run_retention(only={'pending_messages'}, pause=0), {'pending_messages': 0})
+        Message.objects.filter(pk=old.pk).update(pending_since=timezone.now() - timedelta(days=91))
+        self.assertEqual(run_retention(only={'pending_messages'}, pause=0), {'pending_messages': 1})
+
+
+class AuthorMessagesTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.alice = User.objects.create_user('alice', 'alice@example.com', 'password123')
+        cls.bob = User.objects.create_user('bob', 'bob@example.com', 'password123')
+        Message.objects.bulk_create(
+            [Message(author=cls.alice, subject=f'Alice {i}', content='a', is_approved=True) for i in range(12)]
+            + [Message(author=cls.alice, subject='Alice pending', content='p')]
+            + [Message(author=cls.bob, subject='Bob approved', content='b', is_approved=True)]
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def _subjects(self, response):
+        return re.findall(r'(Alice \d+|Alice pending|Bob approved)\s*<', response.content.decode())
+
+    def test_public_timeline_shows_only_approved_posts_of_author(self):
+        response = self.client.get(reverse('author_messages', args=['alice']))
+        self.assertEqual(self._subjects(response)[:1] + self._subjects(response)[-1:], ['Alice 11', 'Alice 2'])
+        self.assertNotContains(response, 'Alice pending')
+        self.assertNotContains(response, 'Bob approved')
+        self.assertIn('public', response['Cache-Control']) # 匿名瀏覽同樣可由 CDN 快取
+
+        first_page = response.content.decode()
+        next_url = first_page[first_page.index('?after='):].split('"')[0].replace('&amp;', '&')
+        response = self.client.get(reverse('author_messages', args=['alice']) + next_url)
+        self.assertEqual(self._subjects(response), ['Alice 1', 'Alice 0'])
+
+    def test_unknown_author_is_404(self):
+        self.assertEqual(self.client.get(reverse('author_messages', args=['nobody'])).status_code, 404)
+
+    def test_byline_links_to_author(self):
+        response = self.client.get(reverse('message_list'))
+        self.assertContains(response, reverse('author_messages', args=['bob']))
+
+    def test_my_messages_includes_pending_with_status_tabs(self):
+        self.assertRedirects(self.client.get(reverse('my_messages')),
+                             reverse('login') + '?next=' + reverse('my_messages'))
+        self.client.login(username='alice', password='password123')
+        response = self.client.get(reverse('my_messages'))
+        self.assertContains(response, 'Alice pending')
+        self.assertContains(response, '待審核')
+        self.assertNotContains(response, 'Bob approved')
+
+        response = self.client.get(reverse('my_messages'), {'status': 'pending'})
+        self.assertContains(response, 'Alice pending')
+        self.assertNotContains(response, 'Alice 11')
+        response = self.client.get(reverse('my_messages'), {'status': 'approved'})
+        self.assertNotContains(response, 'Alice pending')
+        self.assertContains(response, 'status=approved&amp;after=')
+
+    def test_queries_use_author_index(self):
+        for queryset in (Message.objects.filter(author=self.alice, is_approved=True),
+                         Message.objects.filter(author=self.alice)):
+            sql, params = queryset.order_by('-created_at', '-id')[:11].query.sql_with_params()
+            with connection.cursor() as cursor:
+                cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+                plan = ' '.join(str(row) for row in cursor.fetchall())
+            self.assertIn('board_msg_author_keyset_idx', plan)
+            self.assertNotIn('TEMP B-TREE', plan) # 依索引順序讀取，不需要另外排序
+
+
+class ThreadTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.superuser = User.objects.create_superuser('threadadmin', 'threadadmin@example.com', 'password123')
+        cls.user = User.objects.create_user('threaduser', 'threaduser@example.com', 'password123')
+        cls.other = User.objects.create_user('threadother', 'threadother@example.com', 'password123')
+
+    def setUp(self):
+        cache.clear()
+        from .stats import APPROVED, APPROVED_REPLIES, PENDING, get_counters, today_key
+        get_counters(APPROVED, PENDING, APPROVED_REPLIES, today_key())
+        self.root = Message.objects.create(author=self.user, subject='Topic', content='root', is_approved=True)
+        self.first = self.reply(self.root, 'first')
+        self.nested = self.reply(self.first, 'nested')
+        self.second = self.reply(self.root, 'second')
+
+    def reply(self, parent, content, author=None, is_approved=True):
+        return Message.objects.create(
+            author=author or self.other, parent=parent, subject='Re: Topic', content=content, is_approved=is_approved,
+        )
+
+    def post_reply(self, parent, content):
+        with override_settings(ADMINS=[('Admin', 'admin@example.com')]), \
+                mock.patch('captcha.fields.CaptchaField.clean', side_effect=lambda value: value):
+            return self.client.post(reverse('reply_message', args=[parent.pk]), {
+                'content': content, 'captcha_0': 'x', 'captcha_1': 'PASSED',
+            })
+
+    def assertCountersConsistent(self):
+        from .stats import APPROVED, APPROVED_REPLIES, PENDING, get_counters, rebuild_counters, today_key
+        counters = get_counters(APPROVED, PENDING, APPROVED_REPLIES, today_key())
+        rebuilt = rebuild_counters()
+        self.assertEqual(counters, {key: rebuilt[key] for key in counters})
+
+    def test_replies_form_materialized_paths(self):
+        self.assertEqual((self.first.thread_id, self.nested.thread_id, self.second.thread_id), (self.root.pk,) * 3)
+        self.assertEqual(self.nested.path, self.first.path + f'{self.nested.pk:010d}/')
+        self.assertEqual([self.root.depth, self.first.depth, self.nested.depth], [0, 1, 2])
+        self.root.refresh_from_db()
+        self.assertEqual(self.root.reply_count, 3)
+        self.assertCountersConsistent()
+
+    def test_whole_thread_loads_in_one_indexed_query(self):
+        from .threads import thread_replies
+        self.reply(self.root, 'pending', is_approved=False)
+        with self.assertNumQueries(1):
+            replies = [(reply.content_html, reply.author.username) for reply in thread_replies(self.root)]
+        # 深度優先：巢狀回覆緊接在它回覆的留言之後，待審核的回覆不顯示
+        self.assertEqual([content for content, _ in replies], ['first', 'nested', 'second'])
+
+        sql, params = thread_replies(self.root).query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+            plan = ' '.join(str(row) for row in cursor.fetchall())
+        self.assertIn('board_msg_thread_path_idx', plan)
+        self.assertNotIn('TEMP B-TREE', plan)
+
+    def test_list_shows_topics_with_reply_previews_in_one_query(self):
+        from .threads import REPLY_PREVIEW_COUNT
+        for n in range(REPLY_PREVIEW_COUNT):
+            self.reply(self.root, f'extra {n}')
+        quiet = Message.objects.create(author=self.user, subject='Quiet topic', content='q', is_approved=True)
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse('message_list'))
+        self.assertEqual(len(ctx), 2) # 頂層留言 + 所有討論串的回覆預覽
+        self.assertContains(response, 'Quiet topic')
+        self.assertNotContains(response, 'Re: Topic') # 回覆不出現在列表中
+        self.assertContains(response, 'class="list-group-item reply"', count=REPLY_PREVIEW_COUNT)
+        self.assertContains(response, f'查看全部 {REPLY_PREVIEW_COUNT + 3} 則回覆')
+        self.assertContains(response, reverse('message_thread', args=[quiet.pk]))
+
+    def test_thread_page_and_reply_redirect(self):
+        response = self.client.get(reverse('message_thread', args=[self.root.pk]))
+        self.assertContains(response, '3 則回覆')
+        self.assertContains(response, f'id="message-{self.nested.pk}"')
+        self.assertRedirects(
+            self.client.get(reverse('message_thread', args=[self.nested.pk])),
+            reverse('message_thread', args=[self.root.pk]) + f'#message-{self.nested.pk}',
+            fetch_redirect_response=False,
+        )
+        pending = Message.objects.create(author=self.user, subject='Pending', content='p')
+        self.assertEqual(self.client.get(reverse('message_thread', args=[pending.pk])).status_code, 404)
+
+    def test_posted_reply_waits_for_moderation_then_counts(self):
+        self.client.login(username='threaduser', password='password123')
+        response = self.post_reply(self.nested, 'Deep answer')
+        self.assertRedirects(response, reverse('message_thread', args=[self.root.pk]), fetch_redirect_response=False)
+        reply = Message.objects.get(content='Deep answer')
+        self.assertEqual((reply.parent_id, reply.thread_id, reply.subject), (self.nested.pk, self.root.pk, 'Re: Topic'))
+        self.assertFalse(reply.is_approved)
+        self.assertIn('新回覆待審核', OutboundEmail.objects.get().subject)
+        self.root.refresh_from_db()
+        self.assertEqual(self.root.reply_count, 3)
+
+        # 後台逐條審核回覆
+        self.client.login(username='threadadmin', password='password123')
+        changelist = reverse('admin:board_message_changelist')
+        response = self.client.get(changelist, {'kind': 'reply', 'is_approved__exact': 0})
+        self.assertContains(response, reverse('admin:board_message_change', args=[reply.pk]))
+        self.assertContains(response, f'>#{self.nested.pk}</a>') # 回覆的留言
+        self.assertNotContains(response, reverse('admin:board_message_change', args=[self.root.pk]))
+        self.client.post(changelist, {'action': 'mark_approved_and_notify', '_selected_action': [reply.pk]})
+        self.root.refresh_from_db()
+        self.assertEqual(self.root.reply_count, 4)
+        self.assertCountersConsistent()
+
+        self.client.post(changelist, {'action': 'mark_unapproved', '_selected_action': [reply.pk, self.second.pk]})
+        self.root.refresh_from_db()
+        self.assertEqual(self.root.reply_count, 2)
+        self.assertCountersConsistent()
+
+    def test_duplicate_replies_are_scoped_to_parent(self):
+        self.client.login(username='threaduser', password='password123')
+        self.post_reply(self.first, 'Thanks!')
+        self.post_reply(self.second, 'thanks')
+        self.assertEqual(Message.objects.filter(content__in=['Thanks!', 'thanks']).count(), 2) # 不同留言之下不算重複
+        response = self.post_reply(self.first, 'THANKS')
+        self.assertRedirects(response, reverse('message_thread', args=[self.root.pk]), fetch_redirect_response=False)
+        self.assertEqual(Message.objects.get(content='Thanks!').duplicate_count, 1)
+
+    def test_reply_beyond_max_depth_attaches_to_parent(self):
+        self.client.login(username='threaduser', password='password123')
+        with mock.patch('board.threads.MAX_REPLY_DEPTH', 2):
+            self.post_reply(self.nested, 'Too deep')
+        self.assertEqual(Message.objects.get(content='Too deep').parent_id, self.first.pk)
+
+    def test_deleting_reply_removes_subtree(self):
+        self.client.login(username='threadother', password='password123')
+        self.client.post(reverse('delete_message', args=[self.first.pk]))
+        self.assertFalse(Message.objects.filter(pk__in=[self.first.pk, self.nested.pk]).exists())
+        self.root.refresh_from_db()
+        self.assertEqual(self.root.reply_count, 1)
+        self.assertCountersConsistent()
+
+    def test_deleting_thread_updates_counters_once(self):
+        # 子樹中每一條回覆都會發送 post_delete，計數器與快取版本號仍然只更新一次
+        deep = self.nested
+        for depth in range(5):
+            deep = self.reply(deep, f'deep {depth}')
+        from .stats import adjust_counters
+        self.client.login(username='threaduser', password='password123')
+        with mock.patch('board.signals.adjust_counters', wraps=adjust_counters) as adjust, \
+                mock.patch('board.signals.refresh_reply_counts') as refresh, \
+                mock.patch('board.signals.bump_board_version_on_commit') as bump:
+            self.client.post(reverse('delete_message', args=[self.root.pk]))
+        self.assertFalse(Message.objects.exists())
+        adjust.assert_called_once()
+        refresh.assert_called_once_with(set()) # 頂層留言已刪除，不需要更新回覆數
+        bump.assert_called_once()
+        self.assertCountersConsistent()
+
+    def test_purge_and_archive_handle_whole_subtrees(self):
+        from .archive import archive_approved_messages, purge_unapproved_messages
+        from .models import ArchivedMessage
+        later = timezone.now() + timedelta(days=1)
+        # 被退回待審核的回覆：連同其下已審核的回覆一起清除
+        self.first.is_approved = False
+        self.first.save()
+        self.assertEqual(purge_unapproved_messages(later, batch_size=1), 1)
+        self.assertFalse(Message.objects.filter(pk=self.nested.pk).exists())
+        self.root.refresh_from_db()
+        self.assertEqual(self.root.reply_count, 1)
+
+        pending = self.reply(self.second, 'pending', is_approved=False)
+        self.assertEqual(archive_approved_messages(later), 1)
+        self.assertFalse(Message.objects.filter(pk__in=[self.root.pk, self.second.pk, pending.pk]).exists())
+        archived = ArchivedMessage.objects.get(pk=self.second.pk)
+        self.assertEqual((archived.thread_id, archived.path), (self.root.pk, self.second.path))
+        self.assertEqual(ArchivedMessage.objects.count(), 2)
+        response = self.client.get(reverse('message_archive'))
+        self.assertContains(response, 'Topic')
+        self.assertContains(response, 'second')
+        self.assertCountersConsistent()
+
+
+class ReactionTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('reactuser', 'reactuser@example.com', 'password123')
+        cls.others = [User.objects.create_user(f'reactor{i}', f'reactor{i}@example.com', 'password123') for i in range(3)]
+        cls.message = Message.objects.create(author=cls.user, subject='Popular', content='p', is_approved=True)
+        cls.quiet = Message.objects.create(author=cls.user, subject='Quiet', content='q', is_approved=True)
+        cls.pending = Message.objects.create(author=cls.user, subject='Pending', content='p')
+
+    def setUp(self):
+        from .reactions import buffer
+        cache.clear()
+        self.buffer = buffer
+        self.buffer.drain()
+        self.addCleanup(self.buffer.drain)
+        # 測試中不依時間觸發寫入，只在明確呼叫 flush 時寫入
+        patcher = mock.patch.object(self.buffer, 'interval', 3600)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def react(self, user, message, kind='like', **extra):
+        self.client.force_login(user)
+        return self.client.post(reverse('react_message', args=[message.pk]), {'kind': kind, **extra})
+
+    def counts(self, message):
+        message.refresh_from_db()
+        return message.like_count, message.love_count, message.laugh_count
+
+    def test_clicks_are_buffered_until_flush(self):
+        for user in self.others:
+            response = self.react(user, self.message)
+            self.assertRedirects(response, reverse('message_list'), fetch_redirect_response=False)
+        self.react(self.user, self.message, 'love')
+        self.assertEqual(self.counts(self.message), (0, 0, 0))
+        self.assertEqual(len(self.buffer), 4)
+        self.assertEqual(self.buffer.flush(), 1)
+        self.assertEqual(self.counts(self.message), (3, 1, 0))
+        self.assertEqual(len(self.buffer), 0)
+
+    def test_flush_writes_one_update_per_batch(self):
+        from .models import Reaction
+        from .reactions import ReactionBuffer
+        buffer = ReactionBuffer(interval=3600, max_pending=1000, batch_size=2)
+        extra = [Message.objects.create(author=self.user, subject=f'Extra {i}', content='e', is_approved=True) for i in range(2)]
+        for message in (self.message, self.quiet, *extra):
+            Reaction.objects.create(message=message, user=self.others[0], kind='like')
+            buffer.add(message.pk)
+        for user in self.others[:2]:
+            Reaction.objects.create(message=self.message, user=user, kind='laugh')
+            buffer.add(self.message.pk)
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertEqual(buffer.flush(), 4)
+        self.assertEqual(len(ctx), 2) # 4 條留言、每批 2 條
+        self.assertTrue(all(q['sql'].startswith('UPDATE') for q in ctx.captured_queries))
+        self.assertEqual(self.counts(self.message), (1, 0, 2))
+        self.assertEqual([self.counts(m) for m in extra], [(1, 0, 0)] * 2)
+
+    def test_flushes_when_too_many_clicks_are_pending(self):
+        with mock.patch.object(self.buffer, 'max_pending', 2):
+            self.react(self.others[0], self.message)
+            self.assertEqual(self.counts(self.message), (0, 0, 0))
+            self.react(self.others[1], self.message)
+        self.assertEqual(self.counts(self.message), (2, 0, 0))
+        self.assertEqual(len(self.buffer), 0)
+
+    def test_same_user_counts_once(self):
+        self.react(self.others[0], self.message)
+        self.react(self.others[0], self.message)
+        self.react(self.others[0], self.message, 'laugh')
+        self.buffer.flush()
+        self.assertEqual(self.counts(self.message), (1, 0, 1))
+        # 另一個進程 (另一個緩衝區) 收到的重複點擊同樣被資料庫的唯一約束忽略
+        from .reactions import ReactionBuffer, record_reaction
+        with mock.patch('board.reactions.buffer', ReactionBuffer(interval=0)):
+            record_reaction(self.others[0], self.message.pk, 'like')
+        self.assertEqual(self.counts(self.message), (1, 0, 1))
+
+    def test_recount_covers_idle_buffers(self):
+        self.react(self.others[0], self.message)
+        self.react(self.others[1], self.quiet, 'love')
+        self.buffer.drain() # 模擬閒置或已終止的進程：緩衝區沒有寫入
+        out = StringIO()
+        call_command('flush_reactions', stdout=out)
+        self.assertIn('2 條留言', out.getvalue())
+        self.assertEqual(self.counts(self.message), (1, 0, 0))
+        self.assertEqual(self.counts(self.quiet), (0, 1, 0))
+        # 重新計算是冪等的
+        call_command('flush_reactions', stdout=StringIO())
+        self.assertEqual(self.counts(self.message), (1, 0, 0))
+
+    def test_flush_does_not_invalidate_list_cache(self):
+        from .caching import get_board_version
+        version = get_board_version()
+        self.react(self.others[0], self.message)
+        self.buffer.flush()
+        self.assertEqual(get_board_version(), version)
+
+    def test_message_list_reads_counts_with_messages(self):
+        for user in self.others:
+            self.react(user, self.message)
+        self.buffer.flush()
+        self.client.logout()
+        with self.assertNumQueries(1): # 匿名且沒有 cookie：只有留言查詢
+            response = Client().get(reverse('message_list'))
+        self.assertContains(response, '👍 3')
+        self.assertNotContains(response, 'reaction-form')
+
+    def test_logged_in_list_shows_reaction_buttons(self):
+        self.client.force_login(self.others[0])
+        response = self.client.get(reverse('message_list'))
+        self.assertContains(response, 'id="reaction-form"', count=1)
+        self.assertContains(response, f'formaction="{reverse("react_message", args=[self.message.pk])}"', count=3)
+
+    def test_redirects_to_safe_next(self):
+        thread_url = reverse('message_thread', args=[self.message.pk])
+        response = self.react(self.others[0], self.message, next=thread_url)
+        self.assertRedirects(response, thread_url, fetch_redirect_response=False)
+        response = self.react(self.others[1], self.message, next='https://evil.example.com/')
+        self.assertRedirects(response, reverse('message_list'), fetch_redirect_response=False)
+
+    def test_rejects_invalid_requests(self):
+        self.assertEqual(self.react(self.others[0], self.pending).status_code, 404)
+        self.assertEqual(self.react(self.others[0], self.message, 'angry').status_code, 400)
+        self.assertEqual(self.client.get(reverse('react_message', args=[self.message.pk])).status_code, 405)
+        self.client.logout()
+        response = self.client.post(reverse('react_message', args=[self.message.pk]), {'kind': 'like'})
+        self.assertEqual(response.status_code, 302)
+        self.assertIn(reverse('login'), response['Location'])
+        self.assertEqual(len(self.buffer), 0)
+
+    def test_failed_flush_keeps_messages(self):
+        from django.db import OperationalError
+        self.react(self.others[0], self.message)
+        self.react(self.others[1], self.quiet, 'love')
+        with mock.patch('board.reactions.refresh_reaction_counts', side_effect=OperationalError('database is locked')), \
+                self.assertLogs('board.reactions', 'WARNING'):
+            self.assertEqual(self.buffer.flush(), 0)
+        self.assertEqual(len(self.buffer), 2)
+        self.assertEqual(self.buffer.flush(), 2)
+        self.assertEqual(self.counts(self.message), (1, 0, 0))
+        self.assertEqual(self.counts(self.quiet), (0, 1, 0))
+
+    def test_archiving_keeps_counts(self):
+        from .archive import archive_approved_messages
+        from .models import ArchivedMessage, Reaction
+        self.react(self.others[0], self.message, 'laugh')
+        self.buffer.flush()
+        Message.objects.filter(pk=self.message.pk).update(created_at=timezone.now() - timedelta(days=400))
+        archive_approved_messages(timezone.now() - timedelta(days=365))
+        archived = ArchivedMessage.objects.get(pk=self.message.pk)
+        self.assertEqual(archived.reactions, [('like', '👍', 0), ('love', '❤️', 0), ('laugh', '😂', 1)])
+        self.assertFalse(Reaction.objects.filter(message_id=self.message.pk).exists())
+
+
+class SeedAndBenchmarkTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+
+    def seed(self, **options):
+        options = {'users': 6, 'messages': 60, 'approved_ratio': 0.5, 'batch_size': 25, 'seed': 1, **options}
+        call_command('seed_board', stdout=StringIO(), **options)
+
+    def test_seed_board_creates_consistent_data(self):
+        from .stats import APPROVED, PENDING, get_counters
+        self.seed()
+        self.assertEqual(User.objects.filter(username__startswith='seed_user_').count(), 6)
+        self.assertEqual(Message.objects.count(), 60)
+        counters = get_counters(APPROVED, PENDING)
+        self.assertEqual(counters[APPROVED], Message.objects.filter(is_approved=True).count())
+        self.assertEqual(counters[PENDING], Message.objects.filter(is_approved=False).count())
+        self.assertFalse(Message.objects.filter(is_approved=True, approved_at__isnull=True).exists())
+        # 留言時間分散在過去，而不是全部等於執行時間
+        self.assertGreater(Message.objects.earliest('created_at').created_at, timezone.now() - timezone.timedelta(days=366))
+        self.assertLess(Message.objects.earliest('created_at').created_at, timezone.now() - timezone.timedelta(days=300))
+
+        # 重複執行時使用新的使用者名稱
+        self.seed(messages=0)
+        self.assertEqual(User.objects.filter(username__startswith='seed_user_').count(), 12)
+
+    def test_benchmark_covers_every_route_and_rolls_back(self):
+        import json
+        import os
+        import tempfile
+        from .caching import BOARD_VERSION_KEY, get_board_version
+        self.seed()
+        message_count = Message.objects.count()
+        version = get_board_version()
+        cached_keys = set(cache._cache) # 測試使用的記憶體快取
+        with tempfile.TemporaryDirectory() as directory:
+            output = os.path.join(directory, 'result.json')
+            call_command('benchmark_board', iterations=2, warmup=1, output=output, label='test', stdout=StringIO())
+            with open(output, encoding='utf-8') as f:
+                results = json.load(f)
+
+        self.assertEqual(results['label'], 'test')
+        from .benchmark import THREAD_REPLIES
+        self.assertEqual(results['messages'], message_count + 2 + THREAD_REPLIES) # 加上基準測試自己的留言與討論串
+        self.assertEqual(results['uncovered_routes'], [])
+        for scenario in results['scenarios']:
+            with self.subTest(scenario=scenario['name']):
+                self.assertLessEqual(scenario['p50_ms'], scenario['p99_ms'])
+                self.assertGreater(scenario['peak_memory_kib'], 0)
+                self.assertFalse([code for code in scenario['status_codes'] if code.startswith('5')])
+        self.assertEqual(Message.objects.count(), message_count)
+        self.assertFalse(User.objects.filter(username__startswith='benchmark_').exists())
+        # 網站的快取沒有被寫入 (版本號未遞增，也沒有包含已回滾留言的片段)
+        self.assertEqual(cache.get(BOARD_VERSION_KEY), version)
+        self.assertEqual(set(cache._cache) - cached_keys, set())
+
+
+class CaptchaPoolTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('captchauser', 'captchauser@example.com', 'password123')
+
+    def setUp(self):
+        self.client.login(username='captchauser', password='password123')
+
+    def test_fill_and_draw(self):
+        from captcha.models import CaptchaStore
+        from .captcha_pool import available, draw_captcha, fill_captcha_pool
+        from .models import PooledCaptcha
+        self.assertEqual(fill_captcha_pool(size=5, batch_size=2), 5)
+        self.assertEqual(fill_captcha_pool(size=5), 0) # 已滿，不再生成
+        self.assertEqual(CaptchaStore.objects.count(), 5)
+        self.assertTrue(bytes(PooledCaptcha.objects.first().image).startswith(b'\x89PNG'))
+
+        keys = {draw_captcha() for _ in range(5)}
+        self.assertEqual(len(keys), 5) # 每個驗證碼只發出一次
+        self.assertIsNone(draw_captcha())
+        self.assertEqual(available().count(), 0)
+
+    def test_form_uses_pool_and_image_is_served_without_rendering(self):
+        from .captcha_pool import generate_captchas
+        from .models import PooledCaptcha
+        generate_captchas(1)
+        response = self.client.get(reverse('post_message'))
+        entry = PooledCaptcha.objects.get()
+        self.assertIsNotNone(entry.issued_at)
+        self.assertContains(response, entry.hashkey)
+
+        with mock.patch('captcha.views.captcha_image') as render:
+            response = self.client.get(f'/captcha/image/{entry.hashkey}/')
+        render.assert_not_called()
+        self.assertEqual(response['Content-Type'], 'image/png')
+        self.assertEqual(response.content, bytes(entry.image))
+
+    def test_drawn_captcha_expires_after_answer_timeout(self):
+        from captcha.conf import settings as captcha_settings
+        from captcha.models import CaptchaStore
+        from .captcha_pool import draw_captcha, generate_captchas
+        from .models import PooledCaptcha
+        generate_captchas(1)
+        before = timezone.now()
+        hashkey = draw_captcha()
+        deadline = before + timedelta(minutes=int(captcha_settings.CAPTCHA_TIMEOUT))
+        expiration = CaptchaStore.objects.get(hashkey=hashkey).expiration
+        self.assertLess(abs(expiration - deadline), timedelta(seconds=5)) # 不是池項目的 24 小時
+        self.assertEqual(PooledCaptcha.objects.get().expires_at, expiration)
+
+    def test_refresh_draws_from_pool(self):
+        from .captcha_pool import generate_captchas
+        from .models import PooledCaptcha
+        generate_captchas(2)
+        keys = []
+        for _ in range(2):
+            with mock.patch('captcha.models.CaptchaStore.pick') as pick:
+                response = self.client.get('/captcha/refresh/', HTTP_X_REQUESTED_WITH='XMLHttpRequest')
+            pick.assert_not_called()
+            keys.append(response.json()['key'])
+            self.assertEqual(response.json()['image_url'], f'/captcha/image/{keys[-1]}/')
+        self.assertEqual(set(keys), set(PooledCaptcha.objects.filter(issued_at__isnull=False).values_list('hashkey', flat=True)))
+        self.assertEqual(len(set(keys)), 2) # 每個驗證碼只發出一次
+        self.assertEqual(self.client.get('/captcha/refresh/').status_code, 404)
+
+    @override_settings(RATE_LIMITS={'captcha_refresh': '2/m'})
+    def test_refresh_is_rate_limited(self):
+        from .captcha_pool import generate_captchas
+        from .models import PooledCaptcha
+        cache.clear()
+        generate_captchas(5)
+        self.client.logout()
+        statuses = [
+            self.client.get('/captcha/refresh/', HTTP_X_REQUESTED_WITH='XMLHttpRequest').status_code for _ in range(4)
+        ]
+        self.assertEqual(statuses, [200, 200, 429, 429])
+        self.assertEqual(PooledCaptcha.objects.filter(issued_at__isnull=True).count(), 3)
+
+    def test_exhausted_pool_warning_is_logged_once_per_interval(self):
+        from . import captcha_pool
+        self.addCleanup(setattr, captcha_pool, '_last_exhausted_warning', None)
+        captcha_pool._last_exhausted_warning = None
+        with mock.patch('board.captcha_pool.time.monotonic', side_effect=[100.0, 110.0, 100.0 + captcha_pool.CAPTCHA_POOL_WARNING_INTERVAL]):
+            with self.assertLogs('board.captcha_pool', 'WARNING') as logs:
+                for _ in range(3):
+                    self.assertTrue(captcha_pool.pooled_captcha_key()) # 池為空時即時生成
+        self.assertEqual(len(logs.records), 2)
+
+    def test_answering_and_sweeping(self):
+        from captcha.models import CaptchaStore
+        from .captcha_pool import generate_captchas, sweep_captcha_pool
+        from .models import PooledCaptcha
+        generate_captchas(3)
+        self.client.get(reverse('post_message'))
+        issued = PooledCaptcha.objects.get(issued_at__isnull=False)
+        store = CaptchaStore.objects.get(hashkey=issued.hashkey)
+        response = self.client.post(reverse('post_message'), {
+            'subject': '驗證碼池', 'content': 'c', 'captcha_0': issued.hashkey, 'captcha_1': store.response,
+        })
+        self.assertRedirects(response, reverse('message_list'))
+
+        # 一個已作答，一個已過期
+        PooledCaptcha.objects.filter(issued_at__isnull=True).update(expires_at=timezone.now())
+        expired = PooledCaptcha.objects.filter(issued_at__isnull=True).first()
+        CaptchaStore.objects.filter(hashkey=expired.hashkey).update(expiration=timezone.now())
+        self.assertEqual(sweep_captcha_pool(), (1, 3))
+        self.assertFalse(PooledCaptcha.objects.exists())
+        self.assertEqual(CaptchaStore.objects.count(), 1)
+
+        call_command('fill_captcha_pool', once=True, size=2, stdout=StringIO())
+        self.assertEqual(PooledCaptcha.objects.count(), 2)
+
+
 # 建議在 settings.py (或測試專用 settings) 中配置：
 # EMAIL_BACKEND = 'django.core.mail.backends.locmem.EmailBackend' # 測試時使用內存郵件後端
 # ADMINS = [('Admin Name', 'admin_test@example.com')] # 用於測試 mail_admins
@@ -0,0 +1,101 @@
+# board/threads.py
+"""
+討論串 (回覆)。
+
+回覆也是一條 Message：parent 為直接回覆的留言，thread 為討論串的頂層留言，path 為物化路徑
+(從頂層之下到自己，每一層一段固定寬度的留言編號，例如 '0000000042/0000000057/')。
+依 path 排序即為樹的深度優先順序，因此不需要逐層遞迴查詢：
+- 整個討論串：WHERE thread_id = ? ORDER BY path，一次 (thread, path) 索引範圍掃描
+- 某條回覆之下的子樹：再加上 path 的範圍條件 (見 board/models.py 的 descendants_q)
+- 一頁頂層留言各自的前 N 條回覆：ROW_NUMBER() OVER (PARTITION BY thread_id ORDER BY path)，同樣只需要一條查詢
+
+頂層留言的 reply_count 保存討論串中已審核回覆的數量，列表頁只需要為 reply_count 大於 0 的留言查詢回覆。
+回覆新增、審核狀態改變或被刪除時，以 refresh_reply_counts 重新計算 (單一 UPDATE，不會累積誤差)。
+"""
+from django.conf import settings
+from django.db.models import Count, F, OuterRef, Subquery, Window
+from django.db.models.functions import Coalesce, RowNumber
+
+from .models import Message
+
+# 回覆的最大深度；回覆最深一層的留言時，改為回覆它的上一層
+MAX_REPLY_DEPTH = getattr(settings, 'MAX_REPLY_DEPTH', 8)
+# 留言列表中每個討論串預覽的回覆數量
+REPLY_PREVIEW_COUNT = getattr(settings, 'REPLY_PREVIEW_COUNT', 3)
+
+REPLY_SUBJECT_PREFIX = 'Re: '
+
+
+def reply_parent(message):
+    """回覆 message 時實際掛上的留言"""
+    return message.parent if message.depth >= MAX_REPLY_DEPTH else message
+
+
+def reply_subject(parent):
+    """回覆沿用討論串的主題"""
+    subject = parent.subject if parent.subject.startswith(REPLY_SUBJECT_PREFIX) else REPLY_SUBJECT_PREFIX + parent.subject
+    return subject[:Message._meta.get_field('subject').max_length]
+
+
+def approved_replies():
+    return Message.objects.filter(is_approved=True)
+
+
+def thread_replies(root, queryset=None):
+    """整個討論串的回覆 (預設只包含已審核的)，依樹的順序排列"""
+    if queryset is None:
+        queryset = approved_replies()
+    return queryset.filter(thread_id=root.pk).select_related('author').defer('content').order_by('path')
+
+
+def reply_previews(root_ids, queryset=None, limit=REPLY_PREVIEW_COUNT):
+    """多個討論串各自依樹的順序的前 limit 條回覆"""
+    if queryset is None:
+        queryset = approved_replies()
+    return (
+        queryset.filter(thread_id__in=root_ids)
+        .annotate(position=Window(RowNumber(), partition_by=F('thread_id'), order_by=F('path').asc()))
+        .filter(position__lte=limit)
+        .select_related('author').defer('content')
+        .order_by('thread_id', 'path')
+    )
+
+
+def _preview_roots(page_obj):
+    page_obj.object_list = roots = list(page_obj.object_list)
+    return roots, [root.pk for root in roots if root.reply_count]
+
+
+def _apply_previews(roots, replies):
+    previews = {}
+    for reply in replies:
+        previews.setdefault(reply.thread_id, []).append(reply)
+    for root in roots:
+        root.reply_preview = previews.get(root.pk, [])
+
+
+def attach_reply_previews(page_obj, queryset=None, limit=REPLY_PREVIEW_COUNT):
+    """為一頁頂層留言附上 reply_preview (前 limit 條回覆)；整頁都沒有回覆時不查詢"""
+    roots, root_ids = _preview_roots(page_obj)
+    _apply_previews(roots, reply_previews(root_ids, queryset, limit) if root_ids else ())
+    return page_obj
+
+
+async def aattach_reply_previews(page_obj, queryset=None, limit=REPLY_PREVIEW_COUNT):
+    """attach_reply_previews 的非同步版本"""
+    roots, root_ids = _preview_roots(page_obj)
+    replies = [reply async for reply in reply_previews(root_ids, queryset, limit)] if root_ids else ()
+    _apply_previews(roots, replies)
+    return page_obj
+
+
+def refresh_reply_counts(thread_ids):
+    """重新計算這些討論串的已審核回覆數量 (一條 UPDATE，子查詢使用 (thread, path) 索引)"""
+    thread_ids = {pk for pk in thread_ids if pk is not None}
+    if not thread_ids:
+        return 0
+    approved = (
+        Message.objects.filter(thread_id=OuterRef('pk'), is_approved=True)
+        .order_by().values('thread_id').annotate(total=Count('pk')).values('total')
+    )
+    return Message.objects.filter(pk__in=thread_ids).update(reply_count=Coalesce(Subquery(approved), 0))
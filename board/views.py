@@ -1,20 +1,74 @@
 # board/views.py
+from functools import wraps
+
+from asgiref.sync import sync_to_async
 from django import forms
-from django.shortcuts import render, redirect
+from django.shortcuts import get_object_or_404, render, redirect
+from django.http import Http404, HttpResponse, HttpResponseBadRequest, JsonResponse
 from django.contrib.auth import login
 from django.contrib.auth.decorators import login_required
-from django.core.paginator import Paginator
 from django.contrib import messages
-from django.core.mail import send_mail, mail_admins
 from django.conf import settings
 from django.urls import reverse
-from .models import Message, User
-from .forms import MessageForm, CustomUserCreationForm # 導入 CustomUserCreationForm
+from django.utils.http import url_has_allowed_host_and_scheme, urlencode
+from django.utils.cache import patch_cache_control
+from django.views.decorators.http import condition, require_POST
+from django.core.cache import cache
+from django.db.models import F, Q
+from django.template.loader import render_to_string
+from .models import ArchivedMessage, Message, User, descendants_q
+from .forms import MessageForm, ReplyForm, CustomUserCreationForm # 導入 CustomUserCreationForm
+from .pagination import CountedPaginator, KeysetPage, akeyset_paginate, encode_cursor, keyset_paginate
+from .search import search_messages
+from .stats import APPROVED, APPROVED_REPLIES, DUPLICATES, adjust_counters, get_counters
+from .threads import aattach_reply_previews, attach_reply_previews, reply_parent, reply_subject, thread_replies
+from .outbox import enqueue_mail_admins
+from .caching import (
+    MESSAGE_LIST_CACHE_TIMEOUT, message_list_cache_key,
+    message_list_etag, message_list_last_modified, sessionless_for_anonymous,
+)
 from captcha.fields import CaptchaField # 導入驗證碼字段
+from captcha import views as captcha_views
+from captcha.conf import settings as captcha_settings
+from captcha.helpers import captcha_audio_url, captcha_image_url
+from .captcha_pool import pooled_captcha_key, pooled_captcha_png
+from .cards import aattach_cards, attach_cards
+from .ratelimit import rate_limit
+from .moderation import should_auto_approve
+from .live import notify_approved
+from .reactions import REACTION_FIELDS, record_reaction
+from .routers import primary_reads
+from .signals import batched_deletes
 # from captcha.models import CaptchaStore # 通常不需要直接操作 Store
 # from captcha.helpers import captcha_image_url # 通常由 widget 處理
 
+# 驗證碼圖片：池中的驗證碼直接返回預先渲染的 PNG，其他的交給 django-simple-captcha 即時繪製
+def captcha_image(request, key, scale=1):
+    image = pooled_captcha_png(key) if scale == 1 else None
+    if image is None:
+        return captcha_views.captcha_image(request, key, scale=scale)
+    response = HttpResponse(bytes(image), content_type='image/png')
+    # 每個鍵的圖片固定不變，但只屬於發出它的表單
+    patch_cache_control(response, private=True, max_age=int(captcha_settings.CAPTCHA_TIMEOUT) * 60)
+    return response
+
+
+# 驗證碼的 AJAX 刷新：與表單相同從驗證碼池取用 (django-simple-captcha 的 captcha_refresh 使用 CaptchaStore.pick()，
+# 可能把已發給其他表單的驗證碼再發一次)。公開的 GET 也要限制速率，避免匿名客戶端把池取空
+@rate_limit('captcha_refresh', methods=('GET',))
+def captcha_refresh(request):
+    if request.headers.get('x-requested-with') != 'XMLHttpRequest':
+        raise Http404
+    key = pooled_captcha_key()
+    return JsonResponse({
+        'key': key,
+        'image_url': captcha_image_url(key),
+        'audio_url': captcha_audio_url(key) if captcha_settings.CAPTCHA_FLITE_PATH else None,
+    })
+
+
 # 註冊視圖
+@rate_limit('signup')
 def signup(request):
     if request.user.is_authenticated:
         return redirect('message_list') # 如果已登入，重定向到首頁
@@ -38,52 +92,381 @@ def signup(request):
     return render(request, 'registration/signup.html', {'form': form})
 
 
+# 留言列表每頁顯示的留言數量
+MESSAGES_PER_PAGE = 10
+# 舊的 ?page= 數字分頁只保留給淺層頁面，更深的頁面重定向到游標分頁中的同一頁 (避免每次翻頁都 OFFSET 掃描)
+MAX_NUMBERED_PAGE = getattr(settings, 'MESSAGE_LIST_MAX_NUMBERED_PAGE', 50)
+
+
+def _admin_contact_email():
+    if settings.ADMINS and settings.ADMINS[0] and isinstance(settings.ADMINS[0], tuple) and len(settings.ADMINS[0]) > 1:
+        return settings.ADMINS[0][1] # (Name, Email)
+    return None
+
+
+def _numbered_page_too_deep(page_number):
+    try:
+        return page_number is not None and int(page_number) > MAX_NUMBERED_PAGE
+    except ValueError:
+        return False
+
+
+def _approved_messages():
+    # 只顯示已審核的頂層留言 (回覆顯示在討論串中)，並按時間倒序排列
+    # select_related 一併取得作者，避免模板中每張卡片各查一次 message.author
+    # 卡片使用預先渲染的 content_html (見 board/cards.py)，不需要讀取原始內容
+    return (
+        Message.objects.filter(is_approved=True).top_level().select_related('author')
+        .defer('content').order_by('-created_at', '-id')
+    )
+
+
+def _deep_page_rows(page_number, thread_count):
+    """
+    過深的 ?page= 的上一頁最後一條留言的 (created_at, id)，只讀取游標分頁索引。
+    超出範圍的頁碼視為最後一頁 (與 Paginator.get_page 相同)，OFFSET 不會超出資料庫整數的範圍
+    """
+    last_page = max(1, -(-thread_count // MESSAGES_PER_PAGE))
+    offset = (min(int(page_number), last_page) - 1) * MESSAGES_PER_PAGE
+    if offset <= 0:
+        return Message.objects.none()
+    return (
+        Message.objects.filter(is_approved=True).top_level()
+        .order_by('-created_at', '-id').values_list('created_at', 'id')[offset - 1:offset]
+    )
+
+
+def _deep_page_url(rows):
+    # 以該留言為游標即是同一頁的內容；只有一頁 (或計數器與留言表不一致) 時返回第一頁
+    url = reverse('message_list')
+    if not rows:
+        return url
+    return f"{url}?{urlencode({'after': encode_cursor(*rows[0])})}"
+
+
+def _approved_thread_count(counters):
+    # 已審核的頂層留言數量：APPROVED 也包含已審核的回覆
+    return counters[APPROVED] - counters[APPROVED_REPLIES]
+
+
+def _render_message_items(request, page_obj, cursor_mode):
+    """渲染留言卡片與分頁導航片段，返回 (HTML, 片段的模板上下文)"""
+    list_context = {
+        'page_obj': page_obj,
+        'cursor_mode': cursor_mode,
+        # 檢查是否有留言，用於模板中顯示提示信息
+        'has_messages': len(page_obj) > 0 or page_obj.has_previous(),
+    }
+    return render_to_string('board/message_list_items.html', list_context, request=request), list_context
+
+
+def _message_list_response(request, context):
+    response = render(request, 'board/message_list.html', context)
+    if not getattr(request, 'sessionless', False): # 無 cookie 的匿名請求由 sessionless_for_anonymous 設定
+        # 允許快取但每次都要重新驗證；已登入使用者的頁面不可由共用快取保存
+        if request.user.is_authenticated:
+            patch_cache_control(response, no_cache=True, private=True)
+        else:
+            patch_cache_control(response, no_cache=True)
+    return response
+
+
 # 留言列表視圖 (已審核的留言)
+# 條件式 GET：瀏覽器或 CDN 帶著 If-None-Match / If-Modified-Since 重新驗證時，
+# 留言板沒有變化就直接返回 304，不查詢留言也不渲染模板
+@sessionless_for_anonymous
+@condition(etag_func=message_list_etag, last_modified_func=message_list_last_modified)
 def message_list(request):
-    # 只顯示已審核的留言，並按時間倒序排列
-    message_list_qs = Message.objects.filter(is_approved=True).order_by('-created_at')
-    paginator = Paginator(message_list_qs, 10) # 每頁顯示 10 條留言
     page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    if _numbered_page_too_deep(page_number):
+        count = _approved_thread_count(get_counters(APPROVED, APPROVED_REPLIES))
+        return redirect(_deep_page_url(list(_deep_page_rows(page_number, count))))
 
-    # 檢查是否有留言，用於模板中顯示提示信息
-    has_messages = message_list_qs.exists()
+    context = {'admin_contact_email': _admin_contact_email()}
 
-    admin_email = None
-    if settings.ADMINS and settings.ADMINS[0] and isinstance(settings.ADMINS[0], tuple) and len(settings.ADMINS[0]) > 1:
-        admin_email = settings.ADMINS[0][1] # (Name, Email)
+    # 先查快取：命中時完全不需要查詢留言表或渲染留言卡片
+    cache_key = message_list_cache_key(request) if MESSAGE_LIST_CACHE_TIMEOUT else None
+    message_items = cache.get(cache_key) if cache_key else None
+
+    if message_items is None:
+        # 結果以目前的版本號快取，必須從主庫讀取 (見 board/routers.py)
+        with primary_reads():
+            if page_number is not None:
+                # 兼容舊的 ?page= 鏈接 (使用 OFFSET，總數取自計數器)
+                count = _approved_thread_count(get_counters(APPROVED, APPROVED_REPLIES))
+                page_obj = CountedPaginator(_approved_messages(), MESSAGES_PER_PAGE, count=count).get_page(page_number)
+            else:
+                # 預設使用游標分頁：不論翻到多深，每頁成本都相同
+                page_obj = keyset_paginate(
+                    _approved_messages(),
+                    MESSAGES_PER_PAGE,
+                    after=request.GET.get('after'),
+                    before=request.GET.get('before'),
+                )
+            attach_reply_previews(attach_cards(page_obj)) # 有回覆的討論串的前幾條回覆 (一條查詢)
+        message_items, list_context = _render_message_items(request, page_obj, cursor_mode=page_number is None)
+        if cache_key:
+            cache.set(cache_key, message_items, MESSAGE_LIST_CACHE_TIMEOUT)
+        context.update(list_context)
+
+    context['message_items'] = message_items
+    return _message_list_response(request, context)
+
+
+def preload_session_and_user(view):
+    """
+    非同步視圖用：先以非同步 API 載入 session 與登入使用者。
+    之後的 ETag 計算、提示訊息與模板渲染都只讀取已載入的資料，不會在事件循環中同步查詢資料庫。
+    """
+    @wraps(view)
+    async def inner(request, *args, **kwargs):
+        if not getattr(request, 'sessionless', False):
+            await request.session.akeys()
+            request.user = await request.auser()
+        return await view(request, *args, **kwargs)
+    return inner
 
-    return render(request, 'board/message_list.html', {
+
+# message_list 的非同步版本，ASGI 部署時使用 (見 my_messageboard/asgi.py)
+# 等待資料庫時不佔用 worker，一個進程即可同時服務大量緩慢的連線
+@sessionless_for_anonymous
+@preload_session_and_user
+@condition(etag_func=message_list_etag, last_modified_func=message_list_last_modified)
+async def amessage_list(request):
+    page_number = request.GET.get('page')
+    if _numbered_page_too_deep(page_number):
+        count = _approved_thread_count(await sync_to_async(get_counters)(APPROVED, APPROVED_REPLIES))
+        return redirect(_deep_page_url([row async for row in _deep_page_rows(page_number, count)]))
+
+    context = {'admin_contact_email': _admin_contact_email()}
+
+    cache_key = message_list_cache_key(request) if MESSAGE_LIST_CACHE_TIMEOUT else None
+    message_items = await cache.aget(cache_key) if cache_key else None
+
+    if message_items is None:
+        with primary_reads():
+            if page_number is not None:
+                # 總數取自計數器，不需要 acount()
+                counters = await sync_to_async(get_counters)(APPROVED, APPROVED_REPLIES)
+                page_obj = CountedPaginator(
+                    _approved_messages(), MESSAGES_PER_PAGE, count=_approved_thread_count(counters),
+                ).get_page(page_number)
+                page_obj.object_list = [message async for message in page_obj.object_list.aiterator()]
+            else:
+                page_obj = await akeyset_paginate(
+                    _approved_messages(),
+                    MESSAGES_PER_PAGE,
+                    after=request.GET.get('after'),
+                    before=request.GET.get('before'),
+                )
+            await aattach_reply_previews(await aattach_cards(page_obj))
+        message_items, list_context = _render_message_items(request, page_obj, cursor_mode=page_number is None)
+        if cache_key:
+            await cache.aset(cache_key, message_items, MESSAGE_LIST_CACHE_TIMEOUT)
+        context.update(list_context)
+
+    context['message_items'] = message_items
+    return _message_list_response(request, context)
+
+# 搜尋詞最大長度
+MAX_SEARCH_QUERY_LENGTH = 100
+
+
+# 搜尋已審核的留言 (使用全文索引，見 board/search.py)
+def search(request):
+    query = request.GET.get('q', '').strip()[:MAX_SEARCH_QUERY_LENGTH]
+    message_items = ''
+    if query:
+        results = search_messages(query).select_related('author').defer('content')
+        page_obj = attach_cards(keyset_paginate(
+            results,
+            MESSAGES_PER_PAGE,
+            after=request.GET.get('after'),
+            before=request.GET.get('before'),
+        ))
+        message_items = render_to_string('board/message_list_items.html', {
+            'page_obj': page_obj,
+            'cursor_mode': True,
+            'search_query': query,
+            'query_prefix': urlencode({'q': query}) + '&',
+        }, request=request)
+    return render(request, 'board/search_results.html', {
+        'search_query': query,
+        'message_items': message_items,
+        'max_query_length': MAX_SEARCH_QUERY_LENGTH,
+    })
+
+# 封存的舊留言 (見 board/archive.py)：內容只會在執行 archive_messages 時改變，匿名瀏覽同樣可由 CDN 快取
+@sessionless_for_anonymous
+def message_archive(request):
+    page_obj = attach_cards(keyset_paginate(
+        ArchivedMessage.objects.filter(thread_id__isnull=True).select_related('author')
+        .defer('content').order_by('-created_at', '-id'),
+        MESSAGES_PER_PAGE,
+        after=request.GET.get('after'),
+        before=request.GET.get('before'),
+    ))
+    # 討論串與頂層留言一起封存，回覆同樣從封存表取出
+    attach_reply_previews(page_obj, ArchivedMessage.objects.all())
+    message_items = render_to_string('board/message_list_items.html', {
+        'page_obj': page_obj,
+        'cursor_mode': True,
+        'archived': True,
+    }, request=request)
+    return render(request, 'board/message_archive.html', {'message_items': message_items})
+
+# 某位使用者已審核的留言 (公開)：以 (author, created_at, id) 索引分頁，不需要翻遍整個留言板
+@sessionless_for_anonymous
+def author_messages(request, username):
+    author = get_object_or_404(User, username=username)
+    page_obj = attach_cards(keyset_paginate(
+        Message.objects.filter(author=author, is_approved=True).select_related('author').defer('content'),
+        MESSAGES_PER_PAGE,
+        after=request.GET.get('after'),
+        before=request.GET.get('before'),
+    ))
+    message_items = render_to_string('board/message_list_items.html', {
+        'page_obj': page_obj,
+        'cursor_mode': True,
+        'empty_text': f'{author.username} 還沒有已審核的留言。',
+    }, request=request)
+    return render(request, 'board/author_messages.html', {'author': author, 'message_items': message_items})
+
+MY_MESSAGES_STATUSES = {'pending': False, 'approved': True}
+
+# 目前使用者自己的留言，包含待審核的；依狀態分頁時每一頁都只是一次索引範圍掃描
+@login_required
+def my_messages(request):
+    status = request.GET.get('status', '')
+    queryset = Message.objects.filter(author=request.user).defer('content')
+    if status in MY_MESSAGES_STATUSES:
+        queryset = queryset.filter(is_approved=MY_MESSAGES_STATUSES[status])
+    else:
+        status = ''
+    page_obj = keyset_paginate(queryset, MESSAGES_PER_PAGE, after=request.GET.get('after'), before=request.GET.get('before'))
+    for message in page_obj:
+        message.author = request.user # 作者就是目前使用者，不需要 JOIN
+    message_items = render_to_string('board/message_list_items.html', {
+        'page_obj': attach_cards(page_obj),
+        'cursor_mode': True,
+        'show_status': True,
+        'query_prefix': f'status={status}&' if status else '',
+        'empty_text': '這裡還沒有您的留言。',
+    }, request=request)
+    return render(request, 'board/my_messages.html', {'status': status, 'message_items': message_items})
+
+# 討論串：頂層留言與依樹的順序排列的全部已審核回覆，共兩條查詢 (見 board/threads.py)
+@sessionless_for_anonymous
+def message_thread(request, message_id):
+    message = get_object_or_404(Message.objects.select_related('author'), pk=message_id, is_approved=True)
+    if message.thread_id is not None:
+        # 回覆沒有自己的頁面，顯示在所屬的討論串中
+        return redirect(reverse('message_thread', args=[message.thread_id]) + f'#message-{message.pk}')
+    page_obj = attach_cards(KeysetPage([message], has_next=False, has_previous=False))
+    message_items = render_to_string('board/message_list_items.html', {
         'page_obj': page_obj,
-        'has_messages': has_messages,
-        'admin_contact_email': admin_email,
+        'cursor_mode': True,
+        'in_thread': True,
+    }, request=request)
+    return render(request, 'board/message_thread.html', {
+        'message': message,
+        'message_items': message_items,
+        'replies': list(thread_replies(message)),
     })
 
+
+# 回覆留言：回覆與發布新留言一樣需要驗證碼、審核，並共用發布的速率限制
+@rate_limit('post_message')
+@login_required
+def reply_message(request, message_id):
+    parent = get_object_or_404(Message.objects.select_related('author'), pk=message_id, is_approved=True)
+    parent = reply_parent(parent) # 超過最大深度時回覆上一層
+    thread_url = reverse('message_thread', args=[parent.thread_id or parent.pk])
+    if request.method == 'POST':
+        form = ReplyForm(request.POST, parent=parent, author=request.user)
+        if form.is_valid() and form.duplicate_of is not None:
+            Message.objects.filter(pk=form.duplicate_of).update(duplicate_count=F('duplicate_count') + 1)
+            adjust_counters({DUPLICATES: 1})
+            messages.info(request, '相同內容的回覆已經提交過，無需重複提交。')
+            return redirect(thread_url)
+        if form.is_valid():
+            reply = form.save(commit=False)
+            reply.author = request.user
+            reply.is_approved = not form.matches_other_author and should_auto_approve(reply)
+            reply.save()
+            if reply.is_approved:
+                notify_approved()
+                messages.success(request, '您的回覆已發布。')
+                return redirect(f'{thread_url}#message-{reply.pk}')
+            messages.success(request, '您的回覆已成功提交，管理員將盡快審核。')
+
+            # 通知管理員有新回覆待審核 (寫入郵件佇列)
+            admin_url = request.build_absolute_uri(reverse('admin:board_message_change', args=[reply.pk]))
+            enqueue_mail_admins(
+                subject=f"【新回覆待審核】{reply.subject}",
+                message=f"使用者 {request.user.username} 回覆了一條留言，需要審核。\n\n"
+                        f"主題: {reply.subject}\n"
+                        f"內容: {reply.content[:200]}...\n\n"
+                        f"請點擊以下鏈接進行審核:\n{admin_url}",
+            )
+
+            return redirect(thread_url)
+        messages.error(request, '表單提交失敗，請檢查您輸入的內容。')
+    else:
+        form = ReplyForm(parent=parent)
+    return render(request, 'board/reply_message.html', {'form': form, 'parent': parent, 'thread_url': thread_url})
+
+# 表情回應：只插入一行 Reaction，留言上的計數由 board/reactions.py 批量重新計算，
+# 因此剛點擊的回應要等到下一次寫入 (與列表頁快取過期) 後才出現在計數中
+@rate_limit('react')
+@login_required
+@require_POST
+def react_message(request, message_id):
+    kind = request.POST.get('kind')
+    if kind not in REACTION_FIELDS:
+        return HttpResponseBadRequest('未知的回應種類')
+    if not Message.objects.filter(pk=message_id, is_approved=True).exists():
+        raise Http404('找不到指定的留言。')
+    record_reaction(request.user, message_id, kind)
+    messages.success(request, '已收到您的回應，計數稍後更新。')
+    next_url = request.POST.get('next')
+    if not url_has_allowed_host_and_scheme(next_url, allowed_hosts={request.get_host()}, require_https=request.is_secure()):
+        next_url = reverse('message_list')
+    return redirect(next_url)
+
 # 發布留言視圖
+@rate_limit('post_message') # 在驗證碼查詢與表單驗證之前拒絕過於頻繁的提交
 @login_required # 限定只有登錄用户才能訪問
 def post_message(request):
     if request.method == 'POST':
-        form = MessageForm(request.POST) # 包含驗證碼的表單
+        form = MessageForm(request.POST, author=request.user) # 包含驗證碼的表單
+        if form.is_valid() and form.duplicate_of is not None:
+            # 近期已有相同內容的留言：只累計重複次數，不新增審核項目，也不再通知管理員
+            Message.objects.filter(pk=form.duplicate_of).update(duplicate_count=F('duplicate_count') + 1)
+            adjust_counters({DUPLICATES: 1})
+            messages.info(request, '相同內容的留言已經提交過，管理員將一併審核，無需重複提交。')
+            return redirect('message_list')
         if form.is_valid():
             message = form.save(commit=False)
             message.author = request.user # 自動設置留言者為當前登錄用户
+            # 沒有命中禁用關鍵字、也不與其他使用者的近期留言相同時直接通過 (見 board/moderation.py、board/dedup.py)
+            message.is_approved = not form.matches_other_author and should_auto_approve(message)
             message.save()
+            if message.is_approved:
+                notify_approved() # 推送到即時動態
+                messages.success(request, '您的留言已發布。')
+                return redirect('message_list')
             messages.success(request, '您的留言已成功提交，管理員將盡快審核。')
 
-            # 通知管理員有新留言待審核
-            try:
-                admin_url = request.build_absolute_uri(reverse('admin:board_message_change', args=[message.pk]))
-                mail_admins(
-                    subject=f"【新留言待審核】{message.subject}",
-                    message=f"使用者 {request.user.username} 發布了一條新留言需要審核。\n\n"
-                            f"主題: {message.subject}\n"
-                            f"內容: {message.content[:200]}...\n\n"
-                            f"請點擊以下鏈接進行審核:\n{admin_url}",
-                    fail_silently=True # 生產環境中建議 True，開發時 False
-                )
-            except Exception as e:
-                # 記錄錯誤，但不影響用戶體驗
-                print(f"Error sending admin notification email: {e}")
+            # 通知管理員有新留言待審核 (寫入郵件佇列，由 send_outbox 在背景發送)
+            admin_url = request.build_absolute_uri(reverse('admin:board_message_change', args=[message.pk]))
+            enqueue_mail_admins(
+                subject=f"【新留言待審核】{message.subject}",
+                message=f"使用者 {request.user.username} 發布了一條新留言需要審核。\n\n"
+                        f"主題: {message.subject}\n"
+                        f"內容: {message.content[:200]}...\n\n"
+                        f"請點擊以下鏈接進行審核:\n{admin_url}",
+            )
 
             return redirect('message_list') # 重定向到留言列表
         else:
@@ -101,7 +484,7 @@ def edit_message(request, message_id):
         messages.error(request, "找不到指定的留言。")
         return redirect('message_list')
 
-    if message.author != request.user:
+    if message.author_id != request.user.pk: # 比較 id，不需要再查詢一次作者
         messages.error(request, "您沒有權限編輯此留言。")
         return redirect('message_list')
 
@@ -110,24 +493,25 @@ def edit_message(request, message_id):
         form = MessageForm(request.POST, instance=message, is_editing=True)
         if form.is_valid():
             edited_message = form.save(commit=False)
-            edited_message.is_approved = False # 修改後需要重新審核
+            # 修改後需要重新審核；啟用自動審核時，乾淨的內容直接通過
+            edited_message.is_approved = not form.matches_other_author and should_auto_approve(edited_message)
             edited_message.notified = False    # 重置通知狀態
-            edited_message.save()
+            edited_message.save() # 留言退回待審核時，post_save 信號使列表頁快取失效
+            if edited_message.is_approved:
+                notify_approved()
+                messages.success(request, '留言已成功修改並重新發布。')
+                return redirect('message_list')
             messages.success(request, '留言已成功修改，將等待管理員重新審核。')
 
-            # 通知管理員有留言被修改並待審核
-            try:
-                admin_url = request.build_absolute_uri(reverse('admin:board_message_change', args=[edited_message.pk]))
-                mail_admins(
-                    subject=f"【留言已修改待重審】{edited_message.subject}",
-                    message=f"使用者 {request.user.username} 修改了他們的留言，需要重新審核。\n\n"
-                            f"主題: {edited_message.subject}\n"
-                            f"內容: {edited_message.content[:200]}...\n\n"
-                            f"請點擊以下鏈接進行審核:\n{admin_url}",
-                    fail_silently=True
-                )
-            except Exception as e:
-                print(f"Error sending admin notification email for edited message: {e}")
+            # 通知管理員有留言被修改並待審核 (寫入郵件佇列)
+            admin_url = request.build_absolute_uri(reverse('admin:board_message_change', args=[edited_message.pk]))
+            enqueue_mail_admins(
+                subject=f"【留言已修改待重審】{edited_message.subject}",
+                message=f"使用者 {request.user.username} 修改了他們的留言，需要重新審核。\n\n"
+                        f"主題: {edited_message.subject}\n"
+                        f"內容: {edited_message.content[:200]}...\n\n"
+                        f"請點擊以下鏈接進行審核:\n{admin_url}",
+            )
 
             return redirect('message_list')
         else:
@@ -141,19 +525,24 @@ def edit_message(request, message_id):
 @login_required
 def delete_message(request, message_id):
     try:
-        message = Message.objects.get(pk=message_id)
+        message = Message.objects.select_related('author').get(pk=message_id)
     except Message.DoesNotExist:
         messages.error(request, "找不到指定的留言。")
         return redirect('message_list')
 
     # 允許作者或管理員刪除
-    if not (message.author == request.user or request.user.is_staff):
+    if not (message.author_id == request.user.pk or request.user.is_staff):
         messages.error(request, "您沒有權限刪除此留言。")
         return redirect('message_list')
 
     if request.method == 'POST':
         subject = message.subject # Store subject for message before deleting
-        message.delete()
+        # 連同子樹中的回覆一起刪除：以 (thread, path) 一次取出整個子樹 (不必逐層查詢 parent)，
+        # 計數器、回覆數、搜尋索引與快取版本號只更新一次
+        with batched_deletes():
+            Message.objects.filter(
+                Q(pk=message.pk) | descendants_q(message.pk, message.thread_id, message.path)
+            ).delete()
         messages.success(request, f'留言 "{subject}" 已成功刪除。')
         return redirect('message_list')
 
@@ -6,11 +6,44 @@ It exposes the ASGI callable as a module-level variable named ``application``.
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
 """
+# 生產環境啟動方式 (見 Procfile)：
+#   gunicorn my_messageboard.asgi:application -k uvicorn_worker.UvicornWorker
+# 或單獨使用 uvicorn：
+#   uvicorn my_messageboard.asgi:application --host 0.0.0.0 --port $PORT
 
 import os
+import re
 
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'my_messageboard.settings')
+# 啟用非同步視圖並移除只支援同步的 WhiteNoise 中介層 (見 settings.ASGI_SERVING)
+os.environ.setdefault('DJANGO_ASGI', 'True')
+
+from asgiref.wsgi import WsgiToAsgi
+from django.conf import settings
 from django.core.asgi import get_asgi_application
+from whitenoise import WhiteNoise
+
+django_application = get_asgi_application()
+
+# collectstatic 生成的帶雜湊檔名 (例如 style.3f2a9c1b7e4d.css) 可以永久快取
+_HASHED_FILE = re.compile(r'^.+\.[0-9a-f]{12}\..+$')
+
+
+def _not_found(environ, start_response):
+    start_response('404 Not Found', [('Content-Type', 'text/plain; charset=utf-8')])
+    return [b'Not Found']
+
+
+# 靜態檔案在進入 Django 之前由 WhiteNoise 直接返回 (與 WSGI 部署時的行為相同)
+static_application = WsgiToAsgi(WhiteNoise(
+    _not_found,
+    root=settings.STATIC_ROOT,
+    prefix=settings.STATIC_URL,
+    immutable_file_test=lambda path, url: bool(_HASHED_FILE.match(url)),
+))
 
-os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'my_messageboard.settings')
 
-application = get_asgi_application()
+async def application(scope, receive, send):
+    if scope['type'] == 'http' and scope['path'].startswith(settings.STATIC_URL):
+        return await static_application(scope, receive, send)
+    return await django_application(scope, receive, send)
@@ -56,9 +56,16 @@ INSTALLED_APPS = [
 CAPTCHA_IMAGE_SIZE = (120, 50)
 CAPTCHA_FONT_SIZE = 22
 CAPTCHA_LENGTH = 4
+# 驗證碼池 (board/captcha_pool.py)：由 `python manage.py fill_captcha_pool` 在背景預先生成驗證碼與圖片。
+# CAPTCHA_GET_FROM_POOL 讓 CaptchaField 不再於每次驗證時刪除過期驗證碼，改由該命令批量清理。
+# 它也會讓 django-simple-captcha 以 CaptchaStore.pick() 隨機重用驗證碼：表單與刷新路由都已改為從驗證碼池取用，不經過 pick()。
+CAPTCHA_GET_FROM_POOL = True
+CAPTCHA_POOL_SIZE = int(os.environ.get('DJANGO_CAPTCHA_POOL_SIZE', 500))
 
 MIDDLEWARE = [
+    'board.middleware.QueryInstrumentationMiddleware', # 放在最外層以統計整個請求 (含 session 讀寫) 的查詢
     'django.middleware.security.SecurityMiddleware',
+    'board.middleware.PrimaryStickinessMiddleware', # 讀寫分離：寫入後短時間內從主庫讀取 (只在設定副本時啟用)
     'whitenoise.middleware.WhiteNoiseMiddleware', # WhiteNoise Middleware
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -68,6 +75,17 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
+# ASGI 模式 (my_messageboard/asgi.py 會設定 DJANGO_ASGI=True)：唯讀頁面改用非同步視圖。
+# WhiteNoise 中介層只支援同步，放在中介層鏈中會讓每個請求都切換到執行緒執行，
+# 因此 ASGI 模式下移除它，靜態檔案改由 asgi.py 在 Django 之前處理。
+ASGI_SERVING = os.environ.get('DJANGO_ASGI', '').lower() == 'true'
+if ASGI_SERVING:
+    MIDDLEWARE.remove('whitenoise.middleware.WhiteNoiseMiddleware')
+
+# 查詢統計中介層：預設只在 DEBUG 時啟用；生產環境可用環境變量臨時開啟以排查慢頁面
+QUERY_INSTRUMENTATION = os.environ.get('DJANGO_QUERY_INSTRUMENTATION', str(DEBUG)).lower() == 'true'
+QUERY_INSTRUMENTATION_SERVER_TIMING = os.environ.get('DJANGO_QUERY_SERVER_TIMING', str(DEBUG)).lower() == 'true'
+
 ROOT_URLCONF = 'my_messageboard.urls'
 
 TEMPLATES = [
@@ -106,6 +124,75 @@ DATABASES = {
         conn_health_checks=True, # Optional: enable health checks
     )
 }
+# 唯讀副本 (可選)：留言與使用者的讀取查詢送往副本，見 board/routers.py
+DATABASE_REPLICA_URL = os.environ.get('DATABASE_REPLICA_URL')
+if DATABASE_REPLICA_URL:
+    DATABASES['replica'] = dj_database_url.parse(
+        DATABASE_REPLICA_URL,
+        conn_max_age=600,
+        conn_health_checks=True,
+    )
+    # 測試時副本指向測試主庫，不另外建立測試資料庫
+    DATABASES['replica']['TEST'] = {'MIRROR': 'default'}
+DATABASE_ROUTERS = ['board.routers.PrimaryReplicaRouter']
+# 寫入後讀取固定使用主庫的秒數 (應大於副本的複製延遲)
+REPLICA_STICKY_SECONDS = int(os.environ.get('DJANGO_REPLICA_STICKY_SECONDS', 5))
+if ASGI_SERVING:
+    # ASGI 下持久連線無法在請求之間可靠地重用，改為每個請求關閉 (需要連線池時請使用 pgbouncer 等外部工具)
+    for database in DATABASES.values():
+        database['CONN_MAX_AGE'] = 0
+
+
+# Cache
+# 留言列表頁快取與「留言板版本號」需要所有 worker 共用同一個快取，
+# 生產環境多進程部署時請設定 REDIS_URL；未設定時退回單進程的本機記憶體快取。
+REDIS_URL = os.environ.get('REDIS_URL')
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'my-messageboard',
+        }
+    }
+
+# 已渲染的留言列表片段快取秒數，設為 0 可停用
+MESSAGE_LIST_CACHE_TIMEOUT = int(os.environ.get('DJANGO_MESSAGE_LIST_CACHE_TIMEOUT', 300))
+
+# 沒有 cookie 的匿名訪客瀏覽留言列表時不使用 session，回應可由 CDN / 反向代理快取 ANONYMOUS_CACHE_MAX_AGE 秒
+SESSIONLESS_ANONYMOUS_READS = os.environ.get('DJANGO_SESSIONLESS_ANONYMOUS_READS', 'True').lower() == 'true'
+ANONYMOUS_CACHE_MAX_AGE = int(os.environ.get('DJANGO_ANONYMOUS_CACHE_MAX_AGE', 30))
+
+# 表單提交的速率限制 (令牌桶，見 board/ratelimit.py)，依來源 IP 與使用者分別計算；設為 None 可停用某一項
+RATE_LIMITS = {
+    'post_message': os.environ.get('DJANGO_RATE_LIMIT_POST_MESSAGE', '5/m'),
+    'signup': os.environ.get('DJANGO_RATE_LIMIT_SIGNUP', '5/h'),
+    'login': os.environ.get('DJANGO_RATE_LIMIT_LOGIN', '10/m'),
+    'react': os.environ.get('DJANGO_RATE_LIMIT_REACT', '60/m'),
+    'captcha_refresh': os.environ.get('DJANGO_RATE_LIMIT_CAPTCHA_REFRESH', '30/m'),
+}
+# 應用前面的反向代理數量 (Render 為 1)，用於從 X-Forwarded-For 取得實際的來源 IP
+RATE_LIMIT_PROXY_COUNT = int(os.environ.get('DJANGO_RATE_LIMIT_PROXY_COUNT', 0))
+
+# 關鍵字自動審核 (見 board/moderation.py)：啟用後，不含禁用關鍵字的留言發布時直接通過審核
+AUTO_MODERATION = os.environ.get('DJANGO_AUTO_MODERATION', 'False').lower() == 'true'
+# 以逗號分隔；允許關鍵字用於排除誤判，例如禁用 "sex" 時允許 "sussex"
+MODERATION_DENY_KEYWORDS = [k for k in os.environ.get('DJANGO_MODERATION_DENY_KEYWORDS', '').split(',') if k.strip()]
+MODERATION_ALLOW_KEYWORDS = [k for k in os.environ.get('DJANGO_MODERATION_ALLOW_KEYWORDS', '').split(',') if k.strip()]
+
+# 表情回應的寫入合併 (見 board/reactions.py)：有新回應的留言先記在進程內，每 REACTION_FLUSH_INTERVAL 秒
+# 或累積 REACTION_FLUSH_MAX_PENDING 次點擊時批量重新計算；閒置進程的部分由排程的 flush_reactions 補上
+REACTION_FLUSH_INTERVAL = int(os.environ.get('DJANGO_REACTION_FLUSH_INTERVAL', 10))
+REACTION_FLUSH_MAX_PENDING = int(os.environ.get('DJANGO_REACTION_FLUSH_MAX_PENDING', 1000))
+
+# 部署版本 (Render 會自動提供 RENDER_GIT_COMMIT)，用於 ETag，使新版本部署後頁面不會被當作未修改
+RELEASE_VERSION = os.environ.get('RENDER_GIT_COMMIT', '')
 
 
 # Password validation
@@ -15,23 +15,46 @@ Including another URLconf
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
 # my_messageboard/urls.py
+from django.conf import settings
 from django.contrib import admin
-from django.urls import path, include
+from django.urls import path, re_path, include
 from board import views as board_views # 導入應用視圖，並使用別名以區分
+from board import api as board_api # 唯讀 JSON API
 from django.contrib.auth import views as auth_views # 導入 Django 內建的認證視圖
+from board.ratelimit import rate_limit # 登入的速率限制 (密碼雜湊很昂貴)
+
+# ASGI 模式下唯讀頁面使用非同步視圖 (見 my_messageboard/asgi.py)
+if settings.ASGI_SERVING:
+    message_list_view, api_messages_view, api_export_view = board_views.amessage_list, board_api.amessage_list, board_api.amessage_export
+    api_stream_view = board_api.amessage_stream
+else:
+    message_list_view, api_messages_view, api_export_view = board_views.message_list, board_api.message_list, board_api.message_export
+    api_stream_view = board_api.message_stream
 
 urlpatterns = [
     path('admin/', admin.site.urls),
-    path('accounts/login/', auth_views.LoginView.as_view(), name='login'), # 登入
+    path('accounts/login/', rate_limit('login')(auth_views.LoginView.as_view()), name='login'), # 登入
     path('accounts/logout/', auth_views.LogoutView.as_view(), name='logout'), # 登出
     path('accounts/password_reset/', auth_views.PasswordResetView.as_view(), name='password_reset'), # 密碼重設請求
     path('accounts/password_reset/done/', auth_views.PasswordResetDoneView.as_view(), name='password_reset_done'), # 密碼重設郵件已發送
     path('accounts/reset/<uidb64>/<token>/', auth_views.PasswordResetConfirmView.as_view(), name='password_reset_confirm'), # 密碼重設確認
     path('accounts/reset/done/', auth_views.PasswordResetCompleteView.as_view(), name='password_reset_complete'), # 密碼重設完成
     path('accounts/signup/', board_views.signup, name='signup'), # 註冊
-    path('', board_views.message_list, name='message_list'), # 留言列表頁
+    path('', message_list_view, name='message_list'), # 留言列表頁
+    path('search/', board_views.search, name='search'), # 搜尋留言
+    path('archive/', board_views.message_archive, name='message_archive'), # 封存的舊留言
+    path('users/<str:username>/', board_views.author_messages, name='author_messages'), # 某位使用者的留言
+    path('my/messages/', board_views.my_messages, name='my_messages'), # 我的留言 (含待審核)
     path('post/', board_views.post_message, name='post_message'), # 發布留言頁
+    path('message/<int:message_id>/', board_views.message_thread, name='message_thread'), # 討論串 (留言與全部回覆)
+    path('message/<int:message_id>/reply/', board_views.reply_message, name='reply_message'), # 回覆留言
+    path('message/<int:message_id>/react/', board_views.react_message, name='react_message'), # 表情回應
     path('message/<int:message_id>/edit/', board_views.edit_message, name='edit_message'), # 編輯留言頁
     path('message/<int:message_id>/delete/', board_views.delete_message, name='delete_message'), # 刪除留言頁
+    path('api/v1/messages/', api_messages_view, name='api_messages'), # JSON API：已審核留言 (游標分頁)
+    path('api/v1/messages/export/', api_export_view, name='api_messages_export'), # JSON Lines 串流匯出
+    path('api/v1/messages/live/', api_stream_view, name='api_messages_live'), # SSE：新審核通過的留言
+    re_path(r'^captcha/image/(?P<key>\w+)/$', board_views.captcha_image), # 驗證碼圖片 (優先使用驗證碼池中預先渲染的 PNG)
+    re_path(r'^captcha/refresh/$', board_views.captcha_refresh), # 驗證碼刷新 (從驗證碼池取用)
     path('captcha/', include('captcha.urls')), # 驗證碼 URL
 ]